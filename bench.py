@@ -0,0 +1,517 @@
+import database as db
+import graph
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy
+
+# ArgumentParser is used to get the command line options from the terminal.
+parser = argparse.ArgumentParser(
+    description='Benchmark the graph structures on the bundled databases',
+    epilog='Example: python3 bench.py --suite --sizes 1000 10000 --save base.json, later --compare base.json'
+)
+parser.add_argument(
+    '-db',
+    '--database',
+    type=str,
+    nargs='*',
+    default=['got', 'trump', 'trump_without_trump', 'marvel'],
+    help='Databases to benchmark.'
+)
+parser.add_argument(
+    '-n',
+    '--repeat',
+    type=int,
+    default=5,
+    help='Number of runs of each measure. The best one is kept.'
+)
+parser.add_argument(
+    '--startup',
+    action='store_true',
+    help='Check the import time of program.py (the cold start of non-GUI runs) against --budget instead.'
+)
+parser.add_argument(
+    '--budget',
+    type=float,
+    default=500,
+    help='Import time budget of program.py, in milliseconds.'
+)
+
+parser.add_argument(
+    '--suite',
+    action='store_true',
+    help='Run the benchmark suite (load, search, spread, bookkeeping, layout, render) instead of the adjacency one.'
+)
+parser.add_argument(
+    '--sizes',
+    type=int,
+    nargs='*',
+    default=[1000, 10000],
+    help='Number of vertices of the synthetic graphs of the suite.'
+)
+parser.add_argument(
+    '--model',
+    type=str,
+    choices=('er', 'ba', 'ws', 'sbm'),
+    default='ba',
+    help='Model of the synthetic graphs of the suite (see generators.py).'
+)
+parser.add_argument(
+    '--days',
+    type=int,
+    default=30,
+    help='Number of simulated days of the spread benchmarks of the suite.'
+)
+parser.add_argument(
+    '--skip',
+    type=str,
+    nargs='*',
+    default=[],
+    help='Benchmarks of the suite not to run, layout or draw for example.'
+)
+parser.add_argument(
+    '--save',
+    type=str,
+    default=None,
+    help='JSON file where the results of the suite are written, to use later as a baseline.'
+)
+parser.add_argument(
+    '--compare',
+    type=str,
+    default=None,
+    help='JSON baseline of a previous suite. The slower benchmarks are flagged and the exit code is 1.'
+)
+parser.add_argument(
+    '--tolerance',
+    type=float,
+    default=.2,
+    help='Slowdown over the baseline flagged as a regression: .2 is 20%%.'
+)
+
+# Modules that only the GUI and export frontends may import
+HEAVY_MODULES = ('matplotlib', 'networkx', 'tkinter')
+
+
+def best_time(func, repeat):
+    """
+    Runs a function several times and returns the best duration.
+
+    Parameters
+    ----------
+    func: The function to time, called without arguments.
+    repeat: type int: Number of runs.
+
+    Returns
+    -------
+    type float: duration in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class ListGraph:
+    """
+    The former Graph_dic: lists of neighbors only, so an edge check scans a list.
+    Kept here as the baseline of the set-backed adjacency.
+    """
+    def __init__(self):
+        self.dic = {}
+
+    def add_vertice(self, v):
+        if v not in self.dic:
+            self.dic[v] = []
+
+    def add_edge(self, v1, v2):
+        self.add_vertice(v1)
+        if not self.edge(v1, v2):
+            self.add_vertice(v2)
+            self.dic[v1].append(v2)
+            self.dic[v2].append(v1)
+
+    def edge(self, v1, v2):
+        return v2 in self.dic[v1]
+
+
+def build_graph(rows, graph_class):
+    """
+    Builds a graph from database rows, like `program.create_graph`.
+
+    Parameters
+    ----------
+    rows: type list: rows of the edges database.
+    graph_class: The class of the graph: graph.Graph_dic or ListGraph.
+
+    Returns
+    -------
+    type Graph_dic or ListGraph
+    """
+    g = graph_class()
+    for e in rows:
+        g.add_edge(e[0], e[1])
+    return g
+
+
+def check_edges(g, rows):
+    """
+    Checks every edge of the database in the graph, both ways.
+
+    Parameters
+    ----------
+    g: type Graph_dic or ListGraph: The graph.
+    rows: type list: rows of the edges database.
+
+    Returns
+    -------
+    """
+    for e in rows:
+        g.edge(e[0], e[1])
+        g.edge(e[1], e[0])
+
+
+def bench_adjacency(name, repeat):
+    """
+    Compares the list and set adjacencies of Graph_dic on a database: building and edge checks.
+
+    Parameters
+    ----------
+    name: type string: Name of the database (without `_edges`).
+    repeat: type int: Number of runs of each measure.
+
+    Returns
+    -------
+    type dict: durations in seconds
+    """
+    rows = db.Database(name + '_edges').select_item()
+    result = {'database': name, 'edges': len(rows)}
+
+    for label, graph_class in (('list', ListGraph), ('set', graph.Graph_dic)):
+        g = build_graph(rows, graph_class)
+        result[label + '_build'] = best_time(lambda: build_graph(rows, graph_class), repeat)
+        result[label + '_edge'] = best_time(lambda: check_edges(g, rows), repeat)
+
+    return result
+
+
+def startup_time(module, repeat):
+    """
+    Measures the import of a module in fresh interpreters (a cold start) and lists the heavy modules it loads.
+
+    Parameters
+    ----------
+    module: type string: Name of the module.
+    repeat: type int: Number of interpreters. The best time is kept.
+
+    Returns
+    -------
+    type tuple: (duration in seconds, list of the HEAVY_MODULES imported)
+    """
+    code = ('import sys, time\n'
+            'start = time.perf_counter()\n'
+            'import ' + module + '\n'
+            'print(time.perf_counter() - start)\n'
+            'print(" ".join(m for m in ' + repr(HEAVY_MODULES) + ' if m in sys.modules))\n')
+
+    best = float('inf')
+    heavy = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        duration, loaded = out.split('\n')[:2]
+        best = min(best, float(duration))
+        heavy = loaded.split()
+    return best, heavy
+
+
+def check_startup(budget, repeat):
+    """
+    Guards the cold start of non-GUI runs: importing program.py must stay under the budget and must not
+    import matplotlib, networkx nor Tk.
+
+    Parameters
+    ----------
+    budget: type float: Budget in milliseconds.
+    repeat: type int: Number of measures.
+
+    Returns
+    -------
+    type bool: True when the budget is kept
+    """
+    duration, heavy = startup_time('program', repeat)
+    ok = duration * 1000 <= budget and len(heavy) == 0
+    print('import program: {:.1f}ms (budget {:.0f}ms), heavy modules: {} -> {}'.format(
+        duration * 1000, budget, ', '.join(heavy) or 'none', 'ok' if ok else 'FAILED'))
+    return ok
+
+
+def synthetic_rows(model, n, degree=4, seed=0):
+    """
+    Edges of a synthetic graph of `n` vertices (see generators.py), as rows of an edges database.
+
+    Parameters
+    ----------
+    model: type string: er (Erdos-Renyi), ba (Barabasi-Albert), ws (Watts-Strogatz) or sbm (10 blocks).
+    n: type int: Number of vertices.
+    degree: type int: Mean degree (er, sbm inside the blocks), edges added by each vertice (ba) or ring degree (ws).
+    seed: type int: Seed of the graph.
+
+    Returns
+    -------
+    type list: rows (name1, name2)
+    """
+    import generators
+
+    if model == 'er':
+        chunks = generators.erdos_renyi(n, degree / max(n - 1, 1), seed)
+    elif model == 'ba':
+        chunks = generators.barabasi_albert(n, degree, seed)
+    elif model == 'ws':
+        chunks = generators.watts_strogatz(n, degree, .1, seed)
+    else:
+        size = max(n // 10, 2)
+        chunks = generators.stochastic_block_model([size] * 10, degree / (size - 1), 1 / (9 * size), seed)
+
+    rows = []
+    for src, dst in chunks:
+        rows += zip(src.astype(str).tolist(), dst.astype(str).tolist())
+    return rows
+
+
+def run_days(sim, days):
+    """
+    Simulates days, or less if the epidemic ends first.
+
+    Parameters
+    ----------
+    sim: type Simulation: The simulation.
+    days: type int: Number of days.
+
+    Returns
+    -------
+    type int: number of days simulated
+    """
+    start = sim.index
+    while sim.index - start < days and not sim.is_over():
+        sim.next()
+    return sim.index - start
+
+
+def bench_render(g, root, repeat, skip):
+    """
+    Times the rendering of `visual.State` with the Agg backend (no display): node colors, the first draw (with the
+    creation of the artists), a full figure draw, and the blitted draw of a new day.
+
+    Parameters
+    ----------
+    g: type FrozenGraph: The graph.
+    root: Name of the first infected vertice.
+    repeat: type int: Number of runs of each measure.
+    skip: type list: Names of the measures not to run.
+
+    Returns
+    -------
+    type dict: durations in seconds
+    """
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+    import spread
+    import visual
+
+    result = {}
+    state = visual.State(g, spread.spread_step, root, 0, None, -1, 'auto', False, verbose=False)
+    result['set_node_colors'] = best_time(state.set_node_colors, repeat)
+
+    if 'draw' not in skip:
+        result['draw_setup'] = best_time(state.draw, 1)
+        result['draw'] = best_time(state.figure.canvas.draw, repeat)
+
+        # A day later: only the nodes that changed are drawn
+        def draw_day():
+            state.last_frame = state.frame()
+            state.draw()
+
+        simulation_next = super(visual.State, state).next
+        durations = []
+        for _ in range(repeat):
+            simulation_next()
+            durations.append(best_time(draw_day, 1))
+        result['draw_day'] = min(durations)
+
+    plt.close('all')
+    return result
+
+
+def bench_graph(label, rows, g, repeat, days, skip):
+    """
+    Times the suite on a graph: building it, searching it, spreading on it, and drawing it.
+
+    Parameters
+    ----------
+    label: type string: Name of the graph in the results.
+    rows: type list: The edges, as rows of an edges database.
+    g: type FrozenGraph: The graph compiled from the rows.
+    repeat: type int: Number of runs of the fast measures. Layout and first draw run once.
+    days: type int: Number of simulated days of the spread measures.
+    skip: type list: Names of the measures not to run.
+
+    Returns
+    -------
+    type dict: durations in seconds, and the size of the graph
+    """
+    import layout
+    import program
+    import simulation
+    import spread
+
+    result = {'vertices': len(g.names), 'edges': len(g.indices) // 2}
+
+    # The root of the spread is the vertice with the most neighbors, so that the spread does not die at once
+    root = g.names[int(numpy.argmax(numpy.diff(g.indptr)))]
+
+    def timed(name, func, runs=repeat):
+        if name in skip:
+            return
+        try:
+            result[name] = best_time(func, runs)
+        except ImportError as e:
+            # An optional dependency of the measure (scipy for the spring layout of networkx for example)
+            print('{:<24}{:<24}{:>14}'.format(label, name, 'skipped'), '(' + str(e) + ')', flush=True)
+            return
+        print('{:<24}{:<24}{:>12.2f}ms'.format(label, name, result[name] * 1000), flush=True)
+
+    timed('create_graph', lambda: build_graph(rows, graph.Graph_dic))
+    g_dic = build_graph(rows, graph.Graph_dic)
+    timed('breadth_first_search', lambda: program.breadth_first_search(g_dic, root))
+
+    # Per day, for the given number of days
+    def spread_days(spread_func):
+        sim = simulation.Simulation(g, spread_func, root, -1, verbose=False)
+        start = time.perf_counter()
+        simulated = run_days(sim, days)
+        return (time.perf_counter() - start) / max(simulated, 1)
+
+    def per_day(name, spread_func):
+        if name not in skip:
+            result[name] = min(spread_days(spread_func) for _ in range(repeat))
+            print('{:<24}{:<24}{:>12.2f}ms'.format(label, name, result[name] * 1000), flush=True)
+
+    per_day('step_by_step_per_day', program.breadth_first_search_step_by_step)
+    per_day('next_per_day', spread.spread_step)
+
+    timed('layout', lambda: layout.compute(g, 'auto'), 1)
+
+    if 'render' not in skip:
+        try:
+            render = bench_render(g, root, repeat, skip)
+        except ImportError as e:
+            print('{:<24}{:<24}{:>14}'.format(label, 'render', 'skipped'), '(' + str(e) + ')', flush=True)
+            render = {}
+        for name, value in render.items():
+            result[name] = value
+            print('{:<24}{:<24}{:>12.2f}ms'.format(label, name, value * 1000), flush=True)
+
+    return result
+
+
+def run_suite(databases, sizes, repeat, days, skip, model='ba'):
+    """
+    Runs the suite on bundled databases and on synthetic graphs of increasing size.
+
+    Parameters
+    ----------
+    databases: type list: Names of the databases (without `_edges`).
+    sizes: type list: Number of vertices of each synthetic graph.
+    model: type string: Model of the synthetic graphs, see `synthetic_rows`.
+    repeat, days, skip: See `bench_graph`.
+
+    Returns
+    -------
+    type dict: 'meta' (machine and versions), and 'results': graph label -> durations
+    """
+    import cache
+
+    results = {}
+    for name in databases:
+        edges_db = db.Database(name + '_edges')
+        rows = edges_db.select_item()
+        g = cache.load_graph(edges_db, False)
+        results[name] = bench_graph(name, rows, g, repeat, days, skip)
+        results[name]['load'] = best_time(lambda: cache.load_graph(edges_db, False), repeat)
+        print('{:<24}{:<24}{:>12.2f}ms'.format(name, 'load', results[name]['load'] * 1000), flush=True)
+
+    for n in sizes:
+        rows = synthetic_rows(model, n)
+        g = build_graph(rows, graph.Graph_dic).freeze()
+        results[model + '_' + str(n)] = bench_graph(model + '_' + str(n), rows, g, repeat, days, skip)
+
+    meta = {'model': model, 'python': platform.python_version(), 'numpy': numpy.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'repeat': repeat, 'days': days, 'time': time.time()}
+    return {'meta': meta, 'results': results}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Flags the benchmarks slower than in the baseline by more than the tolerance.
+    Differences under a tenth of a millisecond are ignored: they are noise.
+
+    Parameters
+    ----------
+    results: type dict: Results of `run_suite`.
+    baseline: type dict: Results of a previous `run_suite`.
+    tolerance: type float: Accepted slowdown, .2 for 20%.
+
+    Returns
+    -------
+    type list of tuple: (graph, benchmark, baseline duration, duration) of the regressions
+    """
+    regressions = []
+    for label, measures in results['results'].items():
+        old = baseline['results'].get(label, {})
+        for name, value in measures.items():
+            if name in ('vertices', 'edges') or name not in old:
+                continue
+            if value > old[name] * (1 + tolerance) and value - old[name] > 1e-4:
+                regressions.append((label, name, old[name], value))
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+
+    if args.startup:
+        sys.exit(0 if check_startup(args.budget, args.repeat) else 1)
+
+    if args.suite:
+        results = run_suite(args.database, args.sizes, args.repeat, args.days, args.skip, args.model)
+        if args.save is not None:
+            with open(args.save, 'w') as f:
+                json.dump(results, f, indent=2)
+            print('results written to', args.save)
+
+        if args.compare is not None:
+            with open(args.compare) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            for label, name, old, new in regressions:
+                print('REGRESSION {:<24}{:<24}{:>10.2f}ms -> {:.2f}ms ({:+.0f}%)'.format(
+                    label, name, old * 1000, new * 1000, (new / old - 1) * 100))
+            print(len(regressions), 'regression(s) over', str(int(args.tolerance * 100)) + '%')
+            sys.exit(1 if regressions else 0)
+        return
+
+    print('{:<22}{:>8}{:>12}{:>12}{:>9}{:>12}{:>12}{:>9}'.format(
+        'database', 'edges', 'list build', 'set build', 'speedup', 'list edge', 'set edge', 'speedup'))
+    for name in args.database:
+        r = bench_adjacency(name, args.repeat)
+        print('{:<22}{:>8}{:>10.2f}ms{:>10.2f}ms{:>8.1f}x{:>10.2f}ms{:>10.2f}ms{:>8.1f}x'.format(
+            name, r['edges'],
+            r['list_build'] * 1000, r['set_build'] * 1000, r['list_build'] / r['set_build'],
+            r['list_edge'] * 1000, r['set_edge'] * 1000, r['list_edge'] / r['set_edge']))
+
+
+if __name__ == '__main__':
+    main()
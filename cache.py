@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy
+import graph
+
+
+# Version of the snapshot layout. Bump it when the files written below change.
+CACHE_VERSION = 1
+
+# Arrays of a snapshot. Each one is a plain .npy file, so it can be memory-mapped.
+CACHE_ARRAYS = ('indptr', 'indices', 'names', 'degrees')
+
+
+def cache_path(db_path):
+    """
+    Path of the compiled snapshot of a database file: a directory next to it.
+
+    Parameters
+    ----------
+    db_path: type string: Path to the .db file.
+
+    Returns
+    -------
+    type string
+    """
+    return os.path.splitext(db_path)[0] + '.cache'
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Hash of the content of a file, read by blocks.
+
+    Parameters
+    ----------
+    path: type string: Path to the file.
+    block_size: type int: Number of bytes read at once.
+
+    Returns
+    -------
+    type string: hexadecimal digest
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            h.update(block)
+            block = f.read(block_size)
+    return h.hexdigest()
+
+
+def fingerprint(path, with_hash=True):
+    """
+    Fingerprint of a database file: its size, modification time and (optionally) content hash.
+
+    Parameters
+    ----------
+    path: type string: Path to the file.
+    with_hash: type bool: Also hash the content of the file.
+
+    Returns
+    -------
+    type dict
+    """
+    st = os.stat(path)
+    fp = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+    if with_hash:
+        fp['hash'] = file_hash(path)
+    return fp
+
+
+def read_meta(path):
+    """
+    Read the metadata of a snapshot.
+
+    Parameters
+    ----------
+    path: type string: Path to the snapshot directory.
+
+    Returns
+    -------
+    type dict or None if there is no valid snapshot.
+    """
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    return meta
+
+
+def write_meta(path, meta):
+    """
+    Write the metadata of a snapshot.
+
+    Parameters
+    ----------
+    path: type string: Path to the snapshot directory.
+    meta: type dict: The metadata.
+
+    Returns
+    -------
+    """
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+
+def is_fresh(db_path, meta):
+    """
+    Check if a snapshot still matches its database file.
+    Size and modification time are checked first. If they changed, the content hash decides:
+    a file touched but not modified keeps its snapshot, whose metadata is then refreshed.
+
+    Parameters
+    ----------
+    db_path: type string: Path to the .db file.
+    meta: type dict: Metadata of the snapshot.
+
+    Returns
+    -------
+    boolean
+    """
+    fp = fingerprint(db_path, with_hash=False)
+    if fp['size'] == meta['size'] and fp['mtime'] == meta['mtime']:
+        return True
+
+    if fp['size'] != meta['size'] or file_hash(db_path) != meta['hash']:
+        return False
+
+    # Same content, new modification time
+    meta['mtime'] = fp['mtime']
+    try:
+        write_meta(cache_path(db_path), meta)
+    except OSError:
+        pass
+    return True
+
+
+def save(g, db_path):
+    """
+    Write the compiled snapshot of a graph next to its database file.
+    The snapshot is written in a temporary directory first, then moved, so a reader never sees half of it.
+
+    Parameters
+    ----------
+    g: type Graph_csr: The graph loaded from the database.
+    db_path: type string: Path to the .db file.
+
+    Returns
+    -------
+    type string: path to the snapshot
+    """
+    path = cache_path(db_path)
+    tmp = path + '.tmp' + str(os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    degrees = g.degrees()
+    arrays = {'indptr': g.indptr, 'indices': g.indices, 'names': g.names, 'degrees': degrees}
+    for name in CACHE_ARRAYS:
+        numpy.save(os.path.join(tmp, name + '.npy'), arrays[name])
+
+    return commit(tmp, db_path, degrees)
+
+
+def commit(tmp, db_path, degrees):
+    """
+    Writes the metadata of a snapshot written in a temporary directory, then moves it in place.
+
+    Parameters
+    ----------
+    tmp: type string: The temporary directory, holding the arrays of CACHE_ARRAYS.
+    db_path: type string: Path to the .db file.
+    degrees: type numpy.ndarray: degree of each vertice.
+
+    Returns
+    -------
+    type string: path to the snapshot
+    """
+    path = cache_path(db_path)
+
+    meta = fingerprint(db_path)
+    meta['version'] = CACHE_VERSION
+    meta['vertices'] = int(len(degrees))
+    meta['edges'] = int(degrees.sum() // 2)
+    meta['max_degree'] = int(degrees.max()) if len(degrees) > 0 else 0
+    meta['mean_degree'] = float(degrees.mean()) if len(degrees) > 0 else 0.
+    write_meta(tmp, meta)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+
+def load(db_path, mmap_mode='r'):
+    """
+    Map the compiled snapshot of a database file, if it exists and is up to date.
+
+    Parameters
+    ----------
+    db_path: type string: Path to the .db file.
+    mmap_mode: Mode given to numpy.load. None reads the arrays in memory.
+
+    Returns
+    -------
+    type FrozenGraph or None
+    """
+    path = cache_path(db_path)
+    meta = read_meta(path)
+    if meta is None or not os.path.exists(db_path) or not is_fresh(db_path, meta):
+        return None
+
+    try:
+        arrays = {name: numpy.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ('indptr', 'indices', 'names')}
+    except (OSError, ValueError):
+        return None
+
+    return graph.FrozenGraph(arrays['indptr'], arrays['indices'], arrays['names'])
+
+
+def load_graph(edges_db, use_cache=True):
+    """
+    Get the graph of an edges database: from its snapshot when possible, from SQLite otherwise.
+    A snapshot is written after each load from SQLite.
+
+    Parameters
+    ----------
+    edges_db: type Database: database of all links between people.
+    use_cache: type bool: False always loads from SQLite and does not write any snapshot.
+
+    Returns
+    -------
+    type FrozenGraph
+    """
+    if not use_cache:
+        return edges_db.load_csr()
+
+    g = load(edges_db.database)
+    if g is not None:
+        return g
+
+    g = edges_db.load_csr()
+    try:
+        save(g, edges_db.database)
+    except OSError as e:
+        # A read-only data directory only costs the speed up
+        print("cache error is saying:")
+        print(e)
+    return g
@@ -1,13 +1,97 @@
-import matplotlib as mpl
+import queue
+import time
 import matplotlib.pyplot as plt
 import numpy
 
 
-# Use a dedicated backend to handle interactive gui
-mpl.use('TkAgg')
+# Maximum number of points drawn for each curve: longer runs are decimated (min/max of each bucket of days)
+MAX_POINTS = 2000
 
-# Interactive mode on
-plt.ioff()
+# Minimum time between two redraws of the chart, in seconds
+REFRESH = .2
+
+# The curves of the chart and their color
+SERIES = ('total', 'daily', 'dead', 'immune')
+COLORS = ('#FF4348', 'y', '#000000', '#7B02FF')
+
+# Percentiles of the band drawn around the median of an ensemble
+BAND = (5, 95)
+
+
+class Buffer:
+    """
+    Growable columns of numbers: a preallocated array whose capacity doubles when it is full,
+    so appending a row is O(1) amortized instead of copying the whole history.
+    A row is a number per column, or an array of shape `columns` when it is a tuple.
+    """
+    __slots__ = ('data', 'size')
+
+    def __init__(self, columns, capacity=64):
+        shape = columns if isinstance(columns, tuple) else (columns,)
+        self.data = numpy.zeros((capacity,) + shape)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, row):
+        """
+        Appends a row.
+
+        Parameters
+        ----------
+        row: The values of the row, one per column.
+
+        Returns
+        -------
+        """
+        if self.size == len(self.data):
+            data = numpy.zeros((2 * len(self.data),) + self.data.shape[1:])
+            data[:self.size] = self.data
+            self.data = data
+        self.data[self.size] = row
+        self.size += 1
+
+    def view(self):
+        """
+        The rows appended so far, without copy.
+
+        Returns
+        -------
+        type numpy.ndarray: shape (rows,) + columns
+        """
+        return self.data[:self.size]
+
+
+def decimate(y, max_points=MAX_POINTS):
+    """
+    Min/max decimation: the points are cut in buckets and only the lowest and the highest point of each bucket
+    are kept, in order. The peaks of the curve stay visible whatever its length.
+
+    Parameters
+    ----------
+    y: type numpy.ndarray: The values of the curve.
+    max_points: type int: Maximum number of points kept.
+
+    Returns
+    -------
+    type numpy.ndarray: sorted indices of the points kept
+    """
+    n = len(y)
+    if n <= max_points:
+        return numpy.arange(n)
+
+    # Buckets of `size` points, the last one padded with its last point. Two points per bucket, plus the first and
+    # the last point of the curve, fit in max_points.
+    size = -(-n // max(1, (max_points - 2) // 2))
+    buckets = -(-n // size)
+    index = numpy.minimum(numpy.arange(buckets * size), n - 1).reshape(buckets, size)
+    values = y[index]
+
+    rows = numpy.arange(buckets)
+    low = index[rows, values.argmin(axis=1)]
+    high = index[rows, values.argmax(axis=1)]
+    return numpy.unique(numpy.concatenate((low, high, [0, n - 1])))
 
 
 class Chart:
@@ -22,6 +106,14 @@ class Chart:
         # To use later in setup_chart()
         self.total_p = self.daily_p = self.dead_p = self.immune_p = None
 
+        # History of the curves: day, total, daily, dead, immune. Day 0: 1 infected.
+        self.values = Buffer(5)
+        self.values.append((0, 1, 1, 0, 0))
+
+        # New values not drawn yet, and time of the last redraw
+        self.dirty = False
+        self.refreshed = 0.
+
         # Initialization & drawing
         self.setup_chart()
         self.draw()
@@ -39,8 +131,10 @@ class Chart:
         # Switching to figure n°1
         plt.figure(num=1)
 
-        # Auto scale axes to fit the curves
-        self.ax.set_autoscale_on(True)
+        # Axes are rescaled by refresh(), only when the curves go out of them
+        self.ax.set_autoscale_on(False)
+        self.ax.set_xlim(0, 10)
+        self.ax.set_ylim(0, 10)
 
         # plt.plot() return a tuple
         # Why this values:
@@ -48,17 +142,18 @@ class Chart:
         #   2) <=> day 0: 1 infected
         #   3) <=> [0], [1]
         #   Doing this for all curves
-        self.total_p, = plt.plot([0], [1], color='#FF4348')
-        self.daily_p, = plt.plot([0], [1], color='y')
-        self.dead_p, = plt.plot([0], [0], color='#000000')
-        self.immune_p, = plt.plot([0], [0], color='#7B02FF')
+        self.total_p, = plt.plot([0], [1], color=COLORS[0])
+        self.daily_p, = plt.plot([0], [1], color=COLORS[1])
+        self.dead_p, = plt.plot([0], [0], color=COLORS[2])
+        self.immune_p, = plt.plot([0], [0], color=COLORS[3])
 
         # Legend on the upper left corner
-        plt.legend(['total', 'daily', 'dead', 'immune'], loc='upper left')
+        plt.legend(SERIES, loc='upper left')
 
     def add_values(self, day, total, daily, dead, immune):
         """
-        Add values to the plot. For each value: to set_data => in x and y (coordinate of point)
+        Add values to the plot. The values are appended to the history (O(1)), then drawn by `refresh`
+        at most every REFRESH seconds. A day that is not after the last one is ignored.
 
         Parameters
         ----------
@@ -73,38 +168,217 @@ class Chart:
 
         """
         
-        # Switching to figure n°1
-        plt.figure(num=1)
+        # Only real day changes add a point
+        if day <= self.values.view()[-1, 0]:
+            return
 
-        # We add data in x => numpy.append: (the_array, the_value)
-        # Same on y axis
-        self.daily_p.set_xdata(numpy.append(self.daily_p.get_xdata(), day))
-        self.daily_p.set_ydata(numpy.append(self.daily_p.get_ydata(), daily))
-    
-        self.total_p.set_xdata(numpy.append(self.total_p.get_xdata(), day))
-        self.total_p.set_ydata(numpy.append(self.total_p.get_ydata(), total))
+        self.values.append((day, total, daily, dead, immune))
+        self.dirty = True
+        self.refresh()
 
-        self.dead_p.set_xdata(numpy.append(self.dead_p.get_xdata(), day))
-        self.dead_p.set_ydata(numpy.append(self.dead_p.get_ydata(), dead))
-        
-        self.immune_p.set_xdata(numpy.append(self.immune_p.get_xdata(), day))
-        self.immune_p.set_ydata(numpy.append(self.immune_p.get_ydata(), immune))
+    def refresh(self, force=False):
+        """
+        Sets the curves from the history (decimated when long) and redraws the chart, if there are new values and
+        the last redraw is older than REFRESH seconds. The axes are only rescaled when a value goes out of them.
 
-        # (Re)Drawing to update visible curves
-        self.draw()
+        Parameters
+        ----------
+        force: type bool: Redraw whatever the time of the last redraw.
+
+        Returns
+        -------
+        """
+        if not self.dirty or (not force and time.perf_counter() - self.refreshed < REFRESH):
+            return
+
+        values = self.values.view()
+        days = values[:, 0]
+        for column, line in enumerate((self.total_p, self.daily_p, self.dead_p, self.immune_p), 1):
+            kept = decimate(values[:, column])
+            line.set_data(days[kept], values[kept, column])
+
+        # Rescale with some room ahead, so that the next days rarely need it
+        (_, right), (_, top) = self.ax.get_xlim(), self.ax.get_ylim()
+        if days[-1] > right or values[:, 1:].max() > top:
+            self.ax.set_xlim(0, max(10., days[-1] * 1.5))
+            self.ax.set_ylim(0, max(10., values[:, 1:].max() * 1.2))
+
+        self.dirty = False
+        self.refreshed = time.perf_counter()
+        self.figure.canvas.draw_idle()
 
     def draw(self):
         """
         Draw the plot.
         """
 
-        # Recompute axes
-        self.ax.relim()
-
-        # Scale the axes
-        self.ax.autoscale_view(True, True, True)
-
         # Draw !
         # Switching to figure n°1
         plt.figure(1)
         plt.draw()
+
+
+class BandChart:
+    """
+    Chart of an ensemble: for each curve, the median of the replicas and the band between the BAND percentiles.
+    The replicas are kept sorted day by day: a new replica is inserted in place (O(replicas) per day, no sort),
+    and a percentile is then read in O(days) from the two ranks around it, like numpy's linear method.
+    """
+
+    def __init__(self, days, band=BAND):
+        # Figure to draw on, its id is 1 like the chart of the GUI
+        self.figure = plt.figure(num=1)
+        self.ax = plt.gca()
+        self.band = band
+
+        # Sorted values of the replicas: row k holds, for each curve and each day, the k-th smallest value
+        self.days = numpy.arange(days + 1)
+        self.sorted = Buffer((len(SERIES), days + 1))
+
+        # New replicas not drawn yet, and time of the last redraw
+        self.dirty = False
+        self.refreshed = 0.
+
+        # Median of each curve, and its band (a PolyCollection of fill_between, replaced on each redraw)
+        self.medians = [self.ax.plot([], [], color=color)[0] for color in COLORS]
+        self.bands = [None] * len(SERIES)
+
+        self.ax.set_autoscale_on(False)
+        self.ax.set_xlim(0, max(1, days))
+        self.ax.set_ylim(0, 10)
+        self.ax.legend(self.medians, SERIES, loc='upper left')
+        self.ax.set_title('0 replicas')
+
+    def add_replicas(self, replicas):
+        """
+        Adds replicas to the chart, then redraws it (see `refresh`).
+
+        Parameters
+        ----------
+        replicas: type numpy.ndarray: series of a replica, shape (4, days + 1) in the order of SERIES,
+                  or of several replicas stacked, shape (replicas, 4, days + 1).
+
+        Returns
+        -------
+        """
+        replicas = numpy.asarray(replicas)
+        for series in replicas.reshape((-1,) + replicas.shape[-2:]):
+            self.insert(series)
+        self.dirty = True
+        self.refresh()
+
+    def insert(self, series):
+        """
+        Inserts a replica in the sorted values: for each curve and day, the values above it move up one row.
+        Only the rows from the lowest insertion rank are rewritten.
+
+        Parameters
+        ----------
+        series: type numpy.ndarray: series of the replica, shape (4, days + 1).
+
+        Returns
+        -------
+        """
+        self.sorted.append(series)
+        values = self.sorted.view()
+
+        # Rank of the new value among the previous ones
+        rank = (values[:-1] <= series).sum(axis=0)
+        low = int(rank.min())
+        rows = numpy.arange(low, len(values)).reshape(-1, 1, 1)
+
+        # Above its rank, a row takes the value of the row below it, then the new value goes at its rank
+        moved = values[low:-1]
+        below = numpy.concatenate((moved[:1], moved)) if len(moved) > 0 else values[low:]
+        values[low:] = numpy.where(rows > rank, below, values[low:])
+        numpy.put_along_axis(values, rank[numpy.newaxis], series[numpy.newaxis], axis=0)
+
+    def percentile(self, q):
+        """
+        Percentile of the replicas, for each curve and day (linear interpolation between the closest ranks).
+
+        Parameters
+        ----------
+        q: type float: The percentile, between 0 and 100.
+
+        Returns
+        -------
+        type numpy.ndarray: shape (4, days + 1)
+        """
+        values = self.sorted.view()
+        position = q / 100 * (len(values) - 1)
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (position - low)
+
+    def refresh(self, force=False):
+        """
+        Redraws the medians and the bands if there are new replicas and the last redraw is older than REFRESH seconds.
+
+        Parameters
+        ----------
+        force: type bool: Redraw whatever the time of the last redraw.
+
+        Returns
+        -------
+        """
+        if not self.dirty or len(self.sorted) == 0 or \
+                (not force and time.perf_counter() - self.refreshed < REFRESH):
+            return
+
+        median = self.percentile(50)
+        lower, upper = self.percentile(self.band[0]), self.percentile(self.band[1])
+        for i, color in enumerate(COLORS):
+            self.medians[i].set_data(self.days, median[i])
+            if self.bands[i] is not None:
+                self.bands[i].remove()
+            self.bands[i] = self.ax.fill_between(self.days, lower[i], upper[i], color=color, alpha=.25, linewidth=0)
+
+        # Rescale only when the bands go out of the axes
+        top = upper.max()
+        if top > self.ax.get_ylim()[1]:
+            self.ax.set_ylim(0, top * 1.2)
+        self.ax.set_title(str(len(self.sorted)) + ' replicas, median and ' + str(self.band[0]) + '-' +
+                          str(self.band[1]) + '% band')
+
+        self.dirty = False
+        self.refreshed = time.perf_counter()
+        self.figure.canvas.draw_idle()
+
+    def follow(self, runner):
+        """
+        Starts an ensemble runner and draws its replicas as they come, until all of them are done.
+        The window then stays open until it is closed.
+
+        Parameters
+        ----------
+        runner: type ensemble.Runner: The runner, not started yet.
+
+        Returns
+        -------
+        type dict: the result of the ensemble, see `ensemble.run_ensemble`.
+        """
+        runner.start()
+        plt.show(block=False)
+
+        done = False
+        while not done:
+            # Takes all the replicas done so far, without waiting
+            replicas = []
+            try:
+                while True:
+                    series = runner.replicas.get_nowait()
+                    if series is None:
+                        done = True
+                        break
+                    replicas.append(series)
+            except queue.Empty:
+                pass
+
+            if len(replicas) > 0:
+                self.add_replicas(numpy.stack(replicas))
+            self.figure.canvas.start_event_loop(REFRESH)
+
+        self.refresh(True)
+        plt.show()
+        return runner.result()
@@ -0,0 +1,29 @@
+import numpy
+import pytest
+import generators
+import graph
+
+
+def erdos_renyi_graph(n, degree, seed):
+    """
+    Erdos-Renyi graph of `n` vertices, built with `Graph_csr.from_edges` (see generators.py).
+
+    Parameters
+    ----------
+    n: type int: Number of vertices.
+    degree: type float: Mean degree.
+    seed: type int: Seed of the graph.
+
+    Returns
+    -------
+    type FrozenGraph
+    """
+    chunks = list(generators.erdos_renyi(n, degree / (n - 1), seed))
+    src = numpy.concatenate([c[0] for c in chunks])
+    dst = numpy.concatenate([c[1] for c in chunks])
+    return graph.FrozenGraph.from_edges(src, dst, numpy.arange(n).astype(str))
+
+
+@pytest.fixture
+def random_graph():
+    return erdos_renyi_graph
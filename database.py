@@ -2,6 +2,13 @@ import pathlib
 import sqlite3
 from sqlite3 import Error
 import os
+import numpy
+import graph
+
+
+# Number of rows fetched at once by load_csr. The ids of the names depend on it: a chunk interns all its first
+# column, then all its second column.
+FETCH_SIZE = 65536
 
 
 class Database:
@@ -42,6 +49,57 @@ class Database:
 
         return rows
 
+    def edge_columns(self):
+        """
+        Get the name of the two first columns of the table, the ones holding the linked vertices.
+
+        Returns
+        -------
+        type tuple: (column1, column2)
+        """
+        cur = self.conn.cursor()
+        cur.execute('PRAGMA table_info("' + self.file_name + '")')
+
+        # Rows of table_info are (cid, name, type, notnull, default, pk)
+        columns = [row[1] for row in cur.fetchall()]
+
+        return columns[0], columns[1]
+
+    def load_csr(self, chunk_size=FETCH_SIZE):
+        """
+        Load the edges table as a CSR graph.
+        Rows are streamed by chunks with fetchmany and the names are interned to dense integer ids on the fly,
+        so only the id arrays are kept in memory (no per-edge Python object is stored).
+
+        Parameters
+        ----------
+        chunk_size: type int: Number of rows fetched at once.
+
+        Returns
+        -------
+        type FrozenGraph
+        """
+        c1, c2 = self.edge_columns()
+        cur = self.conn.cursor()
+        cur.execute('SELECT "' + c1 + '", "' + c2 + '" FROM "' + self.file_name + '"')
+
+        # name -> id. setdefault gives the next free id to an unknown name.
+        ids = {}
+        src_chunks = []
+        dst_chunks = []
+
+        rows = cur.fetchmany(chunk_size)
+        while len(rows) > 0:
+            src_chunks.append(numpy.fromiter((ids.setdefault(r[0], len(ids)) for r in rows), numpy.int32, len(rows)))
+            dst_chunks.append(numpy.fromiter((ids.setdefault(r[1], len(ids)) for r in rows), numpy.int32, len(rows)))
+            rows = cur.fetchmany(chunk_size)
+
+        src = numpy.concatenate(src_chunks) if src_chunks else numpy.zeros(0, numpy.int32)
+        dst = numpy.concatenate(dst_chunks) if dst_chunks else numpy.zeros(0, numpy.int32)
+        names = numpy.array([str(name) for name in ids], dtype=str)
+
+        return graph.FrozenGraph.from_edges(src, dst, names)
+
     def select_status(self, name):
         """
         Select status. For exemple infected or not. (NOT USED)
@@ -0,0 +1,247 @@
+import multiprocessing
+import queue
+import random
+import threading
+import numpy
+import database as db
+import cache
+import simulation
+import spread
+
+
+# The four series of the chart
+SERIES = ('total', 'daily', 'dead', 'immune')
+
+# Graph of the worker process, loaded once by `init_worker`
+worker_graph = None
+
+
+def load_graph(edges_name, use_cache=True):
+    """
+    Loads the graph of an edges database.
+
+    Parameters
+    ----------
+    edges_name: type string: Name of the edges database, `got_edges` for example.
+    use_cache: type bool: Use the compiled snapshot of the database.
+
+    Returns
+    -------
+    type FrozenGraph
+    """
+    return cache.load_graph(db.Database(edges_name), use_cache)
+
+
+def init_worker(edges_name, use_cache):
+    """
+    Initializer of the pool's processes: each worker loads the graph once, for all its replicas.
+    With the snapshot, the workers map the same files and share their pages.
+
+    Parameters
+    ----------
+    edges_name: type string: Name of the edges database.
+    use_cache: type bool: Use the compiled snapshot of the database.
+
+    Returns
+    -------
+    """
+    global worker_graph
+    worker_graph = load_graph(edges_name, use_cache)
+
+
+def replica_seeds(seed, replicas):
+    """
+    Derives independent seeds from a master seed, one per replica.
+    The seed of a replica only depends on the master seed and its index, not on the number of workers.
+
+    Parameters
+    ----------
+    seed: type int: The master seed.
+    replicas: type int: Number of replicas.
+
+    Returns
+    -------
+    type list of int
+    """
+    children = numpy.random.SeedSequence(seed).spawn(replicas)
+    return [int(child.generate_state(1, numpy.uint64)[0]) for child in children]
+
+
+def run_replica(job):
+    """
+    Runs one replica in the worker, on the graph of the worker.
+
+    Parameters
+    ----------
+    job: type tuple: (seed, root, lockdown, days, params). An empty root is drawn at random.
+
+    Returns
+    -------
+    type numpy.ndarray: the series, shape (4, days + 1), in the order of SERIES.
+    """
+    seed, root, lockdown, days, params = job
+
+    # Both the `random` module and the numpy generators of the spread derive from this seed
+    random.seed(seed)
+    g = worker_graph
+    if root == '':
+        vertices = g.vertices()
+        root = vertices[random.randint(0, len(vertices) - 1)]
+
+    sim = simulation.Simulation(g, spread.spread_step, root, lockdown, verbose=False, **params)
+    series = simulation.run(sim, days, until_over=False)
+
+    return numpy.array([series[name] for name in SERIES], dtype=numpy.int64)
+
+
+def iter_replicas(edges_name, replicas, workers=1, seed=0, root='', lockdown=-1, days=365, use_cache=True,
+                  **params):
+    """
+    Runs independent replicas of the simulation across a pool of processes, and yields each one as soon as it is done.
+    The parameters are those of `run_ensemble`.
+
+    Returns
+    -------
+    generator of tuple: (replica index, series of shape (4, days + 1)), in the order the replicas finish.
+    """
+    jobs = [(s, root, lockdown, days, params) for s in replica_seeds(seed, replicas)]
+
+    if workers <= 1:
+        init_worker(edges_name, use_cache)
+        for i, job in enumerate(jobs):
+            yield i, run_replica(job)
+        return
+
+    # Loading here first writes the snapshot, so the workers only map it.
+    load_graph(edges_name, use_cache)
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(edges_name, use_cache)) as pool:
+        indexed = pool.imap_unordered(run_indexed, enumerate(jobs), chunksize=max(1, replicas // (16 * workers)))
+        for result in indexed:
+            yield result
+
+
+def run_indexed(job):
+    """
+    `run_replica` for `imap_unordered`: the index of the replica comes back with its series.
+
+    Parameters
+    ----------
+    job: type tuple: (replica index, job of `run_replica`).
+
+    Returns
+    -------
+    type tuple: (replica index, series)
+    """
+    i, job = job
+    return i, run_replica(job)
+
+
+def stack_results(results, days):
+    """
+    Result of an ensemble from the series of its replicas.
+
+    Parameters
+    ----------
+    results: type list: series of each replica, in order.
+    days: type int: Number of simulated days.
+
+    Returns
+    -------
+    type dict: see `run_ensemble`.
+    """
+    stacked = numpy.stack(results) if results else numpy.zeros((0, len(SERIES), days + 1), dtype=numpy.int64)
+    out = {'day': numpy.arange(days + 1)}
+    for i, name in enumerate(SERIES):
+        out[name] = stacked[:, i, :]
+    return out
+
+
+def run_ensemble(edges_name, replicas, workers=1, seed=0, root='', lockdown=-1, days=365, use_cache=True,
+                 **params):
+    """
+    Runs independent replicas of the simulation across a pool of processes.
+
+    Parameters
+    ----------
+    edges_name: type string: Name of the edges database, `got_edges` for example.
+    replicas: type int: Number of replicas.
+    workers: type int: Number of processes. 1 runs in this process.
+    seed: type int: The master seed. The same seed gives the same results, whatever the number of workers.
+    root: Name of the first infected vertice. Empty: random, drawn by each replica.
+    lockdown: type int: Number of days between infection and lockdown, -1 to disable it.
+    days: type int: Number of simulated days.
+    use_cache: type bool: Use the compiled snapshot of the database.
+    params: Values of the simulation: r0, r0_delta, day_to_immunity, immunity_period, deathprob, and debug.
+
+    Returns
+    -------
+    type dict: 'day': numpy.ndarray of the days, and for each name of SERIES a numpy.ndarray of shape (replicas, days + 1).
+    """
+    results = [None] * replicas
+    for i, series in iter_replicas(edges_name, replicas, workers, seed, root, lockdown, days, use_cache, **params):
+        results[i] = series
+    return stack_results(results, days)
+
+
+class Runner(threading.Thread):
+    """
+    Runs an ensemble in a background thread (see `iter_replicas`), so that a chart can draw the replicas while
+    they come. Each finished replica is put in the queue `replicas`, then None once all of them are done.
+    The parameters are those of `run_ensemble`.
+    """
+    def __init__(self, edges_name, replicas, workers=1, seed=0, root='', lockdown=-1, days=365, use_cache=True,
+                 **params):
+        super().__init__(daemon=True)
+        self.args = (edges_name, replicas, workers, seed, root, lockdown, days, use_cache)
+        self.params = params
+        self.days = days
+        self.replicas = queue.Queue()
+
+        # Series of each replica, by index, and the exception that stopped the thread
+        self.results = [None] * replicas
+        self.error = None
+
+    def run(self):
+        try:
+            for i, series in iter_replicas(*self.args, **self.params):
+                self.results[i] = series
+                self.replicas.put(series)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.replicas.put(None)
+
+    def result(self):
+        """
+        Result of the ensemble, once the thread is done.
+
+        Returns
+        -------
+        type dict: see `run_ensemble`.
+        """
+        if self.error is not None:
+            raise self.error
+        return stack_results(self.results, self.days)
+
+
+def write_ensemble(result, path=None):
+    """
+    Writes the results of an ensemble: all the replicas in a .npz file, or the mean of each day as CSV.
+
+    Parameters
+    ----------
+    result: type dict: The result of `run_ensemble`.
+    path: type string: Path of the output. A .npz path gets the stacked arrays, any other path the CSV of the means.
+          None prints the CSV.
+
+    Returns
+    -------
+    """
+    if path is not None and path.endswith('.npz'):
+        numpy.savez(path, **result)
+        return
+
+    series = {'day': result['day'].tolist()}
+    for name in SERIES:
+        series[name] = result[name].mean(axis=0).tolist() if len(result[name]) > 0 else []
+    simulation.write_series(series, path)
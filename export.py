@@ -0,0 +1,260 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import matplotlib as mpl
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import numpy
+import layout
+import simulation
+
+
+# Color of each compartment of the store (susceptible, infected, immune, locked, dead), as in `visual.State`
+COLORS = ('#35FFAD', '#FF4348', '#7B02FF', '#A19DA4', '#000000')
+
+# Level of detail of the frames, as in `visual.py`: labels up to LABEL_THRESHOLD vertices, at most EDGE_BUDGET edges
+LABEL_THRESHOLD = 500
+EDGE_BUDGET = 20000
+
+# Figure of a rendering process and its artists, created once by `init_worker`
+worker = {}
+
+
+def edge_segments(g, xy, budget=EDGE_BUDGET):
+    """
+    Segments of the edges of a graph, each edge once. Above `budget` edges, a fixed random sample is kept.
+
+    Parameters
+    ----------
+    g: type Graph_csr: The graph.
+    xy: type numpy.ndarray: position of each vertice, shape (n, 2).
+    budget: type int: Maximum number of edges.
+
+    Returns
+    -------
+    type numpy.ndarray: shape (edges, 2, 2)
+    """
+    src = numpy.repeat(numpy.arange(len(g.names)), numpy.diff(g.indptr))
+    dst = numpy.asarray(g.indices, dtype=numpy.int64)
+    once = src < dst
+    src, dst = src[once], dst[once]
+
+    if len(src) > budget:
+        keep = numpy.sort(numpy.random.default_rng(0).choice(len(src), budget, replace=False))
+        src, dst = src[keep], dst[keep]
+
+    return numpy.stack((xy[src], xy[dst]), axis=1)
+
+
+def init_worker(xy, segments, names, total, figsize, dpi):
+    """
+    Creates the figure of a rendering process: an Agg canvas, without pyplot nor any window.
+    Edges, positions and labels are the same for all frames. The edges are rendered once into a background,
+    and the labels once into a transparent layer: a frame only draws the nodes and the text over the background,
+    then lays the labels over it.
+
+    Parameters
+    ----------
+    xy: type numpy.ndarray: position of each vertice, shape (n, 2).
+    segments: type numpy.ndarray: segments of the edges, from `edge_segments`.
+    names: type list: label of each vertice, or None to draw no labels.
+    total: type int: Number of vertices, for the text.
+    figsize: type tuple: Size of the frames in inches.
+    dpi: type int: Dots per inch.
+
+    Returns
+    -------
+    """
+    figure = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_axes([0, 0, 1, .92])
+    ax.set_axis_off()
+
+    edges = LineCollection(segments, colors='#BABBC1', linewidths=1, zorder=1)
+    ax.add_collection(edges)
+    size = 300 if names is not None else max(2., 300 * LABEL_THRESHOLD / max(len(xy), 1))
+    nodes = ax.scatter(xy[:, 0], xy[:, 1], s=size, zorder=2)
+    labels = []
+    if names is not None:
+        for (x, y), name in zip(xy.tolist(), names):
+            labels.append(ax.text(x, y, name, size=12, color='k', family='sans-serif', horizontalalignment='center',
+                                  verticalalignment='center', clip_on=True, zorder=3))
+
+    # Same view as `visual.State`
+    low = xy.min(axis=0) if len(xy) > 0 else numpy.array([-1., -1.])
+    high = xy.max(axis=0) if len(xy) > 0 else numpy.array([1., 1.])
+    margin = .05 * numpy.maximum(high - low, 1e-3)
+    ax.set_xlim(low[0] - margin[0], high[0] + margin[0])
+    ax.set_ylim(low[1] - margin[1], high[1] + margin[1])
+
+    text = figure.text(.02, .96, '', color='black', fontsize=15, verticalalignment='center')
+
+    # Labels alone on a transparent figure: their layer, as premultiplied colors and opacity
+    edges.set_visible(False)
+    nodes.set_visible(False)
+    figure.patch.set_alpha(0)
+    canvas.draw()
+    layer = numpy.asarray(canvas.buffer_rgba()).astype(numpy.float32) / 255
+    worker['label_alpha'] = layer[:, :, 3:]
+    worker['label_color'] = layer[:, :, :3] * layer[:, :, 3:] * 255
+
+    # Edges alone: the background of every frame
+    for label in labels:
+        label.set_visible(False)
+    edges.set_visible(True)
+    figure.patch.set_alpha(1)
+    canvas.draw()
+    worker['background'] = canvas.copy_from_bbox(figure.bbox)
+    nodes.set_visible(True)
+
+    worker['figure'] = figure
+    worker['nodes'] = nodes
+    worker['text'] = text
+    worker['labels'] = len(labels) > 0
+    worker['total'] = total
+    worker['pallet'] = mpl.colors.to_rgba_array(COLORS)
+
+
+def render_frame(job):
+    """
+    Renders one day in the figure of the process.
+
+    Parameters
+    ----------
+    job: type tuple: (day, compartment of each vertice, number of cases).
+
+    Returns
+    -------
+    type numpy.ndarray: RGB image, shape (height, width, 3)
+    """
+    day, codes, cases = job
+    worker['nodes'].set_facecolor(worker['pallet'][codes])
+    worker['text'].set_text('Day: ' + str(day) + '    Cases: ' + str(cases) + '/' + str(worker['total']))
+
+    figure = worker['figure']
+    figure.canvas.restore_region(worker['background'])
+    figure.draw_artist(worker['nodes'])
+    figure.draw_artist(worker['text'])
+
+    frame = numpy.asarray(figure.canvas.buffer_rgba())[:, :, :3]
+    if not worker['labels']:
+        return frame.copy()
+    return (frame * (1 - worker['label_alpha']) + worker['label_color']).astype(numpy.uint8)
+
+
+def write_gif(frames, path, fps):
+    """
+    Writes frames as an animated GIF with Pillow (a dependency of matplotlib). The frames are consumed one by one.
+
+    Parameters
+    ----------
+    frames: iterable of RGB images.
+    path: type string: Path of the GIF file.
+    fps: type float: Frames per second.
+
+    Returns
+    -------
+    """
+    from PIL import Image
+
+    frames = iter(frames)
+    first = Image.fromarray(next(frames))
+    first.save(path, save_all=True, append_images=(Image.fromarray(f) for f in frames),
+               duration=int(round(1000 / fps)), loop=0)
+
+
+def write_mp4(frames, path, fps, encoder):
+    """
+    Writes frames as an MP4 video: they are streamed as raw RGB to ffmpeg.
+
+    Parameters
+    ----------
+    frames: iterable of RGB images.
+    path: type string: Path of the MP4 file.
+    fps: type float: Frames per second.
+    encoder: type string: Path of the ffmpeg executable.
+
+    Returns
+    -------
+    """
+    frames = iter(frames)
+    first = next(frames)
+    height, width, _ = first.shape
+
+    command = [encoder, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+               '-s', str(width) + 'x' + str(height), '-r', str(fps), '-i', '-',
+               '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        process.stdin.write(first.tobytes())
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError('ffmpeg exited with code ' + str(process.returncode))
+
+
+def export(g, spread_func, root, lockdown, path, max_days=365, workers=1, fps=4, layout_method='auto',
+           use_cache=True, figsize=(8, 8), dpi=100, **params):
+    """
+    Exports the spread as an animation, without any window: the simulation runs headless and records the compartment
+    of every vertice each day, then the frames are rendered with Agg by a pool of processes sharing the layout,
+    and streamed in order to the GIF or MP4 file.
+
+    Parameters
+    ----------
+    g: type Graph_dic or FrozenGraph: The graph.
+    spread_func: A function to handle the spread.
+    root: Name of the first infected vertice.
+    lockdown: type int: The lockdown duration. Or -1 if lockdown is disabled.
+    path: type string: Path of the animation. `.mp4` needs ffmpeg, a GIF is written otherwise.
+    max_days: type int: Maximum number of simulated days.
+    workers: type int: Number of rendering processes.
+    fps: type float: Frames per second.
+    layout_method: type string: Layout of the graph, one of `layout.METHODS`.
+    use_cache: type bool: Reuse (and write) the layout file of the graph.
+    figsize: type tuple: Size of the frames in inches.
+    dpi: type int: Dots per inch.
+    params: Values of the simulation: r0, r0_delta, day_to_immunity, immunity_period, deathprob.
+
+    Returns
+    -------
+    type string: path of the written file
+    """
+    sim = simulation.Simulation(g, spread_func, root, lockdown, verbose=False, **params)
+    series = simulation.run(sim, max_days, record_states=True)
+    g = sim.g
+
+    xy = layout.positions(g, layout_method, use_cache)
+    names = g.names.tolist() if len(xy) <= LABEL_THRESHOLD else None
+    setup = (xy, edge_segments(g, xy), names, len(xy), figsize, dpi)
+    jobs = zip(series['day'], series['states'], series['total'])
+
+    encoder = None
+    if os.path.splitext(path)[1].lower() == '.mp4':
+        encoder = shutil.which(mpl.rcParams['animation.ffmpeg_path'])
+        if encoder is None:
+            path = os.path.splitext(path)[0] + '.gif'
+            print('export: ffmpeg not found, writing', path, 'instead')
+
+    def write(frames):
+        if encoder is not None:
+            write_mp4(frames, path, fps, encoder)
+        else:
+            write_gif(frames, path, fps)
+
+    if workers <= 1:
+        init_worker(*setup)
+        write(render_frame(job) for job in jobs)
+    else:
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=setup) as pool:
+            # imap keeps the order of the days while the processes render ahead
+            write(pool.imap(render_frame, jobs, chunksize=4))
+
+    print('export:', len(series['day']), 'days written to', path)
+    return path
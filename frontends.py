@@ -0,0 +1,126 @@
+import simulation
+
+
+# Interactive backend of matplotlib used by the windows
+GUI_BACKEND = 'TkAgg'
+
+
+def use_gui_backend():
+    """
+    Selects the interactive backend of matplotlib, before `visual` or `chart` draw anything.
+    matplotlib (and Tk) are only imported here, by the frontends that open a window.
+
+    Returns
+    -------
+    """
+    import matplotlib.pyplot as plt
+
+    # Loads the backend now: pyplot would only load it with the first figure
+    try:
+        plt.switch_backend(GUI_BACKEND)
+    except ImportError as e:
+        raise RuntimeError('The ' + GUI_BACKEND + ' backend of matplotlib can not be loaded (' + str(e) + '). '
+                           'Use --headless or --export to run without a window.') from e
+
+
+def run_tk(g, spread_func, root, args, params):
+    """
+    Interactive frontend: the graph and the chart in Tk windows, with the controls of `visual.State`.
+
+    Parameters
+    ----------
+    g: type FrozenGraph: The graph.
+    spread_func: A function to handle the spread.
+    root: Name of the first infected vertice.
+    args: The command line options of `program.py`.
+    params: Values of the simulation: r0, r0_delta, day_to_immunity, immunity_period, deathprob.
+
+    Returns
+    -------
+    """
+    use_gui_backend()
+    import chart
+    import visual
+
+    # Chart to plot spread numbers
+    chart_instance = chart.Chart()
+
+    # Start the GUI process to render the spread
+    visual.show_graph(g, spread_func, root, abs(args.animationtime), chart_instance, args.lockdown, args.layout,
+                      not args.nocache, debug=args.debug, **params)
+
+
+def run_headless(g, spread_func, root, args, params):
+    """
+    Headless frontend: same dynamics, no window, as fast as possible. The daily numbers are written as CSV.
+    Neither matplotlib nor networkx are imported.
+
+    Parameters
+    ----------
+    See `run_tk`.
+
+    Returns
+    -------
+    """
+    sim = simulation.Simulation(g, spread_func, root, args.lockdown, verbose=False, debug=args.debug, **params)
+    simulation.write_series(simulation.run(sim, args.days), args.output)
+
+
+def run_export(g, spread_func, root, args, params):
+    """
+    Export frontend: same dynamics, frames rendered offline with Agg by a pool of processes (see `export.export`).
+    It needs matplotlib, but no window.
+
+    Parameters
+    ----------
+    See `run_tk`.
+
+    Returns
+    -------
+    """
+    import export
+    export.export(g, spread_func, root, args.lockdown, args.export, args.days, args.workers, args.fps, args.layout,
+                  not args.nocache, **params)
+
+
+def show_bands(runner, days):
+    """
+    Chart of an ensemble in a Tk window, drawn while its replicas run (see `chart.BandChart`).
+
+    Parameters
+    ----------
+    runner: type ensemble.Runner: The runner, not started yet.
+    days: type int: Number of simulated days.
+
+    Returns
+    -------
+    type dict: the result of the ensemble, see `ensemble.run_ensemble`.
+    """
+    use_gui_backend()
+    import chart
+    return chart.BandChart(days).follow(runner)
+
+
+# The frontends by name. Each one imports the modules it needs when it runs.
+FRONTENDS = {
+    'tk': run_tk,
+    'headless': run_headless,
+    'export': run_export,
+}
+
+
+def run(name, g, spread_func, root, args, params):
+    """
+    Runs the simulation in a frontend.
+
+    Parameters
+    ----------
+    name: type string: Name of the frontend, a key of FRONTENDS.
+    g, spread_func, root, args, params: See `run_tk`.
+
+    Returns
+    -------
+    """
+    if name not in FRONTENDS:
+        raise ValueError('Unknown frontend ' + repr(name) + ', expected one of ' + ', '.join(FRONTENDS))
+    FRONTENDS[name](g, spread_func, root, args, params)
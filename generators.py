@@ -0,0 +1,517 @@
+import argparse
+import os
+import shutil
+import tempfile
+import numpy
+import database as db
+import cache
+
+# ArgumentParser is used to get the command line options from the terminal.
+parser = argparse.ArgumentParser(
+    description='Generate a synthetic graph as an edges and a vertices database, usable with -db',
+    epilog='Example: python3 generators.py ba -n 1000000 --degree 5 --name ba1m --compile, '
+           'then python3 program.py -db ba1m --headless'
+)
+parser.add_argument(
+    'model',
+    type=str,
+    choices=('er', 'ba', 'ws', 'sbm'),
+    help='Erdos-Renyi, Barabasi-Albert, Watts-Strogatz or stochastic block model.'
+)
+parser.add_argument(
+    '-n',
+    '--vertices',
+    type=int,
+    default=10000,
+    help='Number of vertices. With sbm, the blocks are --blocks vertices each.'
+)
+parser.add_argument(
+    '--degree',
+    type=float,
+    default=4,
+    help='er: mean degree. ba: edges added by each vertice. ws: neighbors of each vertice in the ring (even).'
+)
+parser.add_argument(
+    '--beta',
+    type=float,
+    default=.1,
+    help='ws: probability to rewire each edge of the ring.'
+)
+parser.add_argument(
+    '--blocks',
+    type=int,
+    nargs='+',
+    default=None,
+    help='sbm: size of each block. By default, 10 blocks share the vertices.'
+)
+parser.add_argument(
+    '--p-in',
+    type=float,
+    default=None,
+    help='sbm: probability of an edge inside a block. By default, a mean degree of --degree inside the blocks.'
+)
+parser.add_argument(
+    '--p-out',
+    type=float,
+    default=None,
+    help='sbm: probability of an edge between two blocks. By default, a mean degree of 1 out of the blocks.'
+)
+parser.add_argument(
+    '--name',
+    type=str,
+    required=True,
+    help='Name of the graph: data/<name>_edges.db and data/<name>_vertices.db are written.'
+)
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=0,
+    help='Seed of the graph. The same seed gives the same graph.'
+)
+parser.add_argument(
+    '--chunk',
+    type=int,
+    default=1 << 20,
+    help='Number of edges generated and written at once. The memory used is proportional to it.'
+)
+parser.add_argument(
+    '--compile',
+    action='store_true',
+    help='Also write the compiled snapshot of the graph (see cache.py), so that the first load is a mapping.'
+)
+
+
+def pair_chunks(count, p, rng, chunk_size):
+    """
+    Independent Bernoulli(p) trials over `count` pairs, without drawing each trial: the gaps between two kept pairs
+    follow a geometric law. The work is proportional to the number of kept pairs, not to `count`.
+
+    Parameters
+    ----------
+    count: type int: Number of pairs.
+    p: type float: Probability to keep a pair.
+    rng: type numpy.random.Generator: random source.
+    chunk_size: type int: Number of gaps drawn at once.
+
+    Returns
+    -------
+    generator of numpy.ndarray: sorted indices of the kept pairs, in [0, count)
+    """
+    if p <= 0 or count <= 0:
+        return
+
+    position = -1
+    while True:
+        gaps = numpy.ones(chunk_size, dtype=numpy.int64) if p >= 1 else rng.geometric(p, chunk_size)
+        positions = position + numpy.cumsum(gaps)
+        position = int(positions[-1])
+
+        kept = positions[positions < count]
+        if len(kept) > 0:
+            yield kept
+        if len(kept) < len(positions) or position >= count - 1:
+            return
+
+
+def triangle_pairs(k):
+    """
+    Pair (i, j), j < i, of each index of the lower triangle of a matrix: k = i * (i - 1) / 2 + j.
+
+    Parameters
+    ----------
+    k: type numpy.ndarray: The indices.
+
+    Returns
+    -------
+    type tuple: (i, j), numpy.ndarray
+    """
+    i = ((1 + numpy.sqrt(1 + 8 * k.astype(numpy.float64))) / 2).astype(numpy.int64)
+
+    # The float square root can be one off for large indices
+    i -= i * (i - 1) // 2 > k
+    i += (i + 1) * i // 2 <= k
+    return i, k - i * (i - 1) // 2
+
+
+def erdos_renyi(n, p, seed=0, chunk_size=1 << 20):
+    """
+    Erdos-Renyi graph G(n, p): each pair of vertices is linked with probability p.
+
+    Parameters
+    ----------
+    n: type int: Number of vertices.
+    p: type float: Probability of each edge.
+    seed: type int: Seed of the graph.
+    chunk_size: type int: Number of edges generated at once.
+
+    Returns
+    -------
+    generator of tuple: (src, dst) arrays of vertice ids, by chunks
+    """
+    rng = numpy.random.default_rng(seed)
+    for k in pair_chunks(n * (n - 1) // 2, p, rng, chunk_size):
+        i, j = triangle_pairs(k)
+        yield j, i
+
+
+def barabasi_albert(n, m, seed=0, chunk_size=1 << 20):
+    """
+    Barabasi-Albert graph: starting from a star of m + 1 vertices, each new vertice links to m vertices chosen with
+    a probability proportional to their degree, that is, to the ends of m random edges.
+    The ends of the edges are kept in a temporary file mapped in memory (4 bytes each), so the memory does not
+    grow with the graph. The vertices of a chunk link to the graph as it was before the chunk: a chunk is never
+    larger than the graph already built. Two links of a vertice to the same target give one edge.
+
+    Parameters
+    ----------
+    n: type int: Number of vertices.
+    m: type int: Number of edges added by each vertice.
+    seed: type int: Seed of the graph.
+    chunk_size: type int: Number of edges generated at once.
+
+    Returns
+    -------
+    generator of tuple: (src, dst) arrays of vertice ids, by chunks
+    """
+    rng = numpy.random.default_rng(seed)
+    if n <= m:
+        return
+
+    # The star: m edges to the vertice m
+    src = numpy.arange(m, dtype=numpy.int64)
+    dst = numpy.full(m, m, dtype=numpy.int64)
+    yield src, dst
+
+    total = 2 * m * (n - m)
+    with tempfile.TemporaryFile() as f:
+        ends = numpy.memmap(f, dtype=numpy.int32 if n < 2 ** 31 else numpy.int64, mode='w+', shape=(total,))
+        ends[0:2 * m:2] = src
+        ends[1:2 * m:2] = dst
+        filled = 2 * m
+
+        v = m + 1
+        while v < n:
+            count = max(1, min(chunk_size // m, v, n - v))
+            src = numpy.repeat(numpy.arange(v, v + count, dtype=numpy.int64), m)
+            dst = ends[rng.integers(0, filled, len(src))].astype(numpy.int64)
+
+            ends[filled:filled + 2 * len(src):2] = src
+            ends[filled + 1:filled + 2 * len(src):2] = dst
+            filled += 2 * len(src)
+            v += count
+            yield src, dst
+
+        del ends
+
+
+def watts_strogatz(n, k, beta, seed=0, chunk_size=1 << 20):
+    """
+    Watts-Strogatz graph: a ring where each vertice is linked to its k nearest neighbors (k / 2 on each side),
+    then the second end of each edge is moved to a random vertice with probability beta.
+
+    Parameters
+    ----------
+    n: type int: Number of vertices.
+    k: type int: Number of neighbors in the ring, even.
+    beta: type float: Probability to rewire an edge.
+    seed: type int: Seed of the graph.
+    chunk_size: type int: Number of edges generated at once.
+
+    Returns
+    -------
+    generator of tuple: (src, dst) arrays of vertice ids, by chunks
+    """
+    rng = numpy.random.default_rng(seed)
+    half = max(1, k // 2)
+    step = max(1, chunk_size // half)
+
+    for start in range(0, n, step):
+        src = numpy.repeat(numpy.arange(start, min(n, start + step), dtype=numpy.int64), half)
+        dst = (src + numpy.tile(numpy.arange(1, half + 1), len(src) // half)) % n
+
+        rewire = rng.random(len(src)) < beta
+        dst[rewire] = rng.integers(0, n, int(rewire.sum()))
+
+        # A rewired edge can land on its first end
+        keep = src != dst
+        yield src[keep], dst[keep]
+
+
+def stochastic_block_model(sizes, p_in, p_out, seed=0, chunk_size=1 << 20):
+    """
+    Stochastic block model: the vertices are split in blocks (the first sizes[0] ids, then the next sizes[1], ...).
+    Two vertices of the same block are linked with probability p_in, two vertices of different blocks with p_out.
+
+    Parameters
+    ----------
+    sizes: type list of int: Number of vertices of each block.
+    p_in: type float: Probability of an edge inside a block.
+    p_out: type float: Probability of an edge between two blocks.
+    seed: type int: Seed of the graph.
+    chunk_size: type int: Number of edges generated at once.
+
+    Returns
+    -------
+    generator of tuple: (src, dst) arrays of vertice ids, by chunks
+    """
+    rng = numpy.random.default_rng(seed)
+    offsets = numpy.concatenate(([0], numpy.cumsum(sizes))).tolist()
+
+    for a, size_a in enumerate(sizes):
+        # Inside the block: the pairs of the lower triangle
+        for k in pair_chunks(size_a * (size_a - 1) // 2, p_in, rng, chunk_size):
+            i, j = triangle_pairs(k)
+            yield offsets[a] + j, offsets[a] + i
+
+        # With the next blocks: all the pairs of the rectangle
+        for b in range(a + 1, len(sizes)):
+            for k in pair_chunks(size_a * sizes[b], p_out, rng, chunk_size):
+                yield offsets[a] + k // sizes[b], offsets[b] + k % sizes[b]
+
+
+def write_database(name, chunks, n, chunk_size=1 << 20):
+    """
+    Writes a graph as the two databases of the program: data/<name>_edges.db (table <name>_edges: field1, field2,
+    field3 = 1) and data/<name>_vertices.db (table <name>_vertices: id, name, status). The name of a vertice is its id.
+    The edges are written chunk by chunk, so only one chunk is in memory. The tables are replaced.
+
+    Parameters
+    ----------
+    name: type string: Name of the graph.
+    chunks: The edges, (src, dst) arrays of vertice ids, by chunks (a generator of this module).
+    n: type int: Number of vertices.
+    chunk_size: type int: Number of vertices written at once.
+
+    Returns
+    -------
+    type int: number of edges written
+    """
+    edges_db = db.Database(name + '_edges')
+    conn = edges_db.conn
+
+    # A generated table can be written again: no journal
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('DROP TABLE IF EXISTS "' + edges_db.file_name + '"')
+    conn.execute('CREATE TABLE "' + edges_db.file_name + '" ("field1" TEXT, "field2" TEXT, "field3" INTEGER)')
+
+    edges = 0
+    sql = 'INSERT INTO "' + edges_db.file_name + '" VALUES (?, ?, 1)'
+    for src, dst in chunks:
+        conn.executemany(sql, zip(src.astype(str).tolist(), dst.astype(str).tolist()))
+        edges += len(src)
+    conn.commit()
+    conn.close()
+
+    vertices_db = db.Database(name + '_vertices')
+    conn = vertices_db.conn
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('DROP TABLE IF EXISTS "' + vertices_db.file_name + '"')
+    conn.execute('CREATE TABLE "' + vertices_db.file_name + '" ("id" integer, "name" text NOT NULL, '
+                 '"status" integer, PRIMARY KEY("id"))')
+
+    sql = 'INSERT INTO "' + vertices_db.file_name + '" VALUES (?, ?, 0)'
+    for start in range(0, n, chunk_size):
+        ids = numpy.arange(start, min(n, start + chunk_size))
+        conn.executemany(sql, zip(ids.tolist(), ids.astype(str).tolist()))
+    conn.commit()
+    conn.close()
+
+    return edges
+
+
+def fetch_blocks(chunks, size):
+    """
+    The edges of a generator by blocks of `size` edges, whatever the size of its chunks: the blocks of rows
+    `Database.load_csr` fetches from the edges database.
+
+    Parameters
+    ----------
+    chunks: The edges, (src, dst) arrays of vertice ids, by chunks (a generator of this module).
+    size: type int: Number of edges of a block.
+
+    Returns
+    -------
+    type iterator of tuple: (src, dst) arrays of size edges, the last one shorter
+    """
+    pending_src = numpy.zeros(0, dtype=numpy.int64)
+    pending_dst = numpy.zeros(0, dtype=numpy.int64)
+    for src, dst in chunks:
+        pending_src = numpy.concatenate((pending_src, src))
+        pending_dst = numpy.concatenate((pending_dst, dst))
+        while len(pending_src) >= size:
+            yield pending_src[:size], pending_dst[:size]
+            pending_src, pending_dst = pending_src[size:], pending_dst[size:]
+    if len(pending_src) > 0:
+        yield pending_src, pending_dst
+
+
+def first_appearance(make_chunks, n):
+    """
+    Ids of the vertices as `Database.load_csr` gives them: the ids are given in order of first appearance
+    in the edges table, each fetched block interning its first column, then its second column.
+    The vertices without edges are not in the table, so they have no id.
+
+    Parameters
+    ----------
+    make_chunks: A function without arguments returning the generator of the edges, a new one on each call.
+    n: type int: Number of generated vertices.
+
+    Returns
+    -------
+    type tuple: (id of each generated vertice, -1 without edges; number of vertices with an id)
+    """
+    ids = numpy.full(n, -1, dtype=numpy.int64)
+    count = 0
+    for src, dst in fetch_blocks(make_chunks(), db.FETCH_SIZE):
+        heads, first = numpy.unique(numpy.concatenate((src, dst)), return_index=True)
+        new = ids[heads] < 0
+        heads = heads[new][numpy.argsort(first[new], kind='stable')]
+        ids[heads] = numpy.arange(count, count + len(heads))
+        count += len(heads)
+    return ids, count
+
+
+def write_snapshot(name, make_chunks, n, chunk_size=1 << 20):
+    """
+    Writes the compiled snapshot of a generated graph (the files of `cache.save`) without holding its edges
+    in memory: the generator is run three times (same seed, same edges).
+        1) The ids of the vertices are the ones of a load from the edges database (see `first_appearance`).
+        2) The degrees give the offsets of the rows.
+        3) Each edge is written in its two rows of a memory-mapped array.
+        4) The rows are sorted and their duplicates and self loops removed, block by block, in place.
+    Only the per-vertice arrays and one chunk are in memory. The edges database must be written first:
+    the snapshot is tied to it, and holds the same graph as `Database.load_csr`, vertices without edges excluded.
+
+    Parameters
+    ----------
+    name: type string: Name of the graph.
+    make_chunks: A function without arguments returning the generator of the edges, a new one on each call.
+    n: type int: Number of generated vertices.
+    chunk_size: type int: Number of edges handled at once.
+
+    Returns
+    -------
+    type string: path to the snapshot
+    """
+    db_path = db.Database(name + '_edges').database
+    tmp = cache.cache_path(db_path) + '.tmp' + str(os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # 1) Generated vertice -> id of the snapshot. From here, n is the number of vertices of the snapshot.
+    ids, n_ids = first_appearance(make_chunks, n)
+    generated = n
+    n = n_ids
+
+    # 2) Offsets of the rows, each edge counted in both rows
+    counts = numpy.zeros(n, dtype=numpy.int64)
+    for src, dst in make_chunks():
+        counts += numpy.bincount(ids[src], minlength=n)
+        counts += numpy.bincount(ids[dst], minlength=n)
+    indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(counts, out=indptr[1:])
+
+    # 3) The edges in their rows, not sorted yet
+    path = os.path.join(tmp, 'indices.npy')
+    raw = numpy.lib.format.open_memmap(path + '.raw', mode='w+', dtype=numpy.int32, shape=(int(indptr[-1]),))
+    fill = indptr[:-1].copy()
+    for src, dst in make_chunks():
+        src, dst = ids[src], ids[dst]
+        rows = numpy.concatenate((src, dst))
+        cols = numpy.concatenate((dst, src))
+        order = numpy.argsort(rows, kind='stable')
+        rows, cols = rows[order], cols[order]
+
+        # Rank of each edge among the edges of its row in the chunk
+        heads, first, sizes = numpy.unique(rows, return_index=True, return_counts=True)
+        rank = numpy.arange(len(rows)) - numpy.repeat(first, sizes)
+        raw[fill[rows] + rank] = cols
+        fill[heads] += sizes
+
+    # 4) Sorted rows without duplicates, written over the raw array: a block never ends after where it was read
+    degrees = numpy.zeros(n, dtype=numpy.int64)
+    written = 0
+    row = 0
+    while row < n:
+        end = max(row + 1, int(numpy.searchsorted(indptr, indptr[row] + chunk_size, side='right')) - 1)
+        end = min(end, n)
+        cols = numpy.asarray(raw[indptr[row]:indptr[end]], dtype=numpy.int64)
+        rows = numpy.repeat(numpy.arange(row, end), numpy.diff(indptr[row:end + 1]))
+
+        keep = rows != cols
+        keys = numpy.unique((rows[keep] - row) * n + cols[keep])
+        rows = keys // n
+        degrees[row:end] = numpy.bincount(rows, minlength=end - row)
+        raw[written:written + len(keys)] = keys % n
+        written += len(keys)
+        row = end
+
+    indices = numpy.lib.format.open_memmap(path, mode='w+', dtype=numpy.int32, shape=(written,))
+    for start in range(0, written, chunk_size):
+        indices[start:start + chunk_size] = raw[start:min(written, start + chunk_size)]
+    indices.flush()
+    del indices, raw
+    os.remove(path + '.raw')
+
+    indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(degrees, out=indptr[1:])
+    numpy.save(os.path.join(tmp, 'indptr.npy'), indptr)
+    numpy.save(os.path.join(tmp, 'degrees.npy'), degrees)
+
+    # The name of a vertice is its generated id, as in the databases
+    vertices = numpy.zeros(n, dtype=numpy.int64)
+    seen = ids >= 0
+    vertices[ids[seen]] = numpy.arange(generated)[seen]
+    del ids, seen
+    names = numpy.lib.format.open_memmap(os.path.join(tmp, 'names.npy'), mode='w+',
+                                         dtype='<U' + str(len(str(max(generated - 1, 0)))), shape=(n,))
+    for start in range(0, n, chunk_size):
+        names[start:start + chunk_size] = vertices[start:start + chunk_size].astype(str)
+    names.flush()
+    del names
+
+    return cache.commit(tmp, db_path, degrees)
+
+
+def model_chunks(args):
+    """
+    Generator of the edges of the model given on the command line, and its number of vertices.
+
+    Parameters
+    ----------
+    args: The command line options.
+
+    Returns
+    -------
+    type tuple: (function returning a new generator of the edges, number of vertices)
+    """
+    n = args.vertices
+    if args.model == 'er':
+        return lambda: erdos_renyi(n, args.degree / max(n - 1, 1), args.seed, args.chunk), n
+    if args.model == 'ba':
+        return lambda: barabasi_albert(n, max(1, int(args.degree)), args.seed, args.chunk), n
+    if args.model == 'ws':
+        return lambda: watts_strogatz(n, max(2, int(args.degree)), args.beta, args.seed, args.chunk), n
+
+    sizes = args.blocks if args.blocks is not None else [n // 10] * 10
+    size = max(sum(sizes) / len(sizes), 2)
+    p_in = args.p_in if args.p_in is not None else args.degree / (size - 1)
+    p_out = args.p_out if args.p_out is not None else 1 / max(sum(sizes) - size, 1)
+    return lambda: stochastic_block_model(sizes, p_in, p_out, args.seed, args.chunk), sum(sizes)
+
+
+def main():
+    args = parser.parse_args()
+
+    make_chunks, n = model_chunks(args)
+    edges = write_database(args.name, make_chunks(), n, args.chunk)
+    print('generators:', n, 'vertices,', edges, 'edges written to data/' + args.name + '_edges.db')
+
+    if args.compile:
+        print('generators: snapshot written to', write_snapshot(args.name, make_chunks, n, args.chunk))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,267 @@
+import numpy
+
+
+def gather_positions(indptr, ids):
+    """
+    Positions in `indices` of the neighbors of several vertices of a CSR graph, without a Python loop.
+
+    Parameters
+    ----------
+    indptr: type numpy.ndarray: CSR offsets.
+    ids: type numpy.ndarray: ids of the vertices whose neighbors we want.
+
+    Returns
+    -------
+    type tuple: (positions, counts): the positions of all the neighbors concatenated row after row,
+                and the number of neighbors of each vertice of `ids`.
+    """
+    ids = numpy.asarray(ids, dtype=numpy.int64)
+    starts = indptr[ids]
+    counts = indptr[ids + 1] - starts
+    total = int(counts.sum())
+
+    # Position of each gathered neighbor in `indices`: the start of its row plus its rank in the row.
+    ends = numpy.cumsum(counts)
+    positions = numpy.arange(total, dtype=numpy.int64) + numpy.repeat(starts - (ends - counts), counts)
+
+    return positions, counts
+
+
+def gather_neighbors(indptr, indices, ids):
+    """
+    Gathers the neighbors of several vertices of a CSR graph at once, without a Python loop.
+
+    Parameters
+    ----------
+    indptr: type numpy.ndarray: CSR offsets.
+    indices: type numpy.ndarray: CSR neighbor ids.
+    ids: type numpy.ndarray: ids of the vertices whose neighbors we want.
+
+    Returns
+    -------
+    type tuple: (neighbors, counts): all the neighbors concatenated row after row,
+                and the number of neighbors of each vertice of `ids`.
+    """
+    positions, counts = gather_positions(indptr, ids)
+    return indices[positions], counts
+
+
 class Graphe_mat:
     """
-    Graph using matrix. (NOT USED)
+    Graph using an adjacency matrix. Vertices are the integers 0 to n - 1.
+    Two storages are available:
+        - 'dense': each row of the matrix is bit-packed in a numpy uint8 array (n * n / 8 bytes).
+                   For small or dense graphs.
+        - 'sparse': the matrix is kept as CSR arrays (no SciPy needed). For large graphs.
+                    Added edges are buffered and compiled into the arrays on the next read.
+    Both storages give the bulk operations used to spread on a whole frontier at once.
     """
-    def __init__(self, n):
+    def __init__(self, n, mode='dense'):
+        if mode not in ('dense', 'sparse'):
+            raise ValueError("mode must be 'dense' or 'sparse', not " + repr(mode))
+
         self.n = n
-        self.mat = [[False] * n for _ in range(n)]
+        self.mode = mode
+
+        if mode == 'dense':
+            # Row i, bit j <=> edge between i and j
+            self.mat = numpy.zeros((n, (n + 7) // 8), dtype=numpy.uint8)
+        else:
+            self.indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+            self.indices = numpy.zeros(0, dtype=numpy.int32)
+            # Edges added since the last compilation of the CSR arrays
+            self.pending_src = []
+            self.pending_dst = []
+
+    @staticmethod
+    def from_graph(g, mode=None):
+        """
+        Builds the matrix of a Graph_csr. Vertices keep their ids.
+
+        Parameters
+        ----------
+        g: type Graph_csr: The graph to convert.
+        mode: 'dense', 'sparse' or None to pick the smallest storage.
+
+        Returns
+        -------
+        type Graphe_mat
+        """
+        n = g.nb_neighbors()
+        if mode is None:
+            # Bytes of the bit-packed matrix against bytes of the CSR arrays
+            mode = 'dense' if n * ((n + 7) // 8) <= 4 * len(g.indices) + 8 * (n + 1) else 'sparse'
+
+        m = Graphe_mat(n, mode)
+        if mode == 'dense':
+            rows = numpy.repeat(numpy.arange(n), g.degrees())
+            m.set_bits(rows, g.indices)
+        else:
+            m.indptr = numpy.asarray(g.indptr, dtype=numpy.int64)
+            m.indices = numpy.asarray(g.indices, dtype=numpy.int32)
+        return m
+
+    def set_bits(self, rows, cols):
+        """
+        Sets the bits (rows[k], cols[k]) of the dense matrix. Self loops are dropped, like `Graph_csr.from_edges` does.
+
+        Parameters
+        ----------
+        rows: type numpy.ndarray: row of each bit.
+        cols: type numpy.ndarray: column of each bit.
+
+        Returns
+        -------
+        """
+        rows = numpy.asarray(rows)
+        cols = numpy.asarray(cols)
+        keep = rows != cols
+        rows, cols = rows[keep], cols[keep]
+        numpy.bitwise_or.at(self.mat, (rows, cols >> 3), (128 >> (cols & 7)).astype(numpy.uint8))
+
+    def compile(self):
+        """
+        Merges the buffered edges in the CSR arrays of the sparse matrix.
+        """
+        if self.mode == 'dense' or len(self.pending_src) == 0:
+            return
+
+        src = numpy.concatenate(self.pending_src)
+        dst = numpy.concatenate(self.pending_dst)
+        self.pending_src = []
+        self.pending_dst = []
+
+        # Current edges (both directions are stored, from_edges adds the reverse ones again)
+        rows = numpy.repeat(numpy.arange(self.n), numpy.diff(self.indptr))
+        g = Graph_csr.from_edges(numpy.concatenate((rows, src)), numpy.concatenate((self.indices, dst)),
+                                 numpy.arange(self.n))
+        self.indptr = g.indptr
+        self.indices = g.indices
 
     def add_edge(self, s1, s2):
-        self.mat[s1][s2] = True
-        self.mat[s2][s1] = True
+        self.add_edges([s1], [s2])
+
+    def add_edges(self, src, dst):
+        """
+        Adds several edges at once.
+
+        Parameters
+        ----------
+        src: First vertice of each edge.
+        dst: Second vertice of each edge.
+
+        Returns
+        -------
+        """
+        src = numpy.asarray(src, dtype=numpy.int64)
+        dst = numpy.asarray(dst, dtype=numpy.int64)
+        if self.mode == 'dense':
+            self.set_bits(src, dst)
+            self.set_bits(dst, src)
+        else:
+            self.pending_src.append(src)
+            self.pending_dst.append(dst)
 
     def edge(self, s1, s2):
-        return self.mat[s1][s2]
+        if self.mode == 'dense':
+            return bool(self.mat[s1, s2 >> 3] & (128 >> (s2 & 7)))
+        self.compile()
+        row = self.indices[self.indptr[s1]:self.indptr[s1 + 1]]
+        k = numpy.searchsorted(row, s2)
+        return bool(k < len(row) and row[k] == s2)
+
+    def neighbors(self, s):
+        """
+        Returns the neighbors of the vertice s.
+
+        Parameters
+        ----------
+        s: type int: The vertice.
+
+        Returns
+        -------
+        type numpy.ndarray: ids of the neighbors, sorted.
+        """
+        if self.mode == 'dense':
+            return numpy.flatnonzero(numpy.unpackbits(self.mat[s], count=self.n))
+        self.compile()
+        return self.indices[self.indptr[s]:self.indptr[s + 1]]
+
+    # Former name of `neighbors`
+    neighbougrs = neighbors
 
-    def neighbougrs(self, s):
-        v = []
-        for i in range(self.n):
-            if self.mat[s][i]:
-                v.append(i)
-        return v
+    def vertices(self):
+        return list(range(self.n))
+
+    def nb_neighbors(self):
+        return self.n
+
+    def degrees(self):
+        """
+        Returns the degree vector: the number of neighbors of each vertice.
+
+        Returns
+        -------
+        type numpy.ndarray
+        """
+        if self.mode == 'dense':
+            return numpy.unpackbits(self.mat, axis=1, count=self.n).sum(axis=1)
+        self.compile()
+        return numpy.diff(self.indptr)
+
+    def expand(self, x):
+        """
+        Matrix-vector product A.x.
+        With x the indicator vector of a frontier, the result counts, for each vertice,
+        its neighbors in the frontier. Only the rows of the non zero entries of x are read.
+
+        Parameters
+        ----------
+        x: type numpy.ndarray: vector of length n.
+
+        Returns
+        -------
+        type numpy.ndarray: vector of length n.
+        """
+        x = numpy.asarray(x)
+        nz = numpy.flatnonzero(x)
+
+        # The matrix is symmetric: A.x is the sum of the rows of the non zero entries weighted by them.
+        if self.mode == 'dense':
+            rows = numpy.unpackbits(self.mat[nz], axis=1, count=self.n)
+            # Cast first: a boolean or uint8 product would be computed in uint8 and wrap around
+            return x[nz].astype(numpy.result_type(x.dtype, numpy.int64)) @ rows
+
+        self.compile()
+        neighbors, counts = gather_neighbors(self.indptr, self.indices, nz)
+        return numpy.bincount(neighbors, weights=numpy.repeat(x[nz], counts), minlength=self.n).astype(
+            numpy.result_type(x.dtype, numpy.int64))
+
+    def frontier_neighbors(self, frontier):
+        """
+        Returns the vertices linked to at least one vertice of the frontier.
+
+        Parameters
+        ----------
+        frontier: Ids of the vertices of the frontier, or a boolean mask of length n.
+
+        Returns
+        -------
+        type numpy.ndarray: boolean mask of length n
+        """
+        frontier = numpy.asarray(frontier)
+        if frontier.dtype != bool:
+            ids = frontier
+            frontier = numpy.zeros(self.n, dtype=bool)
+            frontier[ids] = True
+
+        if self.mode == 'dense':
+            # OR of the packed rows, then a single unpack
+            packed = numpy.bitwise_or.reduce(self.mat[frontier], axis=0) if frontier.any() \
+                else numpy.zeros(self.mat.shape[1], dtype=numpy.uint8)
+            return numpy.unpackbits(packed, count=self.n).astype(bool)
+
+        return self.expand(frontier.astype(numpy.int64)) > 0
 
 
 class Graph_dic:
@@ -26,8 +269,13 @@ class Graph_dic:
     Graph using a dict.
     """
     def __init__(self):
+        # Vertice -> list of its neighbors. The lists keep the insertion order and can be indexed,
+        # which the spread uses to pick random neighbors.
         self.dic = {}
 
+        # Vertice -> set of its neighbors, mirroring `dic` for O(1) edge checks.
+        self.sets = {}
+
     def add_vertice(self, v):
         """
         Adding vertice v to the graph.
@@ -42,6 +290,7 @@ class Graph_dic:
         """
         if v not in self.dic:
             self.dic[v] = []
+            self.sets[v] = set()
 
     def add_edge(self, v1, v2):
         """
@@ -57,10 +306,12 @@ class Graph_dic:
 
         """
         self.add_vertice(v1)
-        if v2 not in self.dic[v1]:
+        if not self.edge(v1, v2):
             self.add_vertice(v2)
             self.dic[v1].append(v2)
             self.dic[v2].append(v1)
+            self.sets[v1].add(v2)
+            self.sets[v2].add(v1)
 
     def edge(self, v1, v2):
         """
@@ -75,7 +326,7 @@ class Graph_dic:
         -------
         boolean
         """
-        return v2 in self.dic[v1]
+        return v2 in self.sets[v1]
 
     def vertices(self):
         """
@@ -110,3 +361,277 @@ class Graph_dic:
         int
         """
         return len(self.dic)
+
+    def freeze(self):
+        """
+        Returns an immutable, integer-indexed copy of the graph. To call once loading is done.
+        Vertices get their ids in insertion order.
+
+        Returns
+        -------
+        type FrozenGraph
+        """
+        ids = {v: i for i, v in enumerate(self.dic)}
+        counts = [len(neighbors) for neighbors in self.dic.values()]
+
+        src = numpy.repeat(numpy.arange(len(ids), dtype=numpy.int32), counts)
+        dst = numpy.fromiter((ids[n] for neighbors in self.dic.values() for n in neighbors), numpy.int32, sum(counts))
+
+        names = list(self.dic)
+        if all(isinstance(v, str) for v in names):
+            names = numpy.array(names, dtype=str)
+        else:
+            # Any hashable can be a vertice: keep the objects themselves
+            names_array = numpy.empty(len(names), dtype=object)
+            names_array[:] = names
+            names = names_array
+
+        return FrozenGraph.from_edges(src, dst, names)
+
+    def edges(self):
+        """
+        Returns each edge of the graph once, as a pair of names.
+
+        Returns
+        -------
+        type iterator of tuples
+        """
+        seen = set()
+        for v1, neighbors in self.dic.items():
+            seen.add(v1)
+            for v2 in neighbors:
+                if v2 not in seen:
+                    yield v1, v2
+
+
+class Graph_csr:
+    """
+    Graph using compressed sparse rows (CSR) arrays.
+    Vertices are interned to dense integer ids: the neighbors of the vertice of id i are
+    indices[indptr[i]:indptr[i + 1]] and its name is names[i].
+    """
+    __slots__ = ('indptr', 'indices', 'names', '_ids')
+
+    def __init__(self, indptr, indices, names):
+        # Offsets of each vertice's neighbors in `indices`, length = number of vertices + 1
+        self.indptr = indptr
+        # Ids of the neighbors, sorted inside each row
+        self.indices = indices
+        # id -> name table
+        self.names = names
+        # name -> id table, built on first use (a mapped snapshot does not need it to start)
+        self._ids = None
+
+    @property
+    def ids(self):
+        """
+        The name -> id table.
+
+        Returns
+        -------
+        type dict
+        """
+        if self._ids is None:
+            self._ids = {name: i for i, name in enumerate(self.names.tolist())}
+        return self._ids
+
+    @classmethod
+    def from_edges(cls, src, dst, names):
+        """
+        Builds the CSR arrays of an undirected graph from two arrays of vertice ids.
+        Self loops and duplicated edges are removed, like Graph_dic does.
+
+        Parameters
+        ----------
+        src: type numpy.ndarray: ids of the first vertice of each edge.
+        dst: type numpy.ndarray: ids of the second vertice of each edge.
+        names: type numpy.ndarray: name of each vertice, indexed by id.
+
+        Returns
+        -------
+        type Graph_csr (or the subclass it is called on)
+        """
+        n = len(names)
+
+        # Each edge is stored in both directions
+        rows = numpy.concatenate((src, dst)).astype(numpy.int64)
+        cols = numpy.concatenate((dst, src)).astype(numpy.int64)
+        keep = rows != cols
+
+        # Sorting the (row, col) keys gives the CSR order and makes duplicates adjacent
+        keys = numpy.unique(rows[keep] * max(n, 1) + cols[keep])
+        rows = keys // max(n, 1)
+        cols = keys % max(n, 1)
+
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows, minlength=n), out=indptr[1:])
+
+        return cls(indptr, cols.astype(numpy.int32), names)
+
+    def edge(self, v1, v2):
+        """
+        Returns True if there is a link betwwen v1 and v2
+
+        Parameters
+        ----------
+        v1: Vertice 1
+        v2: Vertice 2
+
+        Returns
+        -------
+        boolean
+        """
+        i = self.ids[v1]
+        row = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        j = self.ids.get(v2, -1)
+        k = numpy.searchsorted(row, j)
+        return bool(k < len(row) and row[k] == j)
+
+    def vertices(self):
+        """
+        Returns all the vertices of the graph.
+
+        Returns
+        -------
+        list
+        """
+        return self.names.tolist()
+
+    def neighbors(self, v):
+        """
+        Returns all the neighbors (vertices connected) of the vertice v.
+
+        Parameters
+        ----------
+        v: Vertice from which we want to get the neighbors.
+
+        Returns
+        -------
+        type numpy.ndarray: names of the neighbors
+        """
+        i = self.ids[v]
+        return self.names[self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def nb_neighbors(self):
+        """
+        Returns the number of vertices in the graph.
+
+        Returns
+        -------
+        int
+        """
+        return len(self.names)
+
+    def degrees(self):
+        """
+        Returns the number of neighbors of each vertice, indexed by id.
+
+        Returns
+        -------
+        type numpy.ndarray
+        """
+        return numpy.diff(self.indptr)
+
+    def edges(self):
+        """
+        Returns each edge of the graph once, as a pair of names.
+
+        Returns
+        -------
+        type iterator of tuples
+        """
+        rows = numpy.repeat(numpy.arange(len(self.names)), self.degrees())
+        keep = rows < self.indices
+        return zip(self.names[rows[keep]].tolist(), self.names[self.indices[keep]].tolist())
+
+
+class FrozenGraph(Graph_csr):
+    """
+    Immutable Graph_csr: its arrays are read-only, so the vertice list, the vertice count
+    and the degrees are computed once and cached.
+    Produced by `Graph_dic.freeze()` or directly by the database loader.
+    """
+    __slots__ = ('_vertices', '_degrees')
+
+    def __init__(self, indptr, indices, names):
+        super().__init__(indptr, indices, names)
+
+        for array in (indptr, indices, names):
+            array.flags.writeable = False
+
+        self._vertices = None
+        self._degrees = None
+
+    @property
+    def vertex_count(self):
+        """
+        The number of vertices.
+
+        Returns
+        -------
+        int
+        """
+        return len(self.names)
+
+    def name_of(self, i):
+        """
+        Returns the name of the vertice of id i.
+
+        Parameters
+        ----------
+        i: type int: id of the vertice.
+
+        Returns
+        -------
+        The name of the vertice
+        """
+        return self.names[i]
+
+    def id_of(self, name):
+        """
+        Returns the id of a vertice.
+
+        Parameters
+        ----------
+        name: Name of the vertice.
+
+        Returns
+        -------
+        int
+        """
+        return self.ids[name]
+
+    def vertices(self):
+        """
+        Returns all the vertices of the graph. The tuple is built once.
+
+        Returns
+        -------
+        tuple
+        """
+        if self._vertices is None:
+            self._vertices = tuple(self.names.tolist())
+        return self._vertices
+
+    def nb_neighbors(self):
+        """
+        Returns the number of vertices in the graph.
+
+        Returns
+        -------
+        int
+        """
+        return self.vertex_count
+
+    def degrees(self):
+        """
+        Returns the number of neighbors of each vertice, indexed by id. The array is built once.
+
+        Returns
+        -------
+        type numpy.ndarray
+        """
+        if self._degrees is None:
+            self._degrees = numpy.diff(self.indptr)
+            self._degrees.flags.writeable = False
+        return self._degrees
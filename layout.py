@@ -0,0 +1,490 @@
+import hashlib
+import os
+import pathlib
+import numpy
+import graph
+
+
+# Version of the layout files. Bump it when the files written below or the layouts computed change.
+LAYOUT_VERSION = 2
+
+# Directory of the layouts computed by previous runs
+LAYOUT_DIR = os.path.join(str(pathlib.Path().absolute()), 'data', 'layouts')
+
+# Layout methods. `auto` uses NetworkX's spring layout up to LARGE_GRAPH vertices, the multilevel layout above.
+# Above 500 vertices, NetworkX's spring layout needs SciPy, which is not a dependency.
+METHODS = ('auto', 'spring', 'force', 'multilevel')
+LARGE_GRAPH = 500
+
+
+def graph_fingerprint(g):
+    """
+    Fingerprint of a graph: a hash of its CSR arrays and of the names of its vertices.
+    Two graphs with the same fingerprint have the same vertices, in the same order, and the same edges.
+
+    Parameters
+    ----------
+    g: type Graph_csr: The graph.
+
+    Returns
+    -------
+    type string: hexadecimal digest
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(numpy.ascontiguousarray(g.indptr, dtype=numpy.int64).tobytes())
+    h.update(numpy.ascontiguousarray(g.indices, dtype=numpy.int64).tobytes())
+    h.update('\0'.join(str(n) for n in g.names.tolist()).encode())
+    return h.hexdigest()
+
+
+def layout_path(fingerprint, method):
+    """
+    Path of the layout file of a graph.
+
+    Parameters
+    ----------
+    fingerprint: type string: Fingerprint of the graph.
+    method: type string: Layout method.
+
+    Returns
+    -------
+    type string
+    """
+    return os.path.join(LAYOUT_DIR, fingerprint + '_' + method + '.npz')
+
+
+def load(fingerprint, method, names):
+    """
+    Reads the layout of a graph computed by a previous run.
+
+    Parameters
+    ----------
+    fingerprint: type string: Fingerprint of the graph.
+    method: type string: Layout method.
+    names: type numpy.ndarray: name of each vertice, indexed by id.
+
+    Returns
+    -------
+    type numpy.ndarray: position of each vertice, shape (n, 2). None if there is no valid layout.
+    """
+    try:
+        with numpy.load(layout_path(fingerprint, method)) as data:
+            if int(data['version']) != LAYOUT_VERSION or not numpy.array_equal(data['names'], names):
+                return None
+            return data['pos']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save(fingerprint, method, names, pos):
+    """
+    Writes the layout of a graph. The file is written then renamed, so a reader never sees half of it.
+
+    Parameters
+    ----------
+    fingerprint: type string: Fingerprint of the graph.
+    method: type string: Layout method.
+    names: type numpy.ndarray: name of each vertice, indexed by id.
+    pos: type numpy.ndarray: position of each vertice, shape (n, 2).
+
+    Returns
+    -------
+    type string: path to the layout file
+    """
+    path = layout_path(fingerprint, method)
+    os.makedirs(LAYOUT_DIR, exist_ok=True)
+    tmp = path + '.tmp' + str(os.getpid()) + '.npz'
+    numpy.savez(tmp, version=LAYOUT_VERSION, names=names, pos=pos)
+    os.replace(tmp, path)
+    return path
+
+
+def rescale(pos, scale=1.):
+    """
+    Centers positions on 0 and scales them into [-scale, scale], like NetworkX does.
+
+    Parameters
+    ----------
+    pos: type numpy.ndarray: positions, shape (n, 2).
+    scale: type float: Half width of the box.
+
+    Returns
+    -------
+    type numpy.ndarray
+    """
+    pos = pos - pos.mean(axis=0) if len(pos) > 0 else pos
+    lim = numpy.abs(pos).max() if len(pos) > 0 else 0
+    return pos * (scale / lim) if lim > 0 else pos
+
+
+def repulsion(pos, k, grid_size):
+    """
+    Approximate repulsive forces of the Fruchterman-Reingold layout (k² / d between every pair of vertices).
+    The vertices are binned in a grid. The vertices of the 3x3 cells around a cell repel its vertices exactly;
+    farther cells act as one mass at their center, like the cells of a Barnes-Hut tree.
+    With about sqrt(n) cells, it costs O(n^1.5) instead of O(n²).
+
+    Parameters
+    ----------
+    pos: type numpy.ndarray: positions, shape (n, 2).
+    k: type float: Optimal distance between vertices.
+    grid_size: type int: Number of cells on each side of the grid.
+
+    Returns
+    -------
+    type numpy.ndarray: force on each vertice, shape (n, 2).
+    """
+    n = len(pos)
+    force = numpy.zeros((n, 2))
+
+    # Cell of each vertice
+    low = pos.min(axis=0)
+    span = max(float((pos.max(axis=0) - low).max()), 1e-9)
+    cell_xy = numpy.minimum(((pos - low) / span * grid_size).astype(numpy.int64), grid_size - 1)
+    cell = cell_xy[:, 0] * grid_size + cell_xy[:, 1]
+    nb_cells = grid_size * grid_size
+
+    # Mass and center of mass of each cell
+    mass = numpy.bincount(cell, minlength=nb_cells)
+    center = numpy.stack((numpy.bincount(cell, pos[:, 0], nb_cells), numpy.bincount(cell, pos[:, 1], nb_cells)), 1)
+    center /= numpy.maximum(mass, 1)[:, None]
+
+    # Vertices sorted by cell: the vertices of cell c are order[starts[c]:starts[c + 1]]
+    order = numpy.argsort(cell, kind='stable')
+    starts = numpy.searchsorted(cell[order], numpy.arange(nb_cells + 1))
+
+    occupied = numpy.flatnonzero(mass)
+    occupied_x, occupied_y = numpy.divmod(occupied, grid_size)
+
+    # One iteration per occupied cell (about sqrt(3n)), each one on whole blocks of vertices
+    x = pos[:, 0]
+    y = pos[:, 1]
+    for c, cx, cy in zip(occupied.tolist(), occupied_x.tolist(), occupied_y.tolist()):
+        members = order[starts[c]:starts[c + 1]]
+        near = (numpy.abs(occupied_x - cx) <= 1) & (numpy.abs(occupied_y - cy) <= 1)
+
+        # Exact forces from the vertices of the neighbor cells (a vertice does not move itself: delta is 0)
+        block = numpy.concatenate([order[starts[o]:starts[o + 1]] for o in occupied[near].tolist()])
+        dx = x[members][:, None] - x[block][None, :]
+        dy = y[members][:, None] - y[block][None, :]
+        w = k * k / numpy.maximum(dx * dx + dy * dy, 1e-9)
+        force[members, 0] += (dx * w).sum(axis=1)
+        force[members, 1] += (dy * w).sum(axis=1)
+
+        # Far cells, as one mass at their center
+        far = occupied[~near]
+        if len(far) > 0:
+            dx = x[members][:, None] - center[far, 0][None, :]
+            dy = y[members][:, None] - center[far, 1][None, :]
+            w = mass[far] * k * k / (dx * dx + dy * dy)
+            force[members, 0] += (dx * w).sum(axis=1)
+            force[members, 1] += (dy * w).sum(axis=1)
+
+    return force
+
+
+def force_layout(indptr, indices, pos=None, iterations=50, temperature=.1, seed=None):
+    """
+    Force-directed layout of a CSR graph in NumPy: the Fruchterman-Reingold model of NetworkX's spring layout,
+    with the approximate repulsion of `repulsion`. Edges attract their vertices by d² / k.
+
+    Parameters
+    ----------
+    indptr: type numpy.ndarray: CSR offsets.
+    indices: type numpy.ndarray: CSR neighbor ids.
+    pos: type numpy.ndarray: initial positions in the unit square, shape (n, 2). None: random.
+    iterations: type int: Number of iterations.
+    temperature: type float: Maximum move of the first iteration. It decreases to 0 along the iterations.
+    seed: Seed of the random initial positions.
+
+    Returns
+    -------
+    type numpy.ndarray: positions, shape (n, 2).
+    """
+    n = len(indptr) - 1
+    rng = numpy.random.default_rng(seed)
+    if pos is None:
+        pos = rng.random((n, 2))
+    else:
+        # Vertices at the same place would never split
+        pos = pos + rng.normal(0, 1e-4, (n, 2))
+    if n <= 1:
+        return pos
+
+    k = numpy.sqrt(1. / n)
+    grid_size = max(1, int(round((3 * n) ** .25)))
+
+    # Both directions of each edge
+    src = numpy.repeat(numpy.arange(n), numpy.diff(indptr))
+    dst = numpy.asarray(indices, dtype=numpy.int64)
+
+    t = temperature
+    dt = temperature / (iterations + 1)
+    for _ in range(iterations):
+        force = repulsion(pos, k, grid_size)
+
+        delta = pos[src] - pos[dst]
+        pull = delta * (numpy.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+        force[:, 0] -= numpy.bincount(src, pull[:, 0], n)
+        force[:, 1] -= numpy.bincount(src, pull[:, 1], n)
+
+        # Each vertice moves along its force, by the temperature at most
+        length = numpy.sqrt((force ** 2).sum(axis=1))
+        length = numpy.where(length < .01, .1, length)
+        pos += force * (t / length)[:, None]
+        t -= dt
+
+    return pos
+
+
+def coarsen(indptr, indices, rng, rounds=8):
+    """
+    Coarsens a CSR graph by a random matching: each free vertice proposes to its free neighbor of lowest degree
+    (ties broken at random), and the mutual proposals are merged. The proposals are made by all the vertices
+    at once, with array operations on the CSR arrays, for a few rounds.
+
+    Parameters
+    ----------
+    indptr: type numpy.ndarray: CSR offsets.
+    indices: type numpy.ndarray: CSR neighbor ids.
+    rng: type numpy.random.Generator: random source.
+    rounds: type int: Maximum number of rounds of proposals.
+
+    Returns
+    -------
+    type tuple: (cluster of each vertice, CSR offsets of the coarse graph, CSR neighbor ids of the coarse graph)
+    """
+    n = len(indptr) - 1
+    degrees = numpy.diff(indptr)
+    src = numpy.repeat(numpy.arange(n), degrees)
+    dst = numpy.asarray(indices, dtype=numpy.int64)
+
+    # Matched vertice of each vertice, -1 while free
+    mate = numpy.full(n, -1, dtype=numpy.int64)
+    # Rank of each vertice by degree, ties broken at random
+    priority = rng.permutation(n)
+    by_rank = numpy.lexsort((priority, degrees))
+    rank = numpy.empty(n, dtype=numpy.int64)
+    rank[by_rank] = numpy.arange(n)
+
+    for _ in range(rounds):
+        # Edges between free vertices, still sorted by source
+        free = (mate[src] < 0) & (mate[dst] < 0) & (src != dst)
+        s = src[free]
+        if len(s) == 0:
+            break
+        # Each free vertice proposes to its free neighbor of lowest rank
+        first = numpy.flatnonzero(numpy.concatenate(([True], s[1:] != s[:-1])))
+        v = s[first]
+        choice = numpy.full(n, -1, dtype=numpy.int64)
+        choice[v] = by_rank[numpy.minimum.reduceat(rank[dst[free]], first)]
+        # Mutual proposals are matched
+        mutual = v[choice[choice[v]] == v]
+        if len(mutual) == 0:
+            break
+        mate[mutual] = choice[mutual]
+
+    # A cluster is a matched pair or a lone vertice, numbered in random order
+    head = numpy.where(mate >= 0, numpy.minimum(numpy.arange(n), mate), numpy.arange(n))
+    _, cluster = numpy.unique(priority[head], return_inverse=True)
+    nb_clusters = int(cluster.max()) + 1 if n > 0 else 0
+
+    coarse = graph.Graph_csr.from_edges(cluster[src], cluster[indices], numpy.arange(nb_clusters))
+    return cluster, coarse.indptr, coarse.indices
+
+
+def multilevel_layout(indptr, indices, iterations=50, min_size=100, seed=None):
+    """
+    Multilevel force-directed layout: the graph is coarsened until it has `min_size` vertices, the coarsest graph is
+    laid out by `force_layout`, then each level starts from the positions of its clusters and is refined by a few
+    cooler iterations. Big graphs get their global shape from the small levels, which are cheap.
+
+    Parameters
+    ----------
+    indptr: type numpy.ndarray: CSR offsets.
+    indices: type numpy.ndarray: CSR neighbor ids.
+    iterations: type int: Number of iterations on the coarsest graph. The other levels use a third of it.
+    min_size: type int: Number of vertices under which the graph is not coarsened.
+    seed: Seed of the layout.
+
+    Returns
+    -------
+    type numpy.ndarray: positions in [-1, 1], shape (n, 2).
+    """
+    rng = numpy.random.default_rng(seed)
+
+    levels = [(indptr, indices)]
+    clusters = []
+    while len(levels[-1][0]) - 1 > min_size:
+        n = len(levels[-1][0]) - 1
+        cluster, coarse_indptr, coarse_indices = coarsen(levels[-1][0], levels[-1][1], rng)
+
+        # The matching stalls on star-like graphs: the coarse graph would be as slow to lay out
+        if len(coarse_indptr) - 1 > .9 * n:
+            break
+        clusters.append(cluster)
+        levels.append((coarse_indptr, coarse_indices))
+
+    pos = force_layout(levels[-1][0], levels[-1][1], iterations=iterations, seed=rng)
+    for (fine_indptr, fine_indices), cluster in zip(reversed(levels[:-1]), reversed(clusters)):
+        # Back in the unit square, the vertices of a cluster start at its position
+        pos = (rescale(pos) + 1) / 2
+        pos = force_layout(fine_indptr, fine_indices, pos[cluster], max(10, iterations // 3), .05, rng)
+
+    return rescale(pos)
+
+
+def compute(g, method, seed=None):
+    """
+    Computes the layout of a graph.
+
+    Parameters
+    ----------
+    g: type Graph_csr: The graph.
+    method: type string: One of METHODS.
+    seed: Seed of the layout.
+
+    Returns
+    -------
+    type numpy.ndarray: position of each vertice (indexed by id) in [-1, 1], shape (n, 2).
+    """
+    n = len(g.names)
+    if method == 'auto':
+        method = 'spring' if n <= LARGE_GRAPH else 'multilevel'
+
+    if method == 'spring':
+        # networkx is only needed by this layout, and slow to import
+        import networkx as nx
+
+        # Isolated vertices included
+        g_nx = nx.Graph()
+        g_nx.add_nodes_from(g.vertices())
+        g_nx.add_edges_from(g.edges())
+        try:
+            pos = nx.fruchterman_reingold_layout(g_nx, seed=seed)
+        except ImportError as e:
+            # SciPy missing (large graphs): the numpy layout instead
+            print('layout: spring layout unavailable (' + str(e) + '), using the multilevel layout')
+            return multilevel_layout(g.indptr, g.indices, seed=seed)
+        return numpy.array([pos[name] for name in g.names.tolist()]).reshape(-1, 2)
+    if method == 'force':
+        return rescale(force_layout(g.indptr, g.indices, seed=seed))
+    if method == 'multilevel':
+        return multilevel_layout(g.indptr, g.indices, seed=seed)
+    raise ValueError('Unknown layout method ' + repr(method) + ', expected one of ' + ', '.join(METHODS))
+
+
+def positions(g, method='auto', use_cache=True, seed=None):
+    """
+    Positions of the vertices of a graph: read from the layout file written by a previous run when possible,
+    computed (then written) otherwise. Layout files are keyed by the fingerprint of the graph and the method.
+
+    Parameters
+    ----------
+    g: type Graph_csr: The graph.
+    method: type string: One of METHODS.
+    use_cache: type bool: False always computes the layout and does not write any file.
+    seed: Seed of the layout.
+
+    Returns
+    -------
+    type numpy.ndarray: position of each vertice (indexed by id) in [-1, 1], shape (n, 2).
+    """
+    if method not in METHODS:
+        raise ValueError('Unknown layout method ' + repr(method) + ', expected one of ' + ', '.join(METHODS))
+
+    pos = None
+    if use_cache:
+        fingerprint = graph_fingerprint(g)
+        pos = load(fingerprint, method, g.names)
+
+    if pos is None:
+        pos = compute(g, method, seed)
+        if use_cache:
+            try:
+                save(fingerprint, method, g.names, pos)
+            except OSError as e:
+                # A read-only data directory only costs the speed up
+                print("layout error is saying:")
+                print(e)
+
+    return pos
+
+
+def graph_layout(g, method='auto', use_cache=True, seed=None):
+    """
+    Same as `positions`, as a dictionary like the layouts of NetworkX.
+
+    Returns
+    -------
+    type dict: name of each vertice -> position.
+    """
+    return dict(zip(g.names.tolist(), positions(g, method, use_cache, seed)))
+
+
+class GridIndex:
+    """
+    Spatial index over the positions of a layout: the vertices are bucketed in a grid of cells and sorted by cell,
+    so the vertices in a rectangle are read from a few slices, whatever the size of the graph.
+    """
+    __slots__ = ('xy', 'low', 'step', 'size', 'order', 'starts')
+
+    def __init__(self, xy, size=None):
+        """
+        Parameters
+        ----------
+        xy: type numpy.ndarray: position of each vertice, shape (n, 2).
+        size: type int: Number of cells on each side of the grid. Default: about 16 vertices per cell.
+        """
+        self.xy = numpy.asarray(xy, dtype=float).reshape(-1, 2)
+        n = len(self.xy)
+        self.size = size if size is not None else max(1, int(numpy.sqrt(n / 16)))
+
+        self.low = self.xy.min(axis=0) if n > 0 else numpy.zeros(2)
+        span = max(float((self.xy.max(axis=0) - self.low).max()), 1e-9) if n > 0 else 1.
+        self.step = span / self.size
+
+        cell_x, cell_y = self.cell(self.xy[:, 0], self.xy[:, 1])
+        cells = cell_x * self.size + cell_y
+
+        # The vertices of cell c are order[starts[c]:starts[c + 1]]
+        self.order = numpy.argsort(cells, kind='stable')
+        self.starts = numpy.searchsorted(cells[self.order], numpy.arange(self.size * self.size + 1))
+
+    def cell(self, x, y):
+        """
+        Cell coordinates of points, clipped to the grid.
+
+        Returns
+        -------
+        type tuple: (column, row) arrays.
+        """
+        cell_x = numpy.clip(((numpy.asarray(x) - self.low[0]) / self.step).astype(numpy.int64), 0, self.size - 1)
+        cell_y = numpy.clip(((numpy.asarray(y) - self.low[1]) / self.step).astype(numpy.int64), 0, self.size - 1)
+        return cell_x, cell_y
+
+    def query(self, xmin, xmax, ymin, ymax):
+        """
+        Vertices in a rectangle.
+
+        Parameters
+        ----------
+        xmin, xmax, ymin, ymax: type float: The rectangle.
+
+        Returns
+        -------
+        type numpy.ndarray: sorted ids of the vertices inside.
+        """
+        if len(self.xy) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        (x0, x1), (y0, y1) = self.cell([xmin, xmax], [ymin, ymax])
+
+        # One slice for the cells of each column
+        candidates = numpy.concatenate([self.order[self.starts[x * self.size + y0]:self.starts[x * self.size + y1 + 1]]
+                                        for x in range(int(x0), int(x1) + 1)])
+
+        x = self.xy[candidates, 0]
+        y = self.xy[candidates, 1]
+        inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        return numpy.sort(candidates[inside])
@@ -0,0 +1,192 @@
+import json
+import time
+import numpy
+
+
+# Verbosity levels of the console output
+QUIET = 0  # nothing
+INFO = 1  # the day and the counts
+DEBUG = 2  # each death and each end of lockdown
+TRACE = 3  # the locked vertices each day, the draws of the spread
+
+# Level of the console, set from the command line. A disabled level costs an integer comparison.
+verbosity = INFO
+
+
+def set_verbosity(level):
+    """
+    Sets the level of the console output.
+
+    Parameters
+    ----------
+    level: type int: QUIET, INFO, DEBUG or TRACE.
+
+    Returns
+    -------
+    """
+    global verbosity
+    verbosity = level
+
+
+class Timer:
+    """
+    Context manager adding the duration of each run of its block to a list.
+    """
+    __slots__ = ('durations', 'start')
+
+    def __init__(self, durations):
+        self.durations = durations
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.durations.append(time.perf_counter() - self.start)
+
+
+class Profiler:
+    """
+    Named timers, counters and per-day values of a run:
+        - `timer(name)`: context manager timing a phase (spread, transitions, coloring, drawing, chart),
+        - `count(name, n)`: adds to a counter,
+        - `record(name, value)`: appends a value of the day (the frontier size for example).
+    `report` summarizes them; `write` saves the summary as JSON.
+    A timer is not reentrant: a phase is timed by one thread only.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.timings = {}
+        self.timers = {}
+        self.counters = {}
+        self.series = {}
+        self.start = time.perf_counter()
+
+    def timer(self, name):
+        """
+        Timer of a phase.
+
+        Parameters
+        ----------
+        name: type string: Name of the phase.
+
+        Returns
+        -------
+        type Timer
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer(self.timings.setdefault(name, []))
+        return timer
+
+    def count(self, name, n=1):
+        """
+        Adds to a counter.
+
+        Parameters
+        ----------
+        name: type string: Name of the counter.
+        n: type int: Value to add.
+
+        Returns
+        -------
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, value):
+        """
+        Appends a value to a per-day series.
+
+        Parameters
+        ----------
+        name: type string: Name of the series.
+        value: The value of the day.
+
+        Returns
+        -------
+        """
+        self.series.setdefault(name, []).append(value)
+
+    def report(self):
+        """
+        Summary of the run: for each phase its number of calls, total, mean, percentiles and maximum
+        in milliseconds, the counters, and the per-day series with their statistics.
+
+        Returns
+        -------
+        type dict
+        """
+        phases = {}
+        for name, durations in self.timings.items():
+            if len(durations) == 0:
+                continue
+            ms = numpy.array(durations) * 1000
+            p50, p90, p99 = numpy.percentile(ms, (50, 90, 99)).tolist()
+            phases[name] = {'calls': len(ms), 'total_ms': float(ms.sum()), 'mean_ms': float(ms.mean()),
+                            'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99, 'max_ms': float(ms.max())}
+
+        series = {}
+        for name, values in self.series.items():
+            a = numpy.array(values)
+            series[name] = {'values': a.tolist(),
+                            'mean': float(a.mean()) if len(a) > 0 else 0., 'max': a.max().item() if len(a) > 0 else 0}
+
+        return {'wall_ms': (time.perf_counter() - self.start) * 1000, 'phases': phases, 'counters': dict(self.counters),
+                'series': series}
+
+    def write(self, path):
+        """
+        Writes the report as JSON, and prints the phases in the console.
+
+        Parameters
+        ----------
+        path: type string: Path of the JSON file.
+
+        Returns
+        -------
+        """
+        report = self.report()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        print('{:<14}{:>8}{:>12}{:>10}{:>10}{:>10}'.format('phase', 'calls', 'total', 'p50', 'p90', 'p99'))
+        for name, p in sorted(report['phases'].items(), key=lambda item: -item[1]['total_ms']):
+            print('{:<14}{:>8}{:>10.1f}ms{:>8.2f}ms{:>8.2f}ms{:>8.2f}ms'.format(
+                name, p['calls'], p['total_ms'], p['p50_ms'], p['p90_ms'], p['p99_ms']))
+        print('profile written to', path)
+
+
+class NullTimer:
+    """
+    Timer doing nothing, shared by all the phases of NullProfiler.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullProfiler:
+    """
+    Profiler of the runs without --profile: every hook does nothing.
+    """
+    enabled = False
+    null_timer = NullTimer()
+
+    def timer(self, name):
+        return self.null_timer
+
+    def count(self, name, n=1):
+        pass
+
+    def record(self, name, value):
+        pass
+
+
+# The profiler used when none is given
+NULL = NullProfiler()
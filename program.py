@@ -1,9 +1,15 @@
 import database as db
+import cache
 import graph
-import visual as gui
-import chart
+import layout
+import spread
+import ensemble
+import frontends
+import profiling
 import random
 import argparse
+from collections import deque
+import numpy
 
 # ArgumentParser is used to get the command line options from the terminal.
 parser = argparse.ArgumentParser(
@@ -39,6 +45,139 @@ parser.add_argument(
     default=-1,
     help='Number of days between infection day and start of lockdown. By default lockdown is disable.'
 )
+parser.add_argument(
+    '-nc',
+    '--nocache',
+    action='store_true',
+    help='Always load the graph from the database and compute its layout, and do not write their cache files.'
+)
+parser.add_argument(
+    '-e',
+    '--engine',
+    type=str,
+    default='frontier',
+    choices=['frontier', 'bfs'],
+    help='Spread engine: frontier (vectorized, the whole frontier at once) or bfs (vertice by vertice).'
+)
+parser.add_argument(
+    '--layout',
+    type=str,
+    default='auto',
+    choices=layout.METHODS,
+    help='Graph layout: spring (NetworkX), force (approximate, for large graphs), multilevel (force on coarsened '
+         'graphs, for very large graphs) or auto (spring up to ' + str(layout.LARGE_GRAPH) + ' vertices, '
+         'multilevel above).'
+)
+parser.add_argument(
+    '--r0',
+    type=int,
+    default=3,
+    help='Initial r0 of the spread.'
+)
+parser.add_argument(
+    '--r0delta',
+    type=int,
+    default=3,
+    help='Initial delta/variation of the r0.'
+)
+parser.add_argument(
+    '--infectedperiod',
+    type=int,
+    default=5,
+    help='Initial number of days between infection and immunity.'
+)
+parser.add_argument(
+    '--immunityperiod',
+    type=int,
+    default=10,
+    help='Initial immunity period in days.'
+)
+parser.add_argument(
+    '--deathprob',
+    type=float,
+    default=.1,
+    help='Initial death probability of an infected.'
+)
+parser.add_argument(
+    '--frontend',
+    type=str,
+    choices=sorted(frontends.FRONTENDS),
+    default=None,
+    help='How the simulation is shown: tk (windows, default), headless (--headless) or export (--export).'
+)
+parser.add_argument(
+    '--headless',
+    action='store_true',
+    help='Run the simulation without any window, until the epidemic ends or --days, and output the daily numbers.'
+)
+parser.add_argument(
+    '--days',
+    type=int,
+    default=365,
+    help='Maximum number of days of a headless run or of an export.'
+)
+parser.add_argument(
+    '--export',
+    type=str,
+    default=None,
+    help='Run the simulation without any window and write it as an animation: .gif, or .mp4 when ffmpeg is installed.'
+)
+parser.add_argument(
+    '--fps',
+    type=float,
+    default=4,
+    help='Frames (days) per second of an export.'
+)
+parser.add_argument(
+    '-o',
+    '--output',
+    type=str,
+    default=None,
+    help='CSV file where a headless run writes its daily numbers. By default they are printed.'
+)
+parser.add_argument(
+    '--debug',
+    action='store_true',
+    help='Check the invariants of the simulation state after each day (slow on large graphs).'
+)
+parser.add_argument(
+    '-v',
+    '--verbosity',
+    type=int,
+    choices=(profiling.QUIET, profiling.INFO, profiling.DEBUG, profiling.TRACE),
+    default=profiling.INFO,
+    help='Details printed each day: 0 nothing, 1 the counts, 2 each death and end of lockdown, 3 everything.'
+)
+parser.add_argument(
+    '--profile',
+    type=str,
+    default=None,
+    help='JSON file where the time of each phase (spread, transitions, coloring, drawing, chart) and the frontier '
+         'size of each day are written at the end of the run.'
+)
+parser.add_argument(
+    '--replicas',
+    type=int,
+    default=0,
+    help='Run this number of independent headless simulations (Monte Carlo ensemble) over --days days.'
+)
+parser.add_argument(
+    '--bands',
+    action='store_true',
+    help='With --replicas, chart the median and the 5-95%% band of each curve while the replicas run.'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=1,
+    help='Number of processes running the replicas or rendering the frames of an export.'
+)
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=0,
+    help='Master seed of an ensemble. Each replica gets its own seed derived from it.'
+)
 
 
 def create_graph(edges_db):
@@ -80,19 +219,75 @@ def breadth_first_search(g, root):
     type list: List of the all the vertices checked, order by chronology of reaching.
 
     """
-    queue = [root]
+    # A deque pops on the left in O(1) and the set makes the checks O(1).
+    # A vertice is marked when queued, so it is never queued twice.
+    queue = deque([root])
+    seen = {root}
     checked = []
 
     while len(queue) > 0:
-        vertice = queue.pop(0)
+        vertice = queue.popleft()
         for n in g.neighbors(vertice):
-            if n not in checked:
+            if n not in seen:
+                seen.add(n)
                 queue.append(n)
         checked.append(vertice)
 
     return checked
 
 
+def bfs_levels(g, sources):
+    """
+    Breadth first search by levels on a FrozenGraph: the whole frontier is expanded at once.
+    Level k holds the vertices at k hops of the closest source, that is, the vertices the spread
+    can reach at day k at best.
+
+    Parameters
+    ----------
+    g: type FrozenGraph: graph in which we want to search.
+    sources: Name of the starting vertice, or a list of names.
+
+    Returns
+    -------
+    type iterator of numpy.ndarray: ids of the vertices of each level, starting with the sources.
+    """
+    if not isinstance(sources, (list, tuple, set, numpy.ndarray)):
+        sources = [sources]
+
+    visited = numpy.zeros(g.nb_neighbors(), dtype=bool)
+    frontier = numpy.unique(numpy.array([g.ids[s] for s in sources], dtype=numpy.int64))
+    visited[frontier] = True
+
+    while len(frontier) > 0:
+        yield frontier
+
+        # Neighbors of the whole frontier, without duplicates nor already reached vertices
+        neighbors, _ = graph.gather_neighbors(g.indptr, g.indices, frontier)
+        neighbors = numpy.unique(neighbors)
+        frontier = neighbors[~visited[neighbors]]
+        visited[frontier] = True
+
+
+def hop_distances(g, sources):
+    """
+    Number of hops between the sources and every vertice.
+
+    Parameters
+    ----------
+    g: type FrozenGraph: graph in which we want to search.
+    sources: Name of the starting vertice, or a list of names.
+
+    Returns
+    -------
+    type numpy.ndarray: distance of each vertice, indexed by id. -1 for the vertices out of reach.
+    """
+    distances = numpy.full(g.nb_neighbors(), -1, dtype=numpy.int32)
+    for level, frontier in enumerate(bfs_levels(g, sources)):
+        distances[frontier] = level
+
+    return distances
+
+
 def breadth_first_search_step_by_step(g, locked, immune, step_id, root, r0, r0_delta, to_infect=[], infected=[]):
     """
     The explanations below will mention a queue as if it was a variable. In fact, it is! The variable 'to_infect'
@@ -153,7 +348,8 @@ def breadth_first_search_step_by_step(g, locked, immune, step_id, root, r0, r0_d
 
         # Set a r0
         random_r0 = int(random.uniform(r0 - r0_delta, r0 + r0_delta))
-        print('~~~~ Spread Info:', vertice, 'will contaminate', random_r0, 'people')
+        if profiling.verbosity >= profiling.TRACE:
+            print('~~~~ Spread Info:', vertice, 'will contaminate', random_r0, 'people')
 
         # We check as many nodes as random_r0 allows us, but we are limited by the number of neighbors of this vertice.
         # So, we use the minimum to avoid selecting outside of 'neighbors' array.
@@ -188,10 +384,36 @@ def main():
     # Get arguments
     args = parser.parse_args()
 
+    # Details printed in the console
+    profiling.set_verbosity(args.verbosity)
+
+    # Frontend: --headless and --export are shortcuts of --frontend
+    frontend = args.frontend
+    if frontend is None:
+        frontend = 'export' if args.export is not None else 'headless' if args.headless else 'tk'
+    if frontend == 'export' and args.export is None:
+        parser.error('the export frontend needs --export PATH')
+
+    # The replicas of an ensemble run the vectorized engine, and their phases are not timed
+    if args.replicas > 0 and args.engine != 'frontier':
+        parser.error('--replicas runs the frontier engine only, not --engine ' + args.engine)
+    if args.replicas > 0 and args.profile is not None:
+        parser.error('--profile can not be used with --replicas')
+
     # Show the usage of the command if no options were used (we can imagine that the user doesn't know how to use it).
-    if args.database == 'got' and args.root == '' and args.animationtime == 1:
+    if args.database == 'got' and args.root == '' and args.animationtime == 1 and frontend == 'tk' \
+            and args.replicas == 0:
         print(parser.print_help())
 
+    # Initial values of the simulation
+    params = {
+        'r0': args.r0,
+        'r0_delta': args.r0delta,
+        'day_to_immunity': args.infectedperiod,
+        'immunity_period': args.immunityperiod,
+        'deathprob': args.deathprob,
+    }
+
     # Load the main database we are going to use to create the graph
     db_name = args.database
     edges_db = None
@@ -204,20 +426,44 @@ def main():
     else:
         edges_db = db.Database(db_name + '_edges')
 
-    # Create the graph
-    g = create_graph(edges_db)
+    # Ensemble: the workers load the graph themselves. --debug checks the state of each replica.
+    if args.replicas > 0:
+        params['debug'] = args.debug
+        if args.bands:
+            runner = ensemble.Runner(edges_db.file_name, args.replicas, args.workers, args.seed, args.root,
+                                     args.lockdown, args.days, not args.nocache, **params)
+            result = frontends.show_bands(runner, args.days)
+        else:
+            result = ensemble.run_ensemble(edges_db.file_name, args.replicas, args.workers, args.seed, args.root,
+                                           args.lockdown, args.days, not args.nocache, **params)
+        ensemble.write_ensemble(result, args.output)
+        return
+
+    # Create the graph: the edges are loaded straight into CSR arrays,
+    # or mapped from the compiled snapshot written next to the database by a previous run.
+    g = cache.load_graph(edges_db, not args.nocache)
 
     # The root is the starting point of the spread
     # if None, get a random starting point
     root = args.root
     if root == '':
-        root = g.vertices()[random.randint(0, len(g.vertices()) - 1)]
+        vertices = g.vertices()
+        root = vertices[random.randint(0, len(vertices) - 1)]
+
+    # Spread function called each day
+    spread_func = spread.spread_step if args.engine == 'frontier' else breadth_first_search_step_by_step
+
+    # Timers of the phases of each day, written at the end of the run
+    profiler = None
+    if args.profile is not None:
+        profiler = profiling.Profiler()
+        params['profiler'] = profiler
 
-    # Chart to plot spread numbers
-    chart_instance = chart.Chart()
+    # Start the frontend: it only imports matplotlib (and Tk) if it needs them
+    frontends.run(frontend, g, spread_func, root, args, params)
 
-    # Start the GUI process to render the spread
-    gui.show_graph(g, breadth_first_search_step_by_step, root, abs(args.animationtime), chart_instance, args.lockdown)
+    if profiler is not None:
+        profiler.write(args.profile)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,569 @@
+import collections
+import queue
+import threading
+import numpy
+import graph
+import profiling
+import spread
+import store
+
+
+# Snapshot of a day: the compartment of every vertice (by id) and the numbers of the chart
+Frame = collections.namedtuple('Frame', ['day', 'codes', 'total', 'daily', 'dead', 'immune', 'over'])
+
+
+class Calendar:
+    """
+    Calendar queue (timer wheel with one slot per day) of the vertices waiting for a transition.
+    Vertices are bucketed by the day their current state started. A transition is due a period after that day,
+    and the period can change at any time (sliders): `pop_due` gets the buckets up to `today - period`, in order.
+    Each day, only the due vertices are touched.
+    """
+    def __init__(self):
+        # start day -> list of arrays of vertice ids
+        self.buckets = {}
+        # All the buckets before the cursor have been popped
+        self.cursor = 0
+        # (ids, start days) added to a day already popped (period of 0 day, or a slider moved), checked at each pop
+        self.late = []
+
+    def add(self, ids, days):
+        """
+        Adds vertices whose state started at `days`.
+
+        Parameters
+        ----------
+        ids: type numpy.ndarray: ids of the vertices.
+        days: type int or numpy.ndarray: The start day of the state, for all the vertices or for each one.
+
+        Returns
+        -------
+        """
+        ids = numpy.atleast_1d(ids)
+        days = numpy.broadcast_to(days, ids.shape)
+        if len(ids) == 0:
+            return
+
+        late = days < self.cursor
+        if late.any():
+            self.late.append((ids[late], days[late]))
+            ids = ids[~late]
+            days = days[~late]
+
+        for day in numpy.unique(days).tolist():
+            self.buckets.setdefault(day, []).append(ids[days == day])
+
+    def pop_due(self, last_day):
+        """
+        Pops all the vertices whose state started at `last_day` or before.
+
+        Parameters
+        ----------
+        last_day: type int: Last start day to pop.
+
+        Returns
+        -------
+        type tuple: (ids, start days) arrays. Entries may be outdated: the caller checks the state is still the same.
+        """
+        ids = []
+        days = []
+
+        late = []
+        for late_ids, late_days in self.late:
+            due = late_days <= last_day
+            ids.append(late_ids[due])
+            days.append(late_days[due])
+            if not due.all():
+                late.append((late_ids[~due], late_days[~due]))
+        self.late = late
+
+        while self.cursor <= last_day:
+            for bucket in self.buckets.pop(self.cursor, ()):
+                ids.append(bucket)
+                days.append(numpy.full(len(bucket), self.cursor))
+            self.cursor += 1
+
+        if len(ids) == 0:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+        return numpy.concatenate(ids).astype(numpy.int64), numpy.concatenate(days).astype(numpy.int64)
+
+
+class Simulation:
+    """
+    The disease dynamics, without any rendering: spread, deaths, immunity and lockdown day after day.
+    `visual.State` draws it; `run` runs it headless, as fast as possible.
+    The state of the vertices is kept by id in a `StateStore`.
+    """
+    def __init__(self, g, spread_func, root, lockdown, r0=3, r0_delta=3, day_to_immunity=5, immunity_period=10,
+                 deathprob=.1, verbose=True, debug=False, profiler=None):
+
+        # The simulation works on vertice ids: a Graph_dic is frozen first
+        if not isinstance(g, graph.Graph_csr):
+            g = g.freeze()
+
+        # Current day
+        self.index = 0
+        self.g = g
+        self.root = root
+
+        # Spread function to create a step by step spread
+        self.spread = spread_func
+
+        # Random source of the deaths and of the vectorized spread, seeded from the `random` module
+        self.rng = spread.new_rng()
+
+        # Compartment (susceptible, infected, immune, locked, dead) and day of each vertice.
+        # The root is infected at day 0.
+        self.store = store.StateStore(g.nb_neighbors())
+        root_id = g.ids[root]
+        self.store.set(root_id, store.INFECTED, 0)
+
+        # Infected vertices spreading the disease: each one stays in it during all its infection
+        self.frontier = numpy.array([root_id], dtype=numpy.int64)
+
+        # Pending transitions, bucketed by the day the current state started:
+        # infected -> locked or immune, immune -> normal, locked -> immune.
+        self.infected_calendar = Calendar()
+        self.infected_calendar.add(root_id, 0)
+        self.immune_calendar = Calendar()
+        self.locked_calendar = Calendar()
+
+        # Values that will be modified
+        self.r0 = r0
+        self.r0_delta = r0_delta
+        # Day to immunity (DTI)
+        self.day_to_immunity = day_to_immunity
+        # Immunity period in days
+        self.immunity_period = immunity_period
+        # Death probability when infected. If random is lower, the vertice is dead.
+        self.deathprob = deathprob
+
+        # Number of days between infection and lockdown, -1 if lockdown is disabled
+        self.lockdown = lockdown
+
+        # Level of the details of each day printed in the console: the level of `profiling.verbosity`,
+        # or nothing when not verbose
+        self.verbose = profiling.verbosity if verbose else profiling.QUIET
+
+        # Timers and counters of the phases of each day (see `profiling.Profiler`)
+        self.profiler = profiling.NULL if profiler is None else profiler
+
+        # Check the invariants of the state after each day (O(n) per day)
+        self.debug = debug
+
+        # Cases of the day, updated in the 'next' method. The totals come from the counts of the store.
+        self.daily_cases = 1  # the first one is the root
+
+    def frame(self):
+        """
+        Snapshot of the current day, independent of the simulation: it can be drawn while the next days are simulated.
+
+        Returns
+        -------
+        type Frame
+        """
+        return Frame(self.index, self.store.snapshot(), self.nbcases, self.daily_cases, self.nbdead, self.nbimmune,
+                     self.is_over())
+
+    @property
+    def nbcases(self):
+        """
+        The number of cases: infected and locked vertices, in O(1).
+        """
+        return self.store.count(store.INFECTED) + self.store.count(store.LOCKED)
+
+    @property
+    def nbdead(self):
+        """
+        The number of dead vertices, in O(1).
+        """
+        return self.store.count(store.DEAD)
+
+    @property
+    def nbimmune(self):
+        """
+        The number of immune vertices, in O(1).
+        """
+        return self.store.count(store.IMMUNE)
+
+    def check(self):
+        """
+        Checks the invariants of the simulation (debug mode): the store is consistent and
+        the frontier is exactly the set of infected vertices.
+        """
+        self.store.check(self.index)
+        assert numpy.array_equal(numpy.sort(self.frontier), self.store.ids_in(store.INFECTED)), \
+            'the frontier is not the set of infected vertices'
+
+    def names_in(self, compartment):
+        """
+        Vertices of a compartment with the start day of their state: {node_name: day}.
+        Built from the store on each call, for display and debugging.
+
+        Parameters
+        ----------
+        compartment: type int: The compartment.
+
+        Returns
+        -------
+        type dict
+        """
+        ids = self.store.ids_in(compartment)
+        return dict(zip(self.g.names[ids].tolist(), self.store.day[ids].tolist()))
+
+    @property
+    def infected(self):
+        """
+        Infected nodes: {node_name: day of infection}, dead nodes included with -1.
+        """
+        infected = self.names_in(store.INFECTED)
+        infected.update(self.names_in(store.DEAD))
+        return infected
+
+    @property
+    def immune(self):
+        """
+        Immune nodes: {node_name: day of the start of immunity}.
+        """
+        return self.names_in(store.IMMUNE)
+
+    @property
+    def locked(self):
+        """
+        Nodes under lockdown: {node_name: day of infection}.
+        """
+        return self.names_in(store.LOCKED)
+
+    def is_over(self):
+        """
+        Checks if the epidemic has ended: no living infected and no one under lockdown.
+        Indeed, no more infections are possible. O(1): only the counts of the store are read.
+
+        Returns
+        -------
+        boolean
+        """
+        return self.store.count(store.INFECTED) == 0 and self.store.count(store.LOCKED) == 0
+
+    def spread_frontier(self):
+        """
+        Calls the spread function for the frontier.
+        The vectorized spread works on the ids and the store directly. Any other spread function
+        (like `program.breadth_first_search_step_by_step`) gets the names, as before.
+
+        Returns
+        -------
+        type numpy.ndarray: ids of the vertices to infect today, without duplicates.
+        """
+        g = self.g
+
+        if self.spread is spread.spread_step:
+            blocked = self.store.compartment != store.SUSCEPTIBLE
+            return spread.frontier_step(g.indptr, g.indices, self.frontier, blocked, self.r0, self.r0_delta, self.rng)
+
+        # Continue the spread by calling the spread function.
+        # The spread function returns a dictionnary with all the values neeeded to proceed another step later.
+        frontier = g.names[self.frontier].tolist()
+        returned_values = self.spread(
+            g,
+            self.locked,
+            self.immune,
+            self.index,
+            self.root,
+            self.r0,
+            self.r0_delta,
+            list(frontier),
+            list(frontier),
+        )
+        selected = returned_values['to_infect'] + returned_values['infected']
+        ids = numpy.unique(numpy.fromiter((g.ids[n] for n in selected), numpy.int64, len(selected)))
+        return ids[self.store.is_in(ids, store.SUSCEPTIBLE)]
+
+    def next(self):
+        """
+        Continues the spread. Calls the spread algorithm to proceed the disease spread a step forward.
+        Then updates the states: deaths, immunity, lockdown.
+        """
+
+        profiler = self.profiler
+
+        # Index/day
+        self.index += 1
+        if self.verbose >= profiling.INFO:
+            print('Day:', self.index)
+
+        # Vertices infected today
+        profiler.record('frontier', len(self.frontier))
+        with profiler.timer('spread'):
+            new = self.spread_frontier()
+
+        with profiler.timer('transitions'):
+            self.transitions(new)
+
+        if self.debug:
+            self.check()
+
+        if self.verbose >= profiling.TRACE:
+            # DEBUG IN CONSOLE: all the locked vertices and the date of their lockdown's start.
+            print('--')
+            for k, v in self.locked.items():
+                print(k, v)
+            print('--')
+
+        if self.verbose >= profiling.INFO:
+            # DEBUG IN CONSOLE: total amount of infected, dead, immuned.
+            print('+++++Nb Info:', self.nbcases, 'infected')
+            print('+++++Nb Info:', self.nbdead, 'dead')
+            print('++++ Nb Info:', self.nbimmune, 'immuned')
+            print()
+
+    def transitions(self, new):
+        """
+        Updates the states of the day: deaths and infections of the new cases, then the infected, immune and locked
+        vertices whose period is over.
+
+        Parameters
+        ----------
+        new: type numpy.ndarray: ids of the vertices infected today, without duplicates.
+
+        Returns
+        -------
+        """
+
+        # Vital prognosis engaged: for each new infected => random number => dead ? if no then just infected.
+        dies = self.rng.random(len(new)) <= self.deathprob
+        dead = new[dies]
+        new = new[~dies]
+
+        self.profiler.count('infections', len(new))
+        self.profiler.count('deaths', len(dead))
+        if self.verbose >= profiling.DEBUG:
+            for n in self.g.names[dead].tolist():
+                print('xxxx Death info:', n, "just died")
+
+        self.store.set(dead, store.DEAD)
+
+        # Survivors are infected today. They spread from tomorrow.
+        self.store.set(new, store.INFECTED, self.index)
+        self.infected_calendar.add(new, self.index)
+
+        # Cases of the day (used in the chart)
+        self.daily_cases = len(new)
+
+        # Infected whose pre-lockdown (lockdown enabled) or infected period (lockdown disabled) is over.
+        # Only the vertices infected `period` days ago (or before, if the slider just went down) are checked.
+        period = self.lockdown if self.lockdown != -1 else self.day_to_immunity
+        ids, days = self.infected_calendar.pop_due(self.index - period)
+        due = self.store.is_in(ids, store.INFECTED, days)
+        ids = ids[due]
+        days = days[due]
+
+        # lockdown enabled => going to lockdown
+        if self.lockdown != -1:
+            # The lock day is the infection day. Thus, we keep track of when the node was infected
+            # and not only when it was locked
+            self.store.set(ids, store.LOCKED, days)
+            self.locked_calendar.add(ids, days)
+
+        # lockdown disabled => is now immune, from today
+        else:
+            self.store.set(ids, store.IMMUNE, self.index)
+            self.immune_calendar.add(ids, self.index)
+
+        # Removing immune that arn't immune anymore: the immune period is over.
+        ids, days = self.immune_calendar.pop_due(self.index - self.immunity_period)
+        self.store.set(ids[self.store.is_in(ids, store.IMMUNE, days)], store.SUSCEPTIBLE)
+
+        # Unlocking the locked nodes: the lockdown period is over.
+        ids, days = self.locked_calendar.pop_due(self.index - self.day_to_immunity)
+        ids = ids[self.store.is_in(ids, store.LOCKED, days)]
+        if self.verbose >= profiling.DEBUG:
+            for n in self.g.names[ids].tolist():
+                print('!!!!!', n)
+
+        # When going out of lockdown => we are immune
+        self.store.set(ids, store.IMMUNE, self.index)
+        self.immune_calendar.add(ids, self.index)
+
+        # Dead, locked and immune vertices stop spreading
+        frontier = numpy.concatenate((self.frontier, new))
+        self.frontier = frontier[self.store.is_in(frontier, store.INFECTED)]
+
+
+class Producer(threading.Thread):
+    """
+    Runs a simulation in a background thread, so that it never waits for the rendering and a slow rendering never
+    freezes the controls. After each day, a `Frame` is pushed in the bounded queue `frames`: when it is full, the
+    producer waits for the consumer (the GUI).
+    The simulation is only touched by this thread (`step` simulates a day). The consumer sends commands in the `commands` queue,
+    applied between two days:
+        - ('step',): simulates one day,
+        - ('run',): simulates days until the epidemic ends or a ('pause',),
+        - ('pause',): stops running,
+        - ('set', name, value): changes a parameter of the simulation (r0, deathprob, ...),
+        - ('quit',): ends the thread.
+    """
+    def __init__(self, sim, step=None, maxsize=8):
+        super().__init__(daemon=True)
+        self.sim = sim
+
+        # Simulates one day: `sim.next` by default
+        self.step = sim.next if step is None else step
+        self.frames = queue.Queue(maxsize)
+        self.commands = queue.Queue()
+
+        # Running until paused, number of single days asked, and end of the thread
+        self.running = False
+        self.steps = 0
+        self.quitting = False
+
+    def send(self, *command):
+        """
+        Sends a command to the producer. Called by the consumer.
+
+        Parameters
+        ----------
+        command: The command and its arguments, see `Producer`.
+
+        Returns
+        -------
+        """
+        self.commands.put(command)
+
+    def apply(self, command):
+        """
+        Applies a command, in the producer thread.
+
+        Parameters
+        ----------
+        command: type tuple: The command and its arguments.
+
+        Returns
+        -------
+        """
+        if command[0] == 'step':
+            self.steps += 1
+        elif command[0] == 'run':
+            self.running = True
+        elif command[0] == 'pause':
+            self.running = False
+            self.steps = 0
+        elif command[0] == 'set':
+            setattr(self.sim, command[1], command[2])
+        elif command[0] == 'quit':
+            self.quitting = True
+        else:
+            raise ValueError('Unknown command ' + repr(command[0]))
+
+    def poll(self, block):
+        """
+        Applies the pending commands.
+
+        Parameters
+        ----------
+        block: type bool: Wait for a command first (when there is nothing to simulate).
+
+        Returns
+        -------
+        """
+        try:
+            if block:
+                self.apply(self.commands.get())
+            while True:
+                self.apply(self.commands.get_nowait())
+        except queue.Empty:
+            pass
+
+    def push(self, frame):
+        """
+        Pushes a frame, waiting for room in the queue. The commands keep being applied while waiting.
+
+        Parameters
+        ----------
+        frame: type Frame: The frame.
+
+        Returns
+        -------
+        """
+        while not self.quitting:
+            try:
+                self.frames.put(frame, timeout=.05)
+                return
+            except queue.Full:
+                self.poll(False)
+
+    def run(self):
+        while not self.quitting:
+            self.poll(not self.running and self.steps == 0)
+
+            # Running stops when no one can be infected anymore. A single day is always simulated.
+            if self.running and self.steps == 0 and self.sim.is_over():
+                self.running = False
+            if self.quitting or (not self.running and self.steps == 0):
+                continue
+
+            self.step()
+            self.steps = max(0, self.steps - 1)
+            self.push(self.sim.frame())
+
+
+def run(sim, max_days=365, until_over=True, record_states=False):
+    """
+    Runs a simulation until the epidemic ends or until `max_days`.
+
+    Parameters
+    ----------
+    sim: type Simulation: The simulation to run.
+    max_days: type int: Maximum number of simulated days.
+    until_over: type bool: Stop when the epidemic ends. False always runs `max_days` days,
+                so that the series of several runs have the same length.
+    record_states: type bool: Also record the compartment of every vertice each day, in 'states'.
+
+    Returns
+    -------
+    type dict: the per-day series of the chart: 'day', 'total', 'daily', 'dead', 'immune' (lists, day 0 included),
+               and 'states' (list of numpy.ndarray) with record_states.
+    """
+    series = {'day': [], 'total': [], 'daily': [], 'dead': [], 'immune': []}
+    if record_states:
+        series['states'] = []
+
+    def record():
+        series['day'].append(sim.index)
+        series['total'].append(sim.nbcases)
+        series['daily'].append(sim.daily_cases)
+        series['dead'].append(sim.nbdead)
+        series['immune'].append(sim.nbimmune)
+        if record_states:
+            series['states'].append(sim.store.snapshot())
+
+    record()
+    while sim.index < max_days and not (until_over and sim.is_over()):
+        sim.next()
+        record()
+
+    return series
+
+
+def write_series(series, path=None):
+    """
+    Writes per-day series as CSV, in a file or in the console.
+
+    Parameters
+    ----------
+    series: type dict: The series returned by `run`.
+    path: type string: Path of the CSV file. None prints it.
+
+    Returns
+    -------
+    """
+    columns = ['day', 'total', 'daily', 'dead', 'immune']
+    lines = [','.join(columns)]
+    for values in zip(*(series[c] for c in columns)):
+        lines.append(','.join(str(v) for v in values))
+
+    if path is None:
+        print('\n'.join(lines))
+    else:
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,113 @@
+import random
+import numpy
+import graph
+
+
+def new_rng():
+    """
+    Creates a numpy random generator seeded from the `random` module.
+    Thus, `random.seed` keeps making the whole spread reproducible.
+
+    Returns
+    -------
+    type numpy.random.Generator
+    """
+    return numpy.random.default_rng(random.getrandbits(64))
+
+
+def frontier_step(indptr, indices, frontier, blocked, r0, r0_delta, rng):
+    """
+    One day of spread for a whole frontier at once, on CSR arrays.
+    Each vertice of the frontier draws its own r0 between r0 - r0_delta and r0 + r0_delta, then picks that many
+    distinct random neighbors (all of them if it has fewer). The picked neighbors that are not blocked
+    (infected, immune or locked) are the newly infected, without duplicates.
+
+    Parameters
+    ----------
+    indptr: type numpy.ndarray: CSR offsets.
+    indices: type numpy.ndarray: CSR neighbor ids.
+    frontier: type numpy.ndarray: ids of the vertices spreading the disease today.
+    blocked: type numpy.ndarray: boolean mask of the vertices that can not be infected.
+    r0: The r0 of the spread.
+    r0_delta: The delta/variation of the r0.
+    rng: type numpy.random.Generator: random source.
+
+    Returns
+    -------
+    type numpy.ndarray: sorted ids of the newly infected vertices.
+    """
+    frontier = numpy.asarray(frontier, dtype=numpy.int64)
+    if len(frontier) == 0:
+        return frontier
+
+    # Like int(random.uniform(...)): truncated toward zero, a negative draw infects no one.
+    draws = rng.uniform(r0 - r0_delta, r0 + r0_delta, len(frontier)).astype(numpy.int64)
+
+    neighbors, counts = graph.gather_neighbors(indptr, indices, frontier)
+    if len(neighbors) == 0:
+        return neighbors.astype(numpy.int64)
+
+    # Picking k distinct random neighbors in a row <=> keeping the k smallest of random keys given to the row.
+    # Sorting by (row, key) gives the rank of each neighbor in its row.
+    rows = numpy.repeat(numpy.arange(len(frontier)), counts)
+    order = numpy.lexsort((rng.random(len(neighbors)), rows))
+    row_starts = numpy.cumsum(counts) - counts
+    ranks = numpy.empty(len(neighbors), dtype=numpy.int64)
+    ranks[order] = numpy.arange(len(neighbors)) - row_starts[rows[order]]
+
+    picked = neighbors[ranks < draws[rows]]
+
+    # Dedupe, then mask out the vertices that can not be infected
+    picked = numpy.unique(picked)
+    return picked[~blocked[picked]].astype(numpy.int64)
+
+
+def spread_step(g, locked, immune, step_id, root, r0, r0_delta, to_infect=None, infected=None, rng=None):
+    """
+    Vectorized version of `program.breadth_first_search_step_by_step`, with the same parameters and returned values.
+    It can be given to `visual.show_graph` as the spread function.
+    The names are translated to the ids of the graph, then the whole queue `to_infect` spreads at once with
+    `frontier_step`. As before, a vertice stays in the queue during all its infection.
+
+    Parameters
+    ----------
+    g: type FrozenGraph: The graph in which we search.
+    locked: Vertices under lockdown -> they can not infect other vertices.
+    immune: Vertices immuned -> they can not infect other vertices.
+    step_id: type int: The n° of the current step. Used to identify the first call.
+    root: Name of the first infected vertice.
+    r0: type int: The r0 of the spread.
+    r0_delta: type int: The delta/variation of the r0
+    to_infect: type list: A list of all the neighbors that has been selected to be infected later on.
+    infected: type list: A list of all the infected nodes.
+    rng: type numpy.random.Generator: random source. By default, seeded from the `random` module.
+
+    Returns
+    -------
+    type dict: a dictionnary with all the values that need to be sent to call the function later.
+    """
+    to_infect = [] if to_infect is None else to_infect
+    infected = [] if infected is None else infected
+    rng = new_rng() if rng is None else rng
+
+    # Initialization: step 0 => The beginning => No one is infected and queued except the root.
+    if step_id == 0 and len(to_infect) == 0 and len(infected) == 0:
+        to_infect = [root]
+
+    ids = g.ids
+
+    # Per-vertice state: True when the vertice can not be infected
+    blocked = numpy.zeros(g.nb_neighbors(), dtype=bool)
+    for names in (infected, immune, locked):
+        if len(names) > 0:
+            blocked[numpy.fromiter((ids[n] for n in names), numpy.int64, len(names))] = True
+
+    frontier = numpy.unique(numpy.fromiter((ids[n] for n in to_infect), numpy.int64, len(to_infect)))
+    new = frontier_step(g.indptr, g.indices, frontier, blocked, r0, r0_delta, rng)
+
+    # The frontier stays queued (still infected) and is now infected for sure
+    to_infect_next_step = g.names[numpy.union1d(new, frontier)].tolist()
+    already = set(infected)
+    infected = infected + [n for n in g.names[frontier].tolist() if n not in already]
+
+    return {'g': g, 'id': step_id + 1, 'r': root, 'to_infect': to_infect_next_step, 'infected': infected}
@@ -0,0 +1,159 @@
+import numpy
+
+
+# Compartments of a vertice. Stored on one byte per vertice.
+SUSCEPTIBLE = 0
+INFECTED = 1
+IMMUNE = 2
+LOCKED = 3
+DEAD = 4
+
+COMPARTMENTS = ('susceptible', 'infected', 'immune', 'locked', 'dead')
+
+
+class StateStore:
+    """
+    Epidemic state of every vertice, in arrays indexed by vertice id:
+        - `compartment`: uint8, one of SUSCEPTIBLE, INFECTED, IMMUNE, LOCKED, DEAD,
+        - `day`: int32, the day the clock of the current compartment started: infection day for the infected
+          and the locked (the lockdown ends `day_to_immunity` days after infection), start of immunity for the immune.
+    That is 5 bytes per vertice. The number of vertices of each compartment is kept up to date on each change.
+    """
+    __slots__ = ('compartment', 'day', 'counts')
+
+    def __init__(self, n):
+        self.compartment = numpy.zeros(n, dtype=numpy.uint8)
+        self.day = numpy.full(n, -1, dtype=numpy.int32)
+
+        # Number of vertices in each compartment
+        self.counts = numpy.zeros(len(COMPARTMENTS), dtype=numpy.int64)
+        self.counts[SUSCEPTIBLE] = n
+
+    def __len__(self):
+        return len(self.compartment)
+
+    def set(self, ids, compartment, day=-1):
+        """
+        Moves vertices to a compartment.
+
+        Parameters
+        ----------
+        ids: type numpy.ndarray or int: ids of the vertices. They must be distinct.
+        compartment: type int: The new compartment.
+        day: type int or numpy.ndarray: start day of the compartment's clock, for each vertice or for all.
+
+        Returns
+        -------
+        """
+        ids = numpy.atleast_1d(ids)
+        if len(ids) == 0:
+            return
+
+        self.counts -= numpy.bincount(self.compartment[ids], minlength=len(COMPARTMENTS))
+        self.counts[compartment] += len(ids)
+
+        self.compartment[ids] = compartment
+        self.day[ids] = day
+
+    def count(self, compartment):
+        """
+        Number of vertices in a compartment, in O(1).
+
+        Parameters
+        ----------
+        compartment: type int: The compartment.
+
+        Returns
+        -------
+        int
+        """
+        return int(self.counts[compartment])
+
+    def totals(self):
+        """
+        Number of vertices of each compartment: {compartment name: count}.
+
+        Returns
+        -------
+        type dict
+        """
+        return dict(zip(COMPARTMENTS, self.counts.tolist()))
+
+    def check(self, today=None):
+        """
+        Checks the invariants of the store, in O(n). Used in debug mode only.
+            - the counts match the compartments,
+            - susceptible and dead vertices have no clock, the others started it in the past.
+
+        Parameters
+        ----------
+        today: type int: The current day, to check the days. None skips this check.
+
+        Returns
+        -------
+        """
+        assert numpy.array_equal(self.counts, numpy.bincount(self.compartment, minlength=len(COMPARTMENTS))), \
+            'compartment counts ' + str(self.totals()) + ' do not match the store'
+
+        no_clock = (self.compartment == SUSCEPTIBLE) | (self.compartment == DEAD)
+        assert (self.day[no_clock] == -1).all(), 'susceptible or dead vertice with a day'
+        if today is not None:
+            clock = self.day[~no_clock]
+            assert ((clock >= 0) & (clock <= today)).all(), 'vertice with a day out of [0, ' + str(today) + ']'
+
+    def ids_in(self, compartment):
+        """
+        Ids of the vertices in a compartment.
+
+        Parameters
+        ----------
+        compartment: type int: The compartment.
+
+        Returns
+        -------
+        type numpy.ndarray
+        """
+        return numpy.flatnonzero(self.compartment == compartment)
+
+    def is_in(self, ids, compartment, day=None):
+        """
+        Checks which vertices are in a compartment (and, optionally, started it on the given days).
+
+        Parameters
+        ----------
+        ids: type numpy.ndarray: ids of the vertices.
+        compartment: type int: The compartment.
+        day: type numpy.ndarray: start day expected for each vertice, or None.
+
+        Returns
+        -------
+        type numpy.ndarray: boolean mask
+        """
+        mask = self.compartment[ids] == compartment
+        if day is not None:
+            mask &= self.day[ids] == day
+        return mask
+
+    def copy(self):
+        """
+        Independent copy of the store (two array copies).
+
+        Returns
+        -------
+        type StateStore
+        """
+        other = StateStore.__new__(StateStore)
+        other.compartment = self.compartment.copy()
+        other.day = self.day.copy()
+        other.counts = self.counts.copy()
+        return other
+
+    def snapshot(self):
+        """
+        Copy of the compartment of every vertice, for example to record or draw a day.
+
+        Returns
+        -------
+        type numpy.ndarray
+        """
+        return self.compartment.copy()
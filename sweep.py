@@ -0,0 +1,453 @@
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import numpy
+import ensemble
+
+# ArgumentParser is used to get the command line options from the terminal.
+parser = argparse.ArgumentParser(
+    description='Run the simulation over a grid or a random design of parameters',
+    epilog='Example: python3 sweep.py -db got --grid r0=0:20:2 lockdown=-1,3,5 --replicas 20 -c sweeps/got'
+)
+parser.add_argument(
+    '-db',
+    '--database',
+    type=str,
+    default='got',
+    help='Database name (without _edges).'
+)
+parser.add_argument(
+    '-c',
+    '--checkpoint',
+    type=str,
+    required=True,
+    help='Directory where finished cells are written. Running the same sweep again resumes it.'
+)
+parser.add_argument(
+    '--grid',
+    type=str,
+    nargs='+',
+    default=None,
+    help='Grid design: name=v1,v2,... or name=start:stop[:step] (stop included) for each parameter.'
+)
+parser.add_argument(
+    '--lhs',
+    type=str,
+    nargs='+',
+    default=None,
+    help='Latin hypercube design: name=min:max for each parameter. The number of cells is --cells.'
+)
+parser.add_argument(
+    '--random',
+    type=str,
+    nargs='+',
+    default=None,
+    help='Uniform random design: name=min:max for each parameter. The number of cells is --cells.'
+)
+parser.add_argument(
+    '--cells',
+    type=int,
+    default=20,
+    help='Number of cells of a random or latin hypercube design.'
+)
+parser.add_argument(
+    '--replicas',
+    type=int,
+    default=10,
+    help='Number of replicas of each cell.'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=1,
+    help='Number of processes.'
+)
+parser.add_argument(
+    '--days',
+    type=int,
+    default=365,
+    help='Number of simulated days.'
+)
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=0,
+    help='Master seed of the sweep.'
+)
+parser.add_argument(
+    '-r',
+    '--root',
+    type=str,
+    default='',
+    help='The first infected node. Default is random, drawn by each replica.'
+)
+parser.add_argument(
+    '-o',
+    '--output',
+    type=str,
+    default=None,
+    help='CSV file where the tidy table of the design is written once the sweep is done.'
+)
+
+
+# Parameters of the simulation and their default values. Integer parameters are rounded in random designs.
+PARAMETERS = {
+    'r0': 3,
+    'r0_delta': 3,
+    'day_to_immunity': 5,
+    'immunity_period': 10,
+    'deathprob': .1,
+    'lockdown': -1,
+}
+FLOAT_PARAMETERS = ('r0_delta', 'deathprob')
+
+
+def cast(name, value):
+    """
+    Casts the value of a parameter to its type.
+
+    Parameters
+    ----------
+    name: type string: Name of the parameter.
+    value: The value.
+
+    Returns
+    -------
+    type int or float
+    """
+    if name not in PARAMETERS:
+        raise ValueError('Unknown parameter ' + repr(name) + ', expected one of ' + ', '.join(PARAMETERS))
+    if name in FLOAT_PARAMETERS:
+        return float(value)
+    return int(round(float(value)))
+
+
+def grid(axes):
+    """
+    Grid design: all the combinations of the values of the axes.
+
+    Parameters
+    ----------
+    axes: type dict: parameter name -> list of values.
+
+    Returns
+    -------
+    type list of dict: the cells
+    """
+    names = list(axes)
+    return [{name: cast(name, v) for name, v in zip(names, values)}
+            for values in itertools.product(*(axes[name] for name in names))]
+
+
+def random_design(ranges, cells, seed=0):
+    """
+    Uniform random design.
+
+    Parameters
+    ----------
+    ranges: type dict: parameter name -> (min, max).
+    cells: type int: Number of cells.
+    seed: type int: Seed of the design.
+
+    Returns
+    -------
+    type list of dict: the cells
+    """
+    rng = numpy.random.default_rng(seed)
+    columns = {name: rng.uniform(low, high, cells) for name, (low, high) in ranges.items()}
+    return [{name: cast(name, columns[name][i]) for name in ranges} for i in range(cells)]
+
+
+def latin_hypercube(ranges, cells, seed=0):
+    """
+    Latin hypercube design: each range is cut in `cells` strata, and each stratum of each parameter
+    is used by exactly one cell.
+
+    Parameters
+    ----------
+    ranges: type dict: parameter name -> (min, max).
+    cells: type int: Number of cells.
+    seed: type int: Seed of the design.
+
+    Returns
+    -------
+    type list of dict: the cells
+    """
+    rng = numpy.random.default_rng(seed)
+    columns = {}
+    for name, (low, high) in ranges.items():
+        # One random point per stratum, strata shuffled independently for each parameter
+        u = (rng.permutation(cells) + rng.random(cells)) / cells
+        columns[name] = low + u * (high - low)
+    return [{name: cast(name, columns[name][i]) for name in ranges} for i in range(cells)]
+
+
+def parse_axes(specs, ranges_only=False):
+    """
+    Parses command line specifications of parameters: name=v1,v2,... or name=start:stop[:step].
+
+    Parameters
+    ----------
+    specs: type list of string: The specifications.
+    ranges_only: type bool: Expect name=min:max and return the (min, max) pairs.
+
+    Returns
+    -------
+    type dict: parameter name -> list of values, or (min, max) with ranges_only.
+    """
+    axes = {}
+    for spec in specs:
+        name, values = spec.split('=', 1)
+        cast(name, 0)
+        if ranges_only:
+            low, high = values.split(':')
+            axes[name] = (float(low), float(high))
+            continue
+
+        axes[name] = []
+        for part in values.split(','):
+            if ':' in part:
+                bounds = [float(b) for b in part.split(':')]
+                step = bounds[2] if len(bounds) > 2 else 1
+                axes[name] += numpy.arange(bounds[0], bounds[1] + step / 2, step).tolist()
+            else:
+                axes[name].append(float(part))
+    return axes
+
+
+def cell_params(cell):
+    """
+    Completes a cell with the default values of the parameters it does not set.
+
+    Parameters
+    ----------
+    cell: type dict: The cell.
+
+    Returns
+    -------
+    type dict
+    """
+    params = dict(PARAMETERS)
+    params.update(cell)
+    return params
+
+
+def cell_key(params, edges_name, root, replicas, days, seed):
+    """
+    Identifier of a cell: a hash of everything its results depend on.
+
+    Returns
+    -------
+    type string
+    """
+    desc = json.dumps([params, edges_name, root, replicas, days, seed], sort_keys=True)
+    return hashlib.blake2b(desc.encode(), digest_size=10).hexdigest()
+
+
+def cell_seeds(seed, key, replicas):
+    """
+    Seeds of the replicas of a cell, derived from the master seed and the cell key.
+    Thus, a cell gives the same results whatever the design it belongs to.
+
+    Returns
+    -------
+    type list of int
+    """
+    return ensemble.replica_seeds([seed, int(key, 16)], replicas)
+
+
+def run_job(job):
+    """
+    Runs one replica of one cell in a worker.
+
+    Parameters
+    ----------
+    job: type tuple: (cell index, replica index, seed, root, days, params).
+
+    Returns
+    -------
+    type tuple: (cell index, replica index, series array)
+    """
+    cell, replica, seed, root, days, params = job
+    params = dict(params)
+    lockdown = params.pop('lockdown')
+    return cell, replica, ensemble.run_replica((seed, root, lockdown, days, params))
+
+
+def save_cell(path, index, key, params, series):
+    """
+    Writes a finished cell in the checkpoint directory. The file is written then renamed,
+    so a sweep interrupted while writing never leaves a half cell.
+
+    Parameters
+    ----------
+    path: type string: Path of the cell file.
+    index: type int: Index of the cell in its design, the number of the cell in the progress lines.
+    key: type string: Identifier of the cell, see `cell_key`.
+    params: type dict: Parameters of the cell.
+    series: type numpy.ndarray: series of the replicas, shape (replicas, 4, days + 1).
+
+    Returns
+    -------
+    """
+    tmp = path + '.tmp.npz'
+    numpy.savez(tmp, cell=index, key=key, params=json.dumps(params, sort_keys=True), series=series)
+    os.replace(tmp, path)
+
+
+def run_sweep(edges_name, cells, checkpoint, replicas=10, workers=1, days=365, seed=0, root=''):
+    """
+    Runs all the (cell x replica) jobs of a design across a pool of processes.
+    Each cell is written to the checkpoint directory as soon as all its replicas are done,
+    and the cells already in the directory are skipped: an interrupted sweep resumes where it stopped.
+
+    Parameters
+    ----------
+    edges_name: type string: Name of the edges database, `got_edges` for example.
+    cells: type list of dict: The design, from `grid`, `random_design` or `latin_hypercube`.
+    checkpoint: type string: The checkpoint directory.
+    replicas: type int: Number of replicas of each cell.
+    workers: type int: Number of processes.
+    days: type int: Number of simulated days.
+    seed: type int: Master seed.
+    root: Name of the first infected vertice. Empty: random.
+
+    Returns
+    -------
+    type list of string: paths of the cell files of the design
+    """
+    os.makedirs(checkpoint, exist_ok=True)
+
+    paths = []
+    keys = []
+    jobs = []
+    for i, cell in enumerate(cells):
+        params = cell_params(cell)
+        key = cell_key(params, edges_name, root, replicas, days, seed)
+        path = os.path.join(checkpoint, 'cell_' + key + '.npz')
+        paths.append(path)
+        keys.append(key)
+        if os.path.exists(path):
+            continue
+        for r, s in enumerate(cell_seeds(seed, key, replicas)):
+            jobs.append((i, r, s, root, days, params))
+
+    print('sweep:', len(cells), 'cells,', len(jobs) // max(replicas, 1), 'to run')
+    if len(jobs) == 0:
+        return paths
+
+    # Replicas of the unfinished cells
+    pending = {}
+
+    def collect(result):
+        cell, replica, series = result
+        pending.setdefault(cell, {})[replica] = series
+        if len(pending[cell]) == replicas:
+            save_cell(paths[cell], cell, keys[cell], cell_params(cells[cell]),
+                      numpy.stack([pending[cell][r] for r in range(replicas)]))
+            del pending[cell]
+            print('sweep: cell', cell, cell_params(cells[cell]), 'done')
+
+    if workers <= 1:
+        ensemble.init_worker(edges_name, True)
+        for job in jobs:
+            collect(run_job(job))
+    else:
+        ensemble.load_graph(edges_name)
+        with multiprocessing.Pool(workers, initializer=ensemble.init_worker, initargs=(edges_name, True)) as pool:
+            # Jobs are sent cell after cell, so cells are finished (and saved) early
+            for result in pool.imap_unordered(run_job, jobs, chunksize=max(1, replicas // 2)):
+                collect(result)
+
+    return paths
+
+
+def table(checkpoint, paths=None):
+    """
+    Tidy table of the cells of a checkpoint directory: one row per (cell, replica, day), in order of the cells.
+    The cell column is the index of the cell in its design, as in the progress lines of `run_sweep`, and
+    the key column its identifier (see `cell_key`): a directory can hold the cells of several designs.
+
+    Parameters
+    ----------
+    checkpoint: type string: The checkpoint directory.
+    paths: type list of string: The cell files of a design, returned by `run_sweep`: only its cells are read,
+        numbered by their index in this design, even when their file was written by another design.
+        None: all the cells of the directory, numbered by the index stored in their file.
+
+    Returns
+    -------
+    type dict: column name -> numpy.ndarray. Columns: cell, key, replica, day, the parameters and the series.
+    """
+    design = paths is not None
+    if not design:
+        paths = [os.path.join(checkpoint, f) for f in sorted(os.listdir(checkpoint))
+                 if f.startswith('cell_') and f.endswith('.npz') and not f.endswith('.tmp.npz')]
+
+    cells = []
+    for i, path in enumerate(paths):
+        with numpy.load(path) as data:
+            index = i if design else int(data['cell'])
+            cells.append((index, str(data['key']), json.loads(str(data['params'])), data['series']))
+    cells.sort(key=lambda c: c[:2])
+
+    columns = {name: [] for name in ['cell', 'key', 'replica', 'day'] + list(PARAMETERS) + list(ensemble.SERIES)}
+    for cell, key, params, series in cells:
+        replicas, _, days = series.shape
+        rows = replicas * days
+
+        columns['cell'].append(numpy.full(rows, cell))
+        columns['key'].append(numpy.full(rows, key))
+        columns['replica'].append(numpy.repeat(numpy.arange(replicas), days))
+        columns['day'].append(numpy.tile(numpy.arange(days), replicas))
+        for p in PARAMETERS:
+            columns[p].append(numpy.full(rows, params[p]))
+        for i, s in enumerate(ensemble.SERIES):
+            columns[s].append(series[:, i, :].ravel())
+
+    return {name: numpy.concatenate(values) if values else numpy.zeros(0) for name, values in columns.items()}
+
+
+def write_table(t, path):
+    """
+    Writes a tidy table as CSV.
+
+    Parameters
+    ----------
+    t: type dict: The table returned by `table`.
+    path: type string: Path of the CSV file.
+
+    Returns
+    -------
+    """
+    names = list(t)
+    with open(path, 'w') as f:
+        f.write(','.join(names) + '\n')
+        for row in zip(*(t[name].tolist() for name in names)):
+            f.write(','.join(str(v) for v in row) + '\n')
+
+
+def main():
+    args = parser.parse_args()
+
+    if args.grid is not None:
+        cells = grid(parse_axes(args.grid))
+    elif args.lhs is not None:
+        cells = latin_hypercube(parse_axes(args.lhs, True), args.cells, args.seed)
+    elif args.random is not None:
+        cells = random_design(parse_axes(args.random, True), args.cells, args.seed)
+    else:
+        cells = [{}]
+
+    paths = run_sweep(args.database + '_edges', cells, args.checkpoint, args.replicas, args.workers, args.days,
+                      args.seed, args.root)
+
+    if args.output is not None:
+        write_table(table(args.checkpoint, paths), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import shutil
+import sqlite3
+import numpy
+import cache
+import database as db
+
+
+def copy_database(tmp_path, monkeypatch, name='got_edges'):
+    """
+    Copies a bundled database in a data directory under `tmp_path`, and makes it the working directory.
+
+    Parameters
+    ----------
+    tmp_path: The temporary directory of the test.
+    monkeypatch: The monkeypatch fixture of the test.
+    name: type string: Name of the database.
+
+    Returns
+    -------
+    type Database
+    """
+    (tmp_path / 'data').mkdir()
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', name + '.db'), tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+    return db.Database(name)
+
+
+def test_snapshot_round_trip(tmp_path, monkeypatch):
+    edges_db = copy_database(tmp_path, monkeypatch)
+    loaded = cache.load_graph(edges_db)
+    assert os.path.isdir(cache.cache_path(edges_db.database))
+
+    snapshot = cache.load(edges_db.database)
+    assert snapshot is not None
+    for name in ('indptr', 'indices', 'names'):
+        assert numpy.array_equal(getattr(loaded, name), getattr(snapshot, name)), name
+
+
+def test_snapshot_fingerprint(tmp_path, monkeypatch):
+    edges_db = copy_database(tmp_path, monkeypatch)
+    cache.load_graph(edges_db)
+
+    # Touched, same content: the snapshot is kept
+    stat = os.stat(edges_db.database)
+    os.utime(edges_db.database, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.load(edges_db.database) is not None
+
+    # New edge: the snapshot is stale
+    edges_db.conn.close()
+    with sqlite3.connect(edges_db.database) as conn:
+        conn.execute('INSERT INTO "got_edges" VALUES (?, ?, 1)', ('a new vertice', 'another one'))
+    assert cache.load(edges_db.database) is None
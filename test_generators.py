@@ -0,0 +1,44 @@
+import sqlite3
+import numpy
+import pytest
+import cache
+import database as db
+import generators
+
+
+@pytest.mark.parametrize('argv', [
+    ['er', '-n', '2000'],
+    ['sbm', '-n', '2000'],
+    # More edges than a fetch of load_csr, in chunks of another size
+    ['er', '-n', '20000', '--degree', '8', '--chunk', '10000'],
+    ['ws', '-n', '3000', '--chunk', '777'],
+])
+def test_snapshot_matches_load_csr(argv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    args = generators.parser.parse_args(argv + ['--name', 'test'])
+    make_chunks, n = generators.model_chunks(args)
+    generators.write_database(args.name, make_chunks(), n, args.chunk)
+    generators.write_snapshot(args.name, make_chunks, n, args.chunk)
+
+    edges_db = db.Database('test_edges')
+    loaded = edges_db.load_csr()
+    snapshot = cache.load(edges_db.database)
+    assert snapshot is not None
+    for name in ('indptr', 'indices', 'names'):
+        assert numpy.array_equal(getattr(loaded, name), getattr(snapshot, name)), name
+
+
+def test_vertices_table(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    generators.write_database('test', generators.erdos_renyi(100, .05, 0), 100)
+
+    # The vertices table has the name of its database, like the edges table
+    rows = db.Database('test_vertices').select_item()
+    assert [r[:2] for r in rows] == [(i, str(i)) for i in range(100)]
+    with sqlite3.connect(str(tmp_path / 'data' / 'test_vertices.db')) as conn:
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    assert tables == [('test_vertices',)]
@@ -0,0 +1,33 @@
+import numpy
+import graph
+
+
+def test_expand_dense_sparse(random_graph):
+    g = random_graph(500, 10, 2)
+    dense = graph.Graphe_mat.from_graph(g, 'dense')
+    sparse = graph.Graphe_mat.from_graph(g, 'sparse')
+
+    rng = numpy.random.default_rng(2)
+    for x in (rng.random(500) < .2, rng.integers(0, 300, 500).astype(numpy.uint16), numpy.ones(500, numpy.uint8)):
+        a = dense.expand(x)
+        b = sparse.expand(x)
+        assert a.dtype == b.dtype
+        assert numpy.array_equal(a, b)
+
+
+def test_expand_does_not_wrap():
+    # A star of 300 leaves: a uint8 count would wrap
+    star = graph.Graphe_mat(301, 'dense')
+    star.add_edges(numpy.zeros(300, numpy.int64), numpy.arange(1, 301))
+    assert star.expand(numpy.ones(301, dtype=bool))[0] == 300
+
+
+def test_dense_sparse_self_loops():
+    src = numpy.array([0, 1, 2, 2, 3])
+    dst = numpy.array([1, 1, 3, 2, 0])
+    for mode in ('dense', 'sparse'):
+        m = graph.Graphe_mat(4, mode)
+        m.add_edges(src, dst)
+        assert not m.edge(1, 1) and not m.edge(2, 2), mode
+        assert m.edge(0, 1) and m.edge(1, 0) and m.edge(3, 2), mode
+        assert m.degrees().tolist() == [2, 1, 1, 2], mode
@@ -0,0 +1,29 @@
+import numpy
+import layout
+
+
+def test_coarsen_matches_neighbors(random_graph):
+    g = random_graph(2000, 4, 6)
+    cluster, indptr, indices = layout.coarsen(g.indptr, g.indices, numpy.random.default_rng(0))
+
+    # Clusters of one or two vertices, the two being neighbors
+    sizes = numpy.bincount(cluster)
+    assert sizes.min() >= 1 and sizes.max() <= 2
+    assert len(indptr) - 1 == len(sizes) < .7 * 2000
+    for c in numpy.flatnonzero(sizes == 2)[:200].tolist():
+        a, b = numpy.flatnonzero(cluster == c).tolist()
+        assert b in g.indices[g.indptr[a]:g.indptr[a + 1]]
+
+    # An edge of the graph is an edge of the coarse graph, or inside a cluster
+    src = numpy.repeat(numpy.arange(2000), numpy.diff(g.indptr))
+    coarse = set(zip(numpy.repeat(numpy.arange(len(sizes)), numpy.diff(indptr)).tolist(), indices.tolist()))
+    for s, d in zip(cluster[src].tolist(), cluster[g.indices].tolist()):
+        assert s == d or (s, d) in coarse
+
+
+def test_multilevel_layout(random_graph):
+    g = random_graph(1000, 4, 7)
+    pos = layout.multilevel_layout(g.indptr, g.indices, seed=0)
+    assert pos.shape == (1000, 2)
+    assert numpy.isfinite(pos).all() and numpy.abs(pos).max() <= 1 + 1e-9
+    assert numpy.array_equal(pos, layout.multilevel_layout(g.indptr, g.indices, seed=0))
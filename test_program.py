@@ -0,0 +1,6 @@
+import bench
+
+
+def test_startup_budget():
+    # The cold start of non-GUI runs, against the default budget of `bench.py --startup`
+    assert bench.check_startup(bench.parser.get_default('budget'), 3)
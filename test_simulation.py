@@ -0,0 +1,46 @@
+import random
+import numpy
+import simulation
+import spread
+import store
+
+
+def test_calendar_pops_each_vertice_once():
+    rng = numpy.random.default_rng(0)
+    calendar = simulation.Calendar()
+    ids = numpy.arange(1000)
+    days = rng.integers(0, 50, len(ids))
+    calendar.add(ids[:500], days[:500])
+
+    popped_ids, popped_days = calendar.pop_due(20)
+    assert (popped_days <= 20).all()
+    # Added to days already popped: due at the next pop
+    calendar.add(ids[500:], days[500:])
+    late_ids, late_days = calendar.pop_due(60)
+
+    popped_ids = numpy.concatenate((popped_ids, late_ids))
+    popped_days = numpy.concatenate((popped_days, late_days))
+    order = numpy.argsort(popped_ids)
+    assert numpy.array_equal(popped_ids[order], ids)
+    assert numpy.array_equal(popped_days[order], days)
+    assert len(calendar.pop_due(100)[0]) == 0
+
+
+def test_counts_and_extinction(random_graph):
+    random.seed(1)
+    g = random_graph(3000, 6, 1)
+    sim = simulation.Simulation(g, spread.spread_step, g.names[0], 3, r0=4, verbose=False)
+    n = len(g.names)
+
+    while sim.index < 365 and not sim.is_over():
+        sim.next()
+        # Counts of the store, frontier and days of the clocks
+        sim.check()
+        sim.store.check(sim.index)
+        assert sim.store.counts.sum() == n
+        assert sim.nbdead == len(sim.store.ids_in(store.DEAD))
+        assert sim.nbimmune == len(sim.store.ids_in(store.IMMUNE))
+
+    # The epidemic ends when nobody can infect anymore
+    assert sim.is_over()
+    assert len(sim.store.ids_in(store.INFECTED)) == 0 and len(sim.store.ids_in(store.LOCKED)) == 0
@@ -0,0 +1,27 @@
+import numpy
+import spread
+
+
+def test_frontier_step_seed(random_graph):
+    g = random_graph(2000, 8, 3)
+    blocked = numpy.zeros(2000, dtype=bool)
+    blocked[::7] = True
+    frontier = numpy.arange(0, 2000, 5)
+
+    def step(seed):
+        return spread.frontier_step(g.indptr, g.indices, frontier, blocked, 3, 3, numpy.random.default_rng(seed))
+
+    infected = step(4)
+    assert numpy.array_equal(infected, step(4))
+    assert not blocked[infected].any()
+    assert numpy.array_equal(infected, numpy.unique(infected))
+
+
+def test_frontier_step_picks_neighbors(random_graph):
+    g = random_graph(300, 4, 5)
+    blocked = numpy.zeros(300, dtype=bool)
+
+    # r0 of 1000: every neighbor of the frontier is picked
+    infected = spread.frontier_step(g.indptr, g.indices, [0, 1], blocked, 1000, 0, numpy.random.default_rng(0))
+    expected = numpy.unique(numpy.concatenate((g.indices[g.indptr[0]:g.indptr[1]], g.indices[g.indptr[1]:g.indptr[2]])))
+    assert numpy.array_equal(infected, expected)
@@ -0,0 +1,37 @@
+import numpy
+import pytest
+import store
+
+
+def test_counts_follow_the_moves():
+    s = store.StateStore(10)
+    assert s.totals() == {'susceptible': 10, 'infected': 0, 'immune': 0, 'locked': 0, 'dead': 0}
+
+    s.set(numpy.array([0, 1, 2]), store.INFECTED, 0)
+    s.set(numpy.array([1, 2]), store.LOCKED, numpy.array([0, 0]))
+    s.set(2, store.DEAD)
+    s.set(numpy.array([0]), store.IMMUNE, 3)
+    s.check(3)
+
+    assert [s.count(c) for c in range(len(store.COMPARTMENTS))] == [7, 0, 1, 1, 1]
+    assert s.ids_in(store.LOCKED).tolist() == [1]
+    assert s.is_in(numpy.array([0, 1]), store.IMMUNE, numpy.array([3, 3])).tolist() == [True, False]
+
+
+def test_copy_is_independent():
+    s = store.StateStore(5)
+    s.set(numpy.array([1, 3]), store.INFECTED, 2)
+    other = s.copy()
+    other.set(1, store.DEAD)
+
+    assert s.count(store.INFECTED) == 2 and s.count(store.DEAD) == 0
+    assert other.count(store.INFECTED) == 1 and other.count(store.DEAD) == 1
+    s.check(2)
+    other.check(2)
+
+
+def test_check_finds_bad_counts():
+    s = store.StateStore(4)
+    s.compartment[0] = store.INFECTED
+    with pytest.raises(AssertionError):
+        s.check()
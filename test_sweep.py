@@ -0,0 +1,46 @@
+import os
+import shutil
+import numpy
+import sweep
+
+
+def run(tmp_path, cells):
+    """
+    Runs a small sweep of the bundled got graph in `tmp_path`.
+
+    Parameters
+    ----------
+    tmp_path: The temporary directory of the test, the working directory.
+    cells: type list of dict: The design.
+
+    Returns
+    -------
+    type list of string: paths of the cell files of the design
+    """
+    return sweep.run_sweep('got_edges', cells, str(tmp_path / 'sweep'), replicas=2, days=10, seed=1)
+
+
+def test_table_follows_the_design(tmp_path, monkeypatch):
+    (tmp_path / 'data').mkdir()
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'got_edges.db'), tmp_path / 'data')
+    monkeypatch.chdir(tmp_path)
+
+    # Two designs in the same directory, sharing the cell r0 = 3
+    first = run(tmp_path, sweep.grid({'r0': list(range(1, 13))}))
+    second = run(tmp_path, sweep.grid({'r0': [13, 3]}))
+    assert len(os.listdir(tmp_path / 'sweep')) == 13
+
+    # Cells of the design, numbered as in the progress lines, even past 10 cells
+    t = sweep.table(str(tmp_path / 'sweep'), first)
+    cells = numpy.unique(t['cell'])
+    assert cells.tolist() == list(range(12))
+    assert [t['r0'][t['cell'] == c][0] for c in cells.tolist()] == list(range(1, 13))
+    assert len(t['day']) == 12 * 2 * 11
+
+    t = sweep.table(str(tmp_path / 'sweep'), second)
+    assert t['r0'][t['cell'] == 0][0] == 13 and t['r0'][t['cell'] == 1][0] == 3
+
+    # The whole directory: the cells of both designs, told apart by their key
+    t = sweep.table(str(tmp_path / 'sweep'))
+    assert len(set(zip(t['cell'].tolist(), t['key'].tolist()))) == 13
+    assert len(numpy.unique(t['key'])) == 13
@@ -1,56 +1,74 @@
-import networkx as nx
+import contextlib
+import queue
+import time
 import matplotlib as mpl
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 from matplotlib.widgets import Button, Slider
-import random
+import numpy
+import graph
+import layout
+import simulation
 
 
-# Use a dedicated backend to handle interactive gui
-mpl.use('TkAgg')
-
 # Interactive mode on
 plt.ion()
 
+# Level of detail. Above LABEL_THRESHOLD nodes in view, the labels are not drawn.
+# Above NODE_THRESHOLD nodes in view, the nodes are aggregated into TILES x TILES density tiles.
+# At most EDGE_BUDGET edges are drawn: above it, a fixed random sample of the edges is drawn, rasterized.
+LABEL_THRESHOLD = 500
+NODE_THRESHOLD = 20000
+EDGE_BUDGET = 20000
+TILES = 200
 
-class State:
-    def __init__(self, g, g_nx, spread_func, root, anim_time, chart, lockdown):
+# Size of the nodes (in points²) when their labels are drawn, like NetworkX
+NODE_SIZE = 300
 
-        # ALL THE FOLLOWING OF __INIT__ INITIALIZES VALUES
 
-        self.index = 0
-        self.g = g
-        self.g_nx = g_nx
-        self.root = root
+@contextlib.contextmanager
+def no_redraw(*artists):
+    """
+    Changes artists without making the figure stale: in interactive mode, a stale figure is fully redrawn,
+    while blitting draws the changed artists itself.
+
+    Parameters
+    ----------
+    artists: The artists to change.
+
+    Returns
+    -------
+    """
+    callbacks = [artist.stale_callback for artist in artists]
+    for artist in artists:
+        artist.stale_callback = None
+    try:
+        yield
+    finally:
+        for artist, callback in zip(artists, callbacks):
+            artist.stale_callback = callback
 
-        # Positions of the nodes to keep them in the same place and not redraw completely the graph each time
-        self.pos = nx.fruchterman_reingold_layout(self.g_nx)
 
-        # Keep track of graph colors
-        self.colors = ['#35FFAD' for i in range(self.g_nx.number_of_nodes())]
+class State(simulation.Simulation):
+    def __init__(self, g, spread_func, root, anim_time, chart, lockdown, layout_method='auto', layout_cache=True,
+                 **params):
 
-        # Spread function to create a step by step spread
-        self.spread = spread_func
-        self.spread_attributes = {'g': g, 'id': 0, 'r': root, 'to_infect': [root], 'infected': []}
+        # The simulation values: day, spread, infected, immune, locked, r0, ... (see `Simulation`)
+        # params: r0, r0_delta, day_to_immunity, immunity_period, deathprob
+        super().__init__(g, spread_func, root, lockdown, **params)
 
-        # Infected nodes: {node_name: day of infection}
-        # With the day, we can create an immunity system
-        self.infected = {root: 0}
+        # ALL THE FOLLOWING OF __INIT__ INITIALIZES VALUES
 
-        # Like infected but with immune
-        self.immune = {}
+        # Positions of the nodes (indexed by id) to keep them in the same place and not redraw completely the graph
+        # each time. Read from the layout computed by a previous run on the same graph, when there is one.
+        self.xy = layout.positions(self.g, layout_method, layout_cache)
 
-        # Nodes under lockdown
-        self.locked = {}
+        # Spatial index of the positions, to find the nodes in view when zooming
+        self.spatial_index = layout.GridIndex(self.xy)
 
-        # Values that will be modified
-        self.r0 = 3
-        self.r0_delta = 3
-        # Day to immunity (DTI)
-        self.day_to_immunity = 5
-        # Immunity period in days
-        self.immunity_period = 10
-        # Death probability when infected. If random is lower, the vertice is dead.
-        self.deathprob = .1
+        # Random key of each edge (in both directions): the edges drawn when decimating are the ones with the
+        # smallest keys, so the same edges stay on screen from one view to the next
+        self.edge_keys = numpy.random.default_rng(0).random(len(self.g.indices))
 
         # Colors
         self.color_pallet = {
@@ -61,64 +79,161 @@ class State:
             "lockdown" : "#A19DA4"
         }
 
+        # RGBA color of each compartment of the store (susceptible, infected, immune, locked, dead): shape (5, 4)
+        self.rgba_pallet = mpl.colors.to_rgba_array(
+            [self.color_pallet[name] for name in ('normal', 'infected', 'immune', 'lockdown', 'dead')])
+
+        # The day on screen. The next days are simulated in a background thread (see `start_loop`) and come as frames.
+        self.last_frame = self.frame()
+        self.producer = None
+
+        # Keep track of graph colors: compartment of each node and its RGBA color
+        self.codes = self.last_frame.codes
+        self.colors = self.rgba_pallet[self.codes]
+
         # General information
         self.is_stopped = False
         self.is_auto = False
         self.closing = False
         self.change = True
-        self.lockdown = lockdown
 
         # Time between frames
         self.anim_time = anim_time
 
-        # The number of cases, updated in the 'next' method
-        self.nbcases = 1  # the first one is the root
-        self.daily_cases = 1
-        self.nbdead = 0 
-
         # Chart to plot spread numbers
         self.chart = chart
 
+        # Figure of the graph and its persistent artists, created by `setup_draw` on the first draw
+        self.figure = plt.figure(0)
+        self.ax = None
+        self.text_ax = None
+        self.node_collection = None
+        self.changed_collection = None
+        self.edge_collection = None
+        self.tile_image = None
+        self.labels = {}
+
+        # Level of detail of the current view: ids of the nodes drawn one by one (None when the nodes are
+        # aggregated into tiles), and a mask of the nodes in view
+        self.visible = None
+        self.in_view = numpy.zeros(len(self.xy), dtype=bool)
+        self.tile_ids = None
+
+        # Compartment of each node on screen
+        self.shown_codes = self.codes.copy()
+
+        # Saved background of the text panel for blitting, None until the first full draw.
+        # With density tiles, the background of the graph axes (edges) is saved too.
+        self.background = None
+        self.graph_background = None
+
     def start_loop(self):
         """
-        Start the infinite loop to handle changes and draw them.
+        Start the simulation thread, then the infinite loop to handle changes and draw them.
         """
+        # `next` is the handler of the Next button here: the thread simulates the days with `Simulation.next`
+        self.producer = simulation.Producer(self, super().next)
+        self.producer.start()
+
+        # Opens the windows of the graph and the chart once: the loop only runs their event loop
+        plt.show(block=False)
         self.loop()
 
     def loop(self):
         """
-        The main loop to maintain the plt on screen.
+        The main loop to maintain the plt on screen. It consumes the frames of the simulation thread at display rate:
+        one frame per `anim_time` in auto mode, or more when the drawing falls behind (only the last one is drawn,
+        the chart gets all the days).
         """
 
+        # Time the last frame was drawn
+        shown = time.perf_counter()
+
         # While we did not press the close button -> continue the loop
         while not self.closing:
             # Switching to figure n°0
             plt.figure(0)
-            # True when pressing next
-            if self.change:
-                self.change = False
-                self.draw()
-            # True when pressing auto
-            elif self.is_auto:
-                # Check if the auto should stop (aka the Stop button is pressed)
-                if not self.check_auto():
-                    self.is_auto = False
-                    continue
-                self.next()
-                self.change = False
-                self.draw()
+
+            # Number of frames due since the last one was drawn. Out of auto mode (Next, Stop), all the pending days
+            # are shown at once.
+            due = self.producer.frames.maxsize
+            if self.is_auto and self.anim_time > 0:
+                due = max(1, int((time.perf_counter() - shown) / self.anim_time))
+            frames = self.consume(due)
 
             # Updates chart to display new spread numbers
             # Switching to figure n°1 (aka the chart)
             plt.figure(1)
-            self.update_chart(self.index, self.nbcases, self.daily_cases, self.nbdead, len(list(self.immune.keys())))
-
-            # Draw then pause
-            # Switching to figure n°0
+            with self.profiler.timer('chart'):
+                for f in frames:
+                    self.update_chart(f.day, f.total, f.daily, f.dead, f.immune)
+                # Draws the days kept back by the throttle of the chart, once it allows it
+                self.chart.refresh()
             plt.figure(0)
-            plt.draw()
 
-            plt.pause(self.anim_time)
+            # True when a day came or at start
+            if len(frames) > 0 or self.change:
+                self.change = False
+                self.last_frame = frames[-1] if len(frames) > 0 else self.last_frame
+                shown = time.perf_counter()
+                with self.profiler.timer('drawing'):
+                    self.draw()
+
+            # Check if the auto should stop: the epidemic is over
+            if self.is_auto and not self.check_auto():
+                self.is_auto = False
+
+            # Pause
+            self.pause()
+
+        self.producer.send('quit')
+
+    def consume(self, count):
+        """
+        Takes up to `count` frames pushed by the simulation thread, without waiting.
+
+        Parameters
+        ----------
+        count: type int: Maximum number of frames.
+
+        Returns
+        -------
+        type list of Frame: in order of the days
+        """
+        frames = []
+        try:
+            while len(frames) < count:
+                frames.append(self.producer.frames.get_nowait())
+        except queue.Empty:
+            pass
+        return frames
+
+    def send(self, *command):
+        """
+        Sends a command to the simulation thread (see `simulation.Producer`). Without thread (no main loop),
+        the command is applied at once.
+
+        Parameters
+        ----------
+        command: The command and its arguments.
+
+        Returns
+        -------
+        """
+        if self.producer is not None:
+            self.producer.send(*command)
+        elif command[0] == 'set':
+            setattr(self, command[1], command[2])
+        elif command[0] == 'step':
+            super().next()
+            self.last_frame = self.frame()
+
+    def pause(self):
+        """
+        Lets the GUI handle its events (buttons, sliders, chart redraw) during `anim_time`.
+        Unlike plt.pause, it does not redraw the whole figure: `draw` already blitted or asked for a redraw.
+        """
+        self.figure.canvas.start_event_loop(self.anim_time)
 
     def update_chart(self, day, total, daily, dead, immune):
         """
@@ -143,28 +258,9 @@ class State:
         Set colors according to the node state : immune; dead; infected; normal (and lockdown when asked)
         """
 
-        for i in range(len(list(self.g_nx.nodes))):
-            nodex = list(self.g_nx.nodes)[i]  # node name
-
-            # if in immune array -> node is immune
-            if nodex in self.immune:
-                self.colors[i] = self.color_pallet['immune']
-            
-            # if under lockdown
-            elif nodex in self.locked:
-                self.colors[i] = self.color_pallet['lockdown']
-            
-            # When infected there are two possibilities: dead or infected
-            elif nodex in self.infected:
-                if self.infected[nodex] == -1:
-                    self.colors[i] = self.color_pallet['dead']
-                else:
-                    self.colors[i] = self.color_pallet['infected']
-            
-            # If not int all of the cases above -> the vertice is normal
-            else:
-                self.colors[i] = self.color_pallet['normal']
-        
+        # Compartment of each node in the frame on screen, then its color: one numpy take
+        self.codes = self.last_frame.codes
+        self.colors = self.rgba_pallet[self.codes]
 
     def draw_buttons(self):
         """
@@ -272,65 +368,338 @@ class State:
         )
         self.dp_slider.on_changed(self.deathproba_changed)
 
-    def draw_texts(self, ax):
+    def draw_texts(self):
         """
-        Draws text on plt: total cases and date.
-
-        Parameters
-        ----------
-        ax: Axes of the plot.
-
-        Returns
-        -------
+        Draws text on plt: total cases and date. The texts are created once, in their own opaque axes,
+        then `update_texts` changes them.
         """
 
+        # Panel of the texts, at the bottom left of the graph. Opaque: the nodes below it are hidden, so restoring
+        # its background is enough to redraw the texts.
+        self.text_ax = plt.axes([0.005, 0.11, 0.3, 0.1])
+        self.text_ax.set_xticks([])
+        self.text_ax.set_yticks([])
+        for spine in self.text_ax.spines.values():
+            spine.set_visible(False)
+
         # Number of total cases
-        plt.text(-.05, .2,
-                 'Cases: ' + str(self.nbcases) + '/' + str(len(self.g.vertices())),
-                 horizontalalignment='left',
-                 verticalalignment='center',
-                 color='black',
-                 transform=ax.transAxes,
-                 fontsize=15
-                 )
+        self.cases_text = self.text_ax.text(0, .75,
+                                            '',
+                                            horizontalalignment='left',
+                                            verticalalignment='center',
+                                            color='black',
+                                            fontsize=15
+                                            )
 
         # Current day
-        plt.text(-.05, .15,
-                 'Day: ' + str(self.index),
-                 horizontalalignment='left',
-                 verticalalignment='center',
-                 color='r',
-                 transform=ax.transAxes,
-                 fontsize=20
-                 )
+        self.day_text = self.text_ax.text(0, .25,
+                                          '',
+                                          horizontalalignment='left',
+                                          verticalalignment='center',
+                                          color='r',
+                                          fontsize=20
+                                          )
 
-    def draw(self):
+        self.update_texts()
+
+    def update_texts(self):
         """
-        Draws the graph. Thanks to the vertices' positions stored, we keep the same graph layout.
-        Also draw the buttons, sliders & texts.
+        Updates the texts: total cases and date.
         """
+        self.cases_text.set_text('Cases: ' + str(self.last_frame.total) + '/' + str(self.g.nb_neighbors()))
+        self.day_text.set_text('Day: ' + str(self.last_frame.day))
 
-        # Set the appropriate color for each node according to its state(immune, infected, ...) to then draw the graph
-        self.set_node_colors()
+    def setup_draw(self):
+        """
+        Creates once all the artists of the figure: nodes (PathCollection), edges (LineCollection), density tiles
+        (AxesImage), labels, texts, sliders and buttons. Then each frame only updates the node colors and the texts.
+        When the backend supports blitting, a frame only draws the nodes whose color changed (with their labels)
+        and the texts over the current image, instead of redrawing the whole figure.
+        The artists only hold the level of detail of the view (see `update_view`), which is updated on zoom.
+        """
 
         # Clear the figure
         plt.clf()
 
         # Create axes in which the graph will fit
-        ax = plt.gca()
+        self.ax = plt.gca()
+        self.ax.set_axis_off()
 
         # Adjust canvas' size
         plt.subplots_adjust(top=.9, left=0.05, bottom=0, right=.95)
 
-        # Draws the NetworkX graph with the same positions thanks to the node positions stored
-        nx.draw(self.g_nx, cmap=plt.get_cmap('jet'), node_color=self.colors, with_labels=True, pos=self.pos,
-                edge_color='#BABBC1')
+        # Edges under the nodes, nodes under their labels
+        self.edge_collection = LineCollection([], colors='#BABBC1', linewidths=1, zorder=1)
+        self.ax.add_collection(self.edge_collection)
+        self.node_collection = self.ax.scatter([], [], s=NODE_SIZE, zorder=2)
+        self.tile_image = self.ax.imshow(numpy.zeros((TILES, TILES, 4)), origin='lower', interpolation='nearest',
+                                         aspect='auto', zorder=2, visible=False)
+
+        # The view is the whole layout (with margins like NetworkX), until the user zooms
+        low = self.xy.min(axis=0) if len(self.xy) > 0 else numpy.array([-1., -1.])
+        high = self.xy.max(axis=0) if len(self.xy) > 0 else numpy.array([1., 1.])
+        margin = .05 * numpy.maximum(high - low, 1e-3)
+        self.ax.set_xlim(low[0] - margin[0], high[0] + margin[0])
+        self.ax.set_ylim(low[1] - margin[1], high[1] + margin[1])
+        self.ax.set_autoscale_on(False)
+        self.update_view()
+
+        # Zooming or panning fetches the detail of the new view. Both limits change, one after the other:
+        # the view is updated once, by a timer that fires when the GUI is back in its event loop.
+        self.view_timer = self.figure.canvas.new_timer(interval=0)
+        self.view_timer.single_shot = True
+        self.view_timer.add_callback(self.apply_view)
+        self.view_pending = False
+        self.ax.callbacks.connect('xlim_changed', self.on_zoom)
+        self.ax.callbacks.connect('ylim_changed', self.on_zoom)
 
         # Drawing texts, sliders and buttons
-        self.draw_texts(ax)
+        self.draw_texts()
         self.draw_sliders()
         self.draw_buttons()
 
+        canvas = self.figure.canvas
+        if canvas.supports_blit:
+            # Nodes whose color changed, drawn over the current image. Same style as the nodes.
+            self.changed_collection = self.ax.scatter([], [], s=NODE_SIZE, zorder=2, animated=True)
+
+            # Tiles and texts are only drawn by blitting
+            self.tile_image.set_animated(True)
+            self.cases_text.set_animated(True)
+            self.day_text.set_animated(True)
+            canvas.mpl_connect('draw_event', self.on_draw)
+
+        canvas.draw_idle()
+
+    def on_zoom(self, ax):
+        """
+        Called when the limits of the graph axes change (zoom, pan): schedules the update of the level of detail.
+        The x and y limits of a zoom or a pan give a single update.
+
+        Parameters
+        ----------
+        ax: The axes whose limits changed.
+
+        Returns
+        -------
+        """
+        if not self.view_pending:
+            self.view_pending = True
+            self.view_timer.start()
+
+    def apply_view(self):
+        """
+        Updates the level of detail for the limits of the last zoom or pan, then redraws the figure.
+        """
+        self.view_pending = False
+        self.update_view()
+        self.figure.canvas.draw_idle()
+
+    def update_view(self):
+        """
+        Updates the artists for the level of detail of the current view:
+            - the nodes in view are found with the spatial index,
+            - up to NODE_THRESHOLD of them are drawn one by one (with their labels up to LABEL_THRESHOLD),
+              more are aggregated into density tiles,
+            - the edges of the nodes in view are drawn, decimated to EDGE_BUDGET.
+        """
+        # The image on screen is of the old view: no blitting until the next full draw
+        self.background = None
+        self.graph_background = None
+
+        (xmin, xmax), (ymin, ymax) = self.ax.get_xlim(), self.ax.get_ylim()
+        ids = self.spatial_index.query(min(xmin, xmax), max(xmin, xmax), min(ymin, ymax), max(ymin, ymax))
+
+        self.in_view[:] = False
+        self.in_view[ids] = True
+
+        if len(ids) > NODE_THRESHOLD:
+            # Too many nodes: density tiles over the view
+            self.visible = None
+            self.tile_ids = ids
+            self.node_collection.set_offsets(numpy.zeros((0, 2)))
+            self.tile_image.set_extent((xmin, xmax, ymin, ymax))
+            self.tile_image.set_visible(True)
+            self.update_tiles()
+        else:
+            self.visible = ids
+            self.tile_ids = None
+            self.tile_image.set_visible(False)
+            self.node_collection.set_offsets(self.xy[ids])
+            self.node_collection.set_facecolor(self.colors[ids])
+            self.node_collection.set_sizes([self.node_size()])
+
+        self.update_labels(ids if len(ids) <= LABEL_THRESHOLD else ids[:0])
+        self.update_edges(ids)
+
+    def node_size(self):
+        """
+        Size of the nodes drawn one by one: NetworkX's size when the labels are drawn, smaller with more nodes in view.
+
+        Returns
+        -------
+        type float: size in points²
+        """
+        if self.visible is None or len(self.visible) <= LABEL_THRESHOLD:
+            return NODE_SIZE
+        return max(2., NODE_SIZE * LABEL_THRESHOLD / len(self.visible))
+
+    def update_labels(self, ids):
+        """
+        Keeps a label for the given nodes only. Labels are created when their node comes into view.
+
+        Parameters
+        ----------
+        ids: type numpy.ndarray: ids of the nodes to label.
+
+        Returns
+        -------
+        """
+        keep = set(ids.tolist())
+        for i in [i for i in self.labels if i not in keep]:
+            self.labels.pop(i).remove()
+
+        for i in keep:
+            if i not in self.labels:
+                # Same style as NetworkX's labels
+                self.labels[i] = self.ax.text(self.xy[i, 0], self.xy[i, 1], str(self.g.names[i]),
+                                              size=12, color='k', family='sans-serif',
+                                              horizontalalignment='center', verticalalignment='center',
+                                              clip_on=True, zorder=3)
+
+    def update_edges(self, ids):
+        """
+        Draws the edges of the nodes in view. Above EDGE_BUDGET edges, only those with the smallest random keys are
+        drawn, and the collection is rasterized.
+
+        Parameters
+        ----------
+        ids: type numpy.ndarray: ids of the nodes in view.
+
+        Returns
+        -------
+        """
+        positions, counts = graph.gather_positions(self.g.indptr, ids)
+        src = numpy.repeat(ids, counts)
+        dst = numpy.asarray(self.g.indices[positions], dtype=numpy.int64)
+
+        # Each edge once: from its smallest end, or from its only end in view
+        once = (src < dst) | ~self.in_view[dst]
+        positions, src, dst = positions[once], src[once], dst[once]
+
+        decimated = len(src) > EDGE_BUDGET
+        if decimated:
+            keep = numpy.argpartition(self.edge_keys[positions], EDGE_BUDGET)[:EDGE_BUDGET]
+            src, dst = src[keep], dst[keep]
+
+        self.edge_collection.set_segments(numpy.stack((self.xy[src], self.xy[dst]), axis=1))
+        self.edge_collection.set_rasterized(decimated)
+
+    def update_tiles(self):
+        """
+        Colors the density tiles: each tile gets the mean color of the nodes in it, and an opacity growing
+        with their number (log scale). Empty tiles are transparent.
+        """
+        ids = self.tile_ids
+        (xmin, xmax), (ymin, ymax) = self.ax.get_xlim(), self.ax.get_ylim()
+        tx = numpy.clip(((self.xy[ids, 0] - xmin) / (xmax - xmin) * TILES).astype(numpy.int64), 0, TILES - 1)
+        ty = numpy.clip(((self.xy[ids, 1] - ymin) / (ymax - ymin) * TILES).astype(numpy.int64), 0, TILES - 1)
+
+        # Number of nodes of each compartment in each tile
+        nb_compartments = len(self.rgba_pallet)
+        counts = numpy.bincount((ty * TILES + tx) * nb_compartments + self.codes[ids],
+                                minlength=TILES * TILES * nb_compartments).reshape(TILES * TILES, nb_compartments)
+        total = counts.sum(axis=1)
+
+        image = numpy.zeros((TILES * TILES, 4))
+        image[:, :3] = counts @ self.rgba_pallet[:, :3] / numpy.maximum(total, 1)[:, None]
+        if total.max() > 0:
+            image[:, 3] = numpy.where(total > 0, .3 + .7 * numpy.log1p(total) / numpy.log1p(total.max()), 0)
+        self.tile_image.set_data(image.reshape(TILES, TILES, 4))
+
+    def on_draw(self, event):
+        """
+        Called after each full draw of the figure: saves the background of the text panel (and of the graph
+        axes with density tiles), then draws the texts (and the tiles) on it.
+
+        Parameters
+        ----------
+        event: The mpl event. Not used but because plt send it we keep a param for it.
+
+        Returns
+        -------
+        """
+        canvas = self.figure.canvas
+        if self.visible is None:
+            self.graph_background = canvas.copy_from_bbox(self.ax.bbox)
+            self.figure.draw_artist(self.tile_image)
+
+        self.background = canvas.copy_from_bbox(self.text_ax.bbox)
+        self.figure.draw_artist(self.cases_text)
+        self.figure.draw_artist(self.day_text)
+
+        # A full draw shows the colors of the node collection
+        self.shown_codes = self.codes.copy()
+
+    def draw(self):
+        """
+        Draws the graph. Thanks to the vertices' positions stored, we keep the same graph layout.
+        The artists are created on the first call; then only the node colors and the texts are updated.
+        """
+
+        # Set the appropriate color for each node according to its state(immune, infected, ...) to then draw the graph
+        with self.profiler.timer('coloring'):
+            self.set_node_colors()
+
+        if self.node_collection is None:
+            self.setup_draw()
+
+        # Nodes in view whose compartment changed since they were drawn
+        changed = numpy.flatnonzero(self.codes != self.shown_codes)
+        changed = changed[self.in_view[changed]]
+
+        if self.background is None:
+            # No blitting (or no full draw yet): update the artists and redraw the whole figure when idle
+            if self.visible is None:
+                self.update_tiles()
+            elif len(changed) > 0:
+                self.node_collection.set_facecolor(self.colors[self.visible])
+            self.update_texts()
+            self.figure.canvas.draw_idle()
+            return
+
+        # Blitting: the artists are updated for the next full draws, without asking for one
+        with no_redraw(self.node_collection, self.changed_collection, self.tile_image, self.cases_text, self.day_text):
+            if self.visible is None:
+                self.update_tiles()
+            elif len(changed) > 0:
+                self.node_collection.set_facecolor(self.colors[self.visible])
+                self.changed_collection.set_offsets(self.xy[changed])
+                self.changed_collection.set_facecolor(self.colors[changed])
+                self.changed_collection.set_sizes([self.node_size()])
+            self.update_texts()
+
+        canvas = self.figure.canvas
+
+        if self.visible is None:
+            # Tiles over the saved edges
+            canvas.restore_region(self.graph_background)
+            self.figure.draw_artist(self.tile_image)
+        elif len(changed) > 0:
+            # Changed nodes and their labels, over the current image
+            self.figure.draw_artist(self.changed_collection)
+            for i in changed.tolist():
+                if i in self.labels:
+                    self.figure.draw_artist(self.labels[i])
+
+        # Texts over the saved background of their panel
+        canvas.restore_region(self.background)
+        self.figure.draw_artist(self.cases_text)
+        self.figure.draw_artist(self.day_text)
+
+        canvas.blit(self.figure.bbox)
+        self.shown_codes = self.codes.copy()
+
     def immunityperiod_changed(self, event):
         """
         Changes the immunity_period.
@@ -344,7 +713,7 @@ class State:
         -------
         """
 
-        self.immunity_period = int(self.ip_slider.val)
+        self.send('set', 'immunity_period', int(self.ip_slider.val))
 
     def daytoimmunity_changed(self, event):
         """
@@ -359,7 +728,7 @@ class State:
         -------
         """
 
-        self.day_to_immunity = int(self.dti_slider.val)
+        self.send('set', 'day_to_immunity', int(self.dti_slider.val))
 
     def r0_changed(self, event):
         """
@@ -374,7 +743,7 @@ class State:
         -------
         """
         
-        self.r0 = int(self.r0_slider.val)
+        self.send('set', 'r0', int(self.r0_slider.val))
 
     def r0_delta_changed(self, event):
         """
@@ -389,11 +758,11 @@ class State:
         -------
         """
 
-        self.r0_delta = self.r0d_slider.val
+        self.send('set', 'r0_delta', self.r0d_slider.val)
 
     def next(self, event=None):
         """
-        Continues the spread. Calls the spread algorithm to proceed the disease spread a step forward.
+        Continues the spread. Asks the simulation thread to proceed the disease spread a step forward.
 
         Parameters
         ----------
@@ -404,175 +773,11 @@ class State:
         -------
         """
 
-        # Index/day
-        self.index += 1
-        print('Day:', self.index)
-
-        # Continue the spread by calling the spread function.
-        # The spread function returns a dictionnary with all the values neeeded to proceed another step later. 
-        # These values are stored in this classe in `spread_attributes`.
-        returned_values = self.spread(
-            self.spread_attributes['g'],
-            self.locked,
-            self.immune,
-            self.index,
-            self.spread_attributes['r'],
-            self.r0,
-            self.r0_delta,
-            self.spread_attributes['to_infect'],
-            self.spread_attributes['infected'],
-        )
-        self.spread_attributes['to_infect'] = returned_values['to_infect']
-        self.spread_attributes['infected'] = returned_values['infected']
-
-        # Cases of the day (used in the chart)
-        self.daily_cases = 0
-
-        # Update our infected tracker : 
-        # For each new infected => random number => dead ? if no then just infected.
-        # As mentionned in `program.py`, a node can be in both `infected` and `to_infect` lists
-            # because it cans be infected and infected other vertices.
-        # Thus, we check if both lists, with making sure to not check a vertice we already checked.
-        for n in self.spread_attributes['infected'] + [n for n in self.spread_attributes['to_infect'] if
-                                                n not in self.spread_attributes['infected']]:
-
-            # Add to infected dict only if not infected and note immune
-            if n not in self.infected and n not in self.immune:
-
-                # Vital prognosis engaged                
-                if random.random() <= self.deathprob:
-                    print('xxxx Death info:', n, "just died")
-                    
-                    # -1 means dead in the `infected` dictionnary
-                    self.infected[n] = -1
-                    self.nbdead += 1
-                    
-                    # Dead => remove it from the search algorithm parameters
-                    if n in self.spread_attributes['to_infect']:
-                        self.spread_attributes['to_infect'].remove(n)
-                    if n in self.spread_attributes['infected']:
-                        self.spread_attributes['infected'].remvoe(n)
-
-                # If it survived => add to infected
-                else:
-                    # Key = node's name ; value = infection date.
-                    self.infected[n] = self.index
-                    self.nbcases += 1
-
-                    # A new infected today
-                    self.daily_cases += 1
-
-            # Remove dead nodes from algorithm parameters
-            if n in self.infected and self.infected[n] == -1:
-                if n in self.spread_attributes['to_infect']: self.spread_attributes['to_infect'].remove(n)
-                if n in self.spread_attributes['infected']:self.spread_attributes['infected'].remove(n)
-
-        # Removing the infected that are immune.
-        # Two steps are involved because we can't remove from a dict while 
-        # looping on it. Thus, two steps:
-            # 1. select them
-            # 2. remove them
-
-        # 1. select them: 
-        infected_to_remove = []
-        for n, d in self.infected.items():
-            # lockdown enabled, not dead and pre-lockdown done => going to lockdown
-            if self.lockdown != -1 and d != -1 and self.index >= d + self.lockdown:
-                # Remove this vertice from the algorithm parameters
-                if n in self.spread_attributes['to_infect']:
-                    self.spread_attributes['to_infect'].remove(n)
-                if n in self.spread_attributes['infected']:
-                    self.spread_attributes['infected'].remove(n)
-                
-                # We set the lock date to the infection date. Thus, we keep track of when the node was infected
-                # and not only when it was locked
-                self.locked[n] = self.infected[n]
-
-                # Remove the node from infected dict
-                infected_to_remove.append(n)
-
-            # lockdown disabled, not dead and pre-immune perdiod done => is now immuned
-            elif self.lockdown == -1 and d != -1 and self.index >= d + self.day_to_immunity:
-                # Remove this vertice from the algorithm parameters
-                if n in self.spread_attributes['to_infect']:
-                    self.spread_attributes['to_infect'].remove(n)
-                if n in self.spread_attributes['infected']:
-                    self.spread_attributes['infected'].remove(n)
-                
-                # The vertice is immune so we remove a case from the count.
-                self.nbcases -= 1
-
-                # Key = vertice's name; Value = current date. => we keep track of the start of immune period.
-                self.immune[n] = self.index
-
-                # Remove the node infected dict
-                infected_to_remove.append(n)
-        # 1. end of selection
-
-        # 2. remove them
-        for n in infected_to_remove:
-            self.infected.pop(n)
-        # 2. end of remove
-
-        # Removing immune that arn't immune anymore.
-        # Two steps are involved because we can't remove from a dict while 
-        # looping on it. Thus, two steps:
-            # 1. select
-            # 2. remove
-
-        # 1. select
-        immunity_to_remove = []
-        for n, d in self.immune.items():
-            # Below is the condition on the date => if True then the immune period is over.
-            if self.index >= d + self.immunity_period:
-                immunity_to_remove.append(n)
-        # 1. end of selction
-
-        # 2. remove
-        for n in immunity_to_remove:
-            self.immune.pop(n)
-        # 2. end of remove
-
-        # Unlocking the locked nodes.
-        # Two steps are involved because we can't remove from a dict while 
-        # looping on it. Thus, two steps:
-        #   1. Select the nodes
-        #   2. Remove them
-
-        # 1. Select
-        node_to_unlock = []
-        for key, value in self.locked.items():
-            # Below is the condition on the date => if True then the lockdown period is over.
-            if self.index >= self.day_to_immunity + value:
-                print('!!!!!', key)
-                node_to_unlock.append(key)
-
-                # When going out of lockdown => we are immune
-                self.immune[key] = self.index
-
-                # Immune => remove a case from count
-                self.nbcases -= 1
-        # 1. End of selection
-
-        # 2. remove
-        for n in node_to_unlock:
-            self.locked.pop(n)
-        # 2. end of remove
-
-        # DEBUG IN CONSOLE: all the locked vertices and the date of their lockdown's start.
-        print('--')
-        for k, v in self.locked.items():
-            print(k, v)
-        print('--')
-
-        # DEBUG IN CONSOLE: total amount of infected, dead, immuned. 
-        print('+++++Nb Info:', self.nbcases, 'infected')
-        print('+++++Nb Info:', self.nbdead, 'dead')
-        print('++++ Nb Info:', len(list(self.immune.keys())), 'immuned')
-        print()
-
-        # Makes it possible to the main loop to detect changed and redraw.
-        self.change = True
+        # The dynamics live in `Simulation.next`, run by the simulation thread. The main loop draws the frame it pushes.
+        self.send('step')
+
+        # Without main loop, the day is already simulated: makes it possible to detect the change and redraw.
+        self.change = self.producer is None
 
     def last_action(self, event):
         """
@@ -589,6 +794,7 @@ class State:
         # We launch the automatic by unstopping it then activate it
         self.is_stopped = False
         self.is_auto = True
+        self.send('run')
 
     def check_auto(self):
         """
@@ -599,15 +805,9 @@ class State:
         boolean: is the algorithm in auto mode ?
         """
 
-        # If no one is infected and the population is 100% normal (or immunen) then it's over.
-        # Indeed, no more infections are possible.
-        # Thus, returns False
-        if self.color_pallet['infected'] not in self.colors and not (
-                self.color_pallet['normal'] in self.colors and self.color_pallet['immune'] in self.colors): 
-                return False
-        
-        # Otherwise, returns True
-        return True
+        # If no one is infected nor under lockdown in the last day drawn, then it's over:
+        # no more infections are possible.
+        return not self.last_frame.over
 
     def stop(self, event):
         """
@@ -624,6 +824,7 @@ class State:
         print("stop auto")
         self.is_stopped = True
         self.is_auto = False
+        self.send('pause')
 
     def deathproba_changed(self, event):
         """
@@ -638,7 +839,7 @@ class State:
         """
 
         # Getting the value from the slider. Keeping the float value.
-        self.deathprob = self.dp_slider.val
+        self.send('set', 'deathprob', self.dp_slider.val)
 
     def close(self, event):
         """
@@ -654,42 +855,38 @@ class State:
 
         self.closing = True
         self.is_auto = False
+        self.send('quit')
         
         # Asks plt to close all the windows.
         plt.close('all')
 
 
-def show_graph(g, spread_func, root, animation_time, chart, lockdown):
+def show_graph(g, spread_func, root, animation_time, chart, lockdown, layout_method='auto', layout_cache=True,
+               **params):
     """
     Main function of `visual.py`.
-    Creates the NetworkX graph based on `g` and create a State instance to show graph.
+    Creates a State instance to show the graph `g`.
     The graph (aka State instance) will use the chart given as its instantce to give all values.
 
     Parameters
     ----------
-    g: type Graph_dict: The graph to create the NetworkX graph and where we search with the algorithm.
+    g: type Graph_dict or FrozenGraph: The graph to show and where we search with the algorithm.
     spread_fun: A function to handle the spread.
     animation_time: type float: Time between 2 frames of auto_mode.
     chart: The instance of the chart (created in `program.py`)
     lockdown: type int: The lockwdown duration. Or -1 if lockdown is disabled.
+    layout_method: type string: Layout of the graph, one of `layout.METHODS`.
+    layout_cache: type bool: Reuse (and write) the layout file of the graph.
+    params: Initial values of the simulation: r0, r0_delta, day_to_immunity, immunity_period, deathprob, and debug.
 
     Returns
     -------
     """
 
-    # Networkx Graph setup
-    # First we create the graph instance
-    g_nx = nx.Graph()
-
-    # The, from our Graph_dict we add each edge to the NetworkX graph.
-    for vertice in g.vertices():
-        for n in g.neighbors(vertice):
-            g_nx.add_edge(vertice, n)
-
     # Plot setup: windows' id, (height, width)
     fig = plt.figure(num=0, figsize=(9, 10))
 
     # Creating an instance of State to keep track of the state of the graph.
-    state = State(g, g_nx, spread_func, root, animation_time, chart, lockdown)
+    state = State(g, spread_func, root, animation_time, chart, lockdown, layout_method, layout_cache, **params)
     # Finally, we start the main loop of the graph that handles changes.
     state.start_loop()